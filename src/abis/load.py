@@ -1,22 +1,38 @@
-"""Basic Contract ABI loader (from json files)"""
+"""Basic Contract ABI loader (from json files)
 
+ABIs are parsed once per process and contract instances are cached per web3 instance and
+address. Selectors and argument types of the functions used for encoding transactions
+(`transfer`, `withdraw`, `addOverdraft`) and calls (`balanceOf`, `decimals`) are computed
+once, see `abi_function`.
+"""
+
+from __future__ import annotations
+
+import functools
 import json
 import os
+from dataclasses import dataclass
 from enum import Enum
 from pathlib import Path
 from typing import Any, Optional
 
+from eth_abi.abi import decode as abi_decode, encode as abi_encode
+from eth_typing.encoding import HexStr
 from eth_typing.evm import ChecksumAddress
+from eth_utils.abi import (
+    function_abi_to_4byte_selector,
+    get_abi_input_types,
+    get_abi_output_types,
+)
 from typing_extensions import Type
 from web3 import Web3
 
 # TODO - following this issue: https://github.com/ethereum/web3.py/issues/3017
 from web3.contract import Contract
 
-from src.config import IOConfig
 from src.logger import set_log
 
-ABI_PATH = IOConfig.from_env().project_root_dir / Path("src/abis")
+ABI_PATH = Path(__file__).parent
 
 log = set_log(__name__)
 
@@ -37,24 +53,76 @@ class IndexedContract(Enum):
         return os.path.join(ABI_PATH, self.filename())
 
     def load_contract_abi(self) -> Any:
-        """Loads a contract abi from json file"""
-        with open(self.filepath(), "r", encoding="utf-8") as file:
-            return json.load(file)
+        """Loads a contract abi from json file (parsed only once)"""
+        return _load_abi(self)
 
     def get_contract(
         self, web3: Optional[Web3], address: Optional[ChecksumAddress]
     ) -> Contract | Type[Contract]:
-        """Loads Contract instance from abi and optional"""
-        abi = self.load_contract_abi()
+        """Loads Contract instance from abi and optional address.
+        Instances are cached per web3 instance and address."""
         if not web3:
-            # Use dummy web3
-            log.warning(
-                "Using a fallback (dummy) web3 instance with no actual connection!"
-            )
-            web3 = Web3()
-        if address:
-            return web3.eth.contract(address, abi=abi)
-        return web3.eth.contract(abi=abi)
+            web3 = _dummy_web3()
+        return _contract(self, web3, address)
+
+
+@dataclass(frozen=True)
+class AbiFunction:
+    """Precomputed selector and input types of a contract function"""
+
+    name: str
+    selector: bytes
+    input_types: tuple[str, ...]
+    output_types: tuple[str, ...]
+
+    def encode(self, *args: Any) -> HexStr:
+        """ABI encoded call data of the function with arguments `args`"""
+        return HexStr("0x" + (self.selector + abi_encode(self.input_types, args)).hex())
+
+    def call(self, web3: Web3, address: ChecksumAddress, *args: Any) -> Any:
+        """Calls the function on the contract at `address` and decodes the result"""
+        result = web3.eth.call({"to": address, "data": self.encode(*args)})
+        decoded: tuple[Any, ...] = tuple(abi_decode(self.output_types, result))
+        return decoded[0] if len(decoded) == 1 else decoded
+
+
+@functools.cache
+def abi_function(contract: IndexedContract, name: str) -> AbiFunction:
+    """Selector and encoder of function `name` of an indexed contract"""
+    entries = [
+        entry
+        for entry in contract.load_contract_abi()
+        if entry.get("type") == "function" and entry.get("name") == name
+    ]
+    assert len(entries) == 1, f"Expected a unique function {name} in {contract.value}"
+    return AbiFunction(
+        name=name,
+        selector=function_abi_to_4byte_selector(entries[0]),
+        input_types=tuple(get_abi_input_types(entries[0])),
+        output_types=tuple(get_abi_output_types(entries[0])),
+    )
+
+
+@functools.cache
+def _load_abi(contract: IndexedContract) -> Any:
+    with open(contract.filepath(), "r", encoding="utf-8") as file:
+        return json.load(file)
+
+
+@functools.cache
+def _dummy_web3() -> Web3:
+    log.warning("Using a fallback (dummy) web3 instance with no actual connection!")
+    return Web3()
+
+
+@functools.lru_cache(maxsize=128)
+def _contract(
+    contract: IndexedContract, web3: Web3, address: Optional[ChecksumAddress]
+) -> Contract | Type[Contract]:
+    abi = contract.load_contract_abi()
+    if address:
+        return web3.eth.contract(address, abi=abi)
+    return web3.eth.contract(abi=abi)
 
 
 # The following methods are merely convenience methods so that users
@@ -2,8 +2,9 @@
 
 from __future__ import annotations
 
+import functools
 import os
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from enum import Enum
 from fractions import Fraction
 from pathlib import Path
@@ -14,7 +15,14 @@ from dune_client.types import Address
 from safe_eth.eth.ethereum_network import EthereumNetwork
 from web3 import Web3
 
-load_dotenv()
+PROJECT_ROOT_DIR = Path(__file__).parent.parent
+LOG_CONFIG_FILE = PROJECT_ROOT_DIR / Path("logging.conf")
+
+
+@functools.cache
+def load_env() -> None:
+    """Loads environment variables from a `.env` file, once and only when first needed."""
+    load_dotenv()
 
 
 class Network(Enum):
@@ -34,6 +42,42 @@ class Network(Enum):
     INK = "ink"
 
 
+# Environment variables (read with `network_env`) whose values differ between networks
+CHAIN_SPECIFIC_ENV = ("NODE_URL", "PAYOUTS_SAFE_ADDRESS", "NONCE_MODIFIER")
+
+
+def network_env(name: str, network: Network, default: str = "") -> str:
+    """Value of the environment variable `name` for `network`.
+
+    A network specific variable `<name>_<NETWORK>` (e.g. `NODE_URL_GNOSIS`) takes precedence
+    over `name`, so that one environment can hold the settings of several networks. The
+    fallback to `name` is only meant for runs of a single network, see `check_network_env`.
+    """
+    load_env()
+    return os.environ.get(f"{name}_{network.name}") or os.environ.get(name, default)
+
+
+def check_network_env(networks: list[Network]) -> None:
+    """Raises a ValueError if several networks are selected and a chain specific variable
+    (see `CHAIN_SPECIFIC_ENV`) is only set without network suffix for some of them, as all
+    of them would silently use the same value."""
+    load_env()
+    if len(networks) < 2:
+        return
+    missing = [
+        f"{name}_{network.name}"
+        for name in CHAIN_SPECIFIC_ENV
+        if os.environ.get(name)
+        for network in networks
+        if not os.environ.get(f"{name}_{network.name}")
+    ]
+    if missing:
+        raise ValueError(
+            f"Several networks are selected, set {', '.join(missing)} instead of the "
+            "variables without network suffix."
+        )
+
+
 @dataclass(frozen=True)
 class RewardConfig:
     """Configuration for reward mechanism."""
@@ -191,6 +235,7 @@ class OrderbookConfig:
     @staticmethod
     def from_network(network: Network) -> OrderbookConfig:
         """Initialize orderbook config from environment variables."""
+        load_env()
         analytics_db_url = os.environ.get("ANALYTICS_DB_URL", "")
         schema = "dbt"
         match network:
@@ -232,11 +277,14 @@ class DuneConfig:
 
     dune_api_key: str
     dune_blockchain: str
+    dune_api_url: str = "https://api.dune.com"
 
     @staticmethod
     def from_network(network: Network) -> DuneConfig:
         """Initialize dune config for a given network."""
+        load_env()
         dune_api_key = os.environ.get("DUNE_API_KEY", "")
+        dune_api_url = os.environ.get("DUNE_API_BASE_URL") or "https://api.dune.com"
         match network:
             case Network.MAINNET:
                 dune_blockchain = "ethereum"
@@ -261,7 +309,11 @@ class DuneConfig:
             case _:
                 raise ValueError(f"No dune config set up for network {network}.")
 
-        return DuneConfig(dune_api_key=dune_api_key, dune_blockchain=dune_blockchain)
+        return DuneConfig(
+            dune_api_key=dune_api_key,
+            dune_blockchain=dune_blockchain,
+            dune_api_url=dune_api_url,
+        )
 
 
 @dataclass(frozen=True)
@@ -272,13 +324,70 @@ class NodeConfig:
     node_url_mainnet: str
 
     @staticmethod
-    def from_env() -> NodeConfig:
-        """Initialize node config from environment variables."""
-        node_url = os.environ.get("NODE_URL", "")
+    def from_network(network: Network) -> NodeConfig:
+        """Initialize node config for a given network from environment variables."""
+        load_env()
+        node_url = network_env("NODE_URL", network)
         node_url_mainnet = os.environ.get("NODE_URL_MAINNET", "")
         return NodeConfig(node_url=node_url, node_url_mainnet=node_url_mainnet)
 
 
+@dataclass(frozen=True)
+class PriceConfig:
+    """Configuration of price fetching and the persistent price cache.
+
+    Attributes:
+    cache_file -- sqlite file storing daily usd prices
+    cache_only -- if set, prices missing from the cache raise instead of being fetched
+    providers -- price providers in order of preference, only CoinPaprika by default
+    hedge_delay_seconds -- time to wait for a provider before also asking the next one
+    max_relative_deviation -- if set, a price is only accepted if a second provider
+        confirms it up to this relative deviation
+    api_urls -- base urls of providers replacing their public APIs (e.g. a local stand-in),
+        by provider name
+    """
+
+    cache_file: Path
+    cache_only: bool
+    providers: list[str]
+    hedge_delay_seconds: float
+    max_relative_deviation: float | None
+    api_urls: dict[str, str] = field(default_factory=dict)
+
+    @staticmethod
+    def from_env() -> PriceConfig:
+        """Initialize price config from environment variables."""
+        load_env()
+        default_cache_file = PROJECT_ROOT_DIR / Path("out/prices.sqlite")
+        cache_file = Path(os.environ.get("PRICE_CACHE_FILE") or default_cache_file)
+        cache_only = os.environ.get("PRICE_CACHE_ONLY", "").lower() in ("1", "true")
+        providers = [
+            provider.strip()
+            for provider in (os.environ.get("PRICE_PROVIDERS") or "coinpaprika").split(
+                ","
+            )
+        ]
+        hedge_delay_seconds = float(os.environ.get("PRICE_HEDGE_DELAY_SECONDS") or 3)
+        max_relative_deviation = (
+            float(os.environ["PRICE_MAX_RELATIVE_DEVIATION"])
+            if os.environ.get("PRICE_MAX_RELATIVE_DEVIATION")
+            else None
+        )
+        return PriceConfig(
+            cache_file=cache_file,
+            cache_only=cache_only,
+            providers=providers,
+            hedge_delay_seconds=hedge_delay_seconds,
+            max_relative_deviation=max_relative_deviation,
+            # e.g. COINPAPRIKA_API_URL
+            api_urls={
+                provider: os.environ[f"{provider.upper()}_API_URL"]
+                for provider in providers
+                if os.environ.get(f"{provider.upper()}_API_URL")
+            },
+        )
+
+
 @dataclass(frozen=True)
 class PaymentConfig:
     """Configuration of payment."""
@@ -303,6 +412,7 @@ class PaymentConfig:
     def from_network(network: Network) -> PaymentConfig:
         """Initialize payment config for a given network."""
         # pylint: disable=too-many-locals,too-many-statements
+        load_env()
         signing_key = os.getenv("PROPOSER_PK")
         if signing_key == "":
             signing_key = None
@@ -317,10 +427,7 @@ class PaymentConfig:
             )
         )
         payment_safe_address_native = Web3.to_checksum_address(
-            os.environ.get(
-                "PAYOUTS_SAFE_ADDRESS",
-                "",
-            )
+            network_env("PAYOUTS_SAFE_ADDRESS", network)
         )
 
         # mainnet transaction nonces are increased by this modifier to allow for proposing
@@ -329,10 +436,7 @@ class PaymentConfig:
             network: idx for idx, network in enumerate(reversed(list(Network)), start=0)
         }
         nonce_modifier = int(
-            os.environ.get(
-                "NONCE_MODIFIER",
-                nonce_modifier_dict[network],
-            )
+            network_env("NONCE_MODIFIER", network, str(nonce_modifier_dict[network]))
         )
 
         match network:
@@ -524,20 +628,27 @@ class IOConfig:
     project_root_dir: Path
     query_dir: Path
     csv_output_dir: Path
+    dune_result_dir: Path
     dashboard_dir: Path
     slack_channel: str | None
     slack_token: str | None
+    slack_api_url: str = "https://www.slack.com/api/"
+    # checkpoints of the stages of a run, see `src.utils.stage_cache`
+    checkpoint_dir: Path = PROJECT_ROOT_DIR / "out" / "checkpoints"
 
     @staticmethod
-    def from_env() -> IOConfig:
-        """Initialize io config from environment variables."""
-        network = Network(os.getenv("NETWORK"))
+    def from_network(network: Network) -> IOConfig:
+        """Initialize io config for a given network."""
+        load_env()
         slack_channel = os.getenv("SLACK_CHANNEL", None)
         slack_token = os.getenv("SLACK_TOKEN", None)
+        slack_api_url = os.getenv("SLACK_API_URL") or "https://www.slack.com/api/"
 
-        project_root_dir = Path(__file__).parent.parent
-        file_out_dir = project_root_dir / Path("out")
-        log_config_file = project_root_dir / Path("logging.conf")
+        project_root_dir = PROJECT_ROOT_DIR
+        file_out_dir = Path(os.environ.get("FILE_OUT_PATH") or project_root_dir / "out")
+        dune_result_dir = file_out_dir / Path("dune")
+        checkpoint_dir = file_out_dir / Path("checkpoints")
+        log_config_file = LOG_CONFIG_FILE
         query_dir = project_root_dir / Path("queries")
         dashboard_dir = project_root_dir / Path("dashboards/solver-rewards-accounting")
 
@@ -547,9 +658,12 @@ class IOConfig:
             log_config_file=log_config_file,
             query_dir=query_dir,
             csv_output_dir=file_out_dir,
+            dune_result_dir=dune_result_dir,
+            checkpoint_dir=checkpoint_dir,
             dashboard_dir=dashboard_dir,
             slack_channel=slack_channel,
             slack_token=slack_token,
+            slack_api_url=slack_api_url,
         )
 
 
@@ -608,13 +722,10 @@ class AccountingConfig:
             payment_config=PaymentConfig.from_network(network),
             orderbook_config=OrderbookConfig.from_network(network),
             dune_config=DuneConfig.from_network(network),
-            node_config=NodeConfig.from_env(),
+            node_config=NodeConfig.from_network(network),
             reward_config=RewardConfig.from_network(network),
             protocol_fee_config=ProtocolFeeConfig.from_network(network),
             buffer_accounting_config=BufferAccountingConfig.from_network(),
-            io_config=IOConfig.from_env(),
+            io_config=IOConfig.from_network(network),
             overdraft_config=OverdraftConfig.from_network(network),
         )
-
-
-web3 = Web3(Web3.HTTPProvider(NodeConfig.from_env().node_url))
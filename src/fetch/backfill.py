@@ -0,0 +1,301 @@
+"""
+Script to recompute the payouts of many accounting periods, e.g. for audits or reviews
+of the reward mechanism.
+
+The date range is split into accounting periods. The analytics data of all pending periods
+of a network is fetched with one query per table, payouts are computed in a process pool
+and written to a columnar store (one parquet partition per network and period, see
+`src.utils.columnar`). Data is passed to and from the workers as memory-mapped Arrow IPC
+files (see `HandOff`) instead of pickled data frames. Progress is tracked in a json file,
+so that an interrupted backfill continues with the periods which are not done yet, reading
+the analytics data of periods fetched before from their hand-off files.
+Nothing is proposed or posted.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import shutil
+from concurrent.futures import Future, ProcessPoolExecutor, as_completed
+from decimal import Decimal
+from pathlib import Path
+
+from pandas import DataFrame
+
+from src.config import AccountingConfig, IOConfig, Network
+from src.fetch.payouts import (
+    PeriodPayouts,
+    compute_partner_payouts,
+    compute_solver_payouts,
+    prepare_payouts,
+)
+from src.logger import log_context, logging_started, set_log, start_logging
+from src.models.accounting_period import AccountingPeriod
+from src.pg_client import (
+    MultiInstanceDBFetcher,
+    analytics_fetcher,
+    split_by_accounting_period,
+)
+from src.utils.arrow_ipc import read_ipc, write_ipc
+from src.utils.columnar import write_partition
+from src.utils.script_args import add_networks_argument
+
+log = set_log(__name__)
+
+PAYOUT_COLUMNS = ["kind", "token_address", "recipient", "name", "amount_wei"]
+# analytics data handed off to the worker computing the payouts of a period
+HAND_OFF_INPUTS = ("data_per_solver", "partner_and_protocol_fees")
+
+
+class BackfillProgress:
+    """State (`done` or `failed`) of each network and period, persisted as json"""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.state: dict[str, str] = (
+            json.loads(path.read_text(encoding="utf-8")) if path.exists() else {}
+        )
+
+    @staticmethod
+    def key(network: Network, period: AccountingPeriod) -> str:
+        """Key of a network and period in the progress file"""
+        return f"{network.value}/{period}"
+
+    def is_done(self, network: Network, period: AccountingPeriod) -> bool:
+        """Whether the payouts of the period were written already"""
+        return self.state.get(self.key(network, period)) == "done"
+
+    def mark(self, network: Network, period: AccountingPeriod, state: str) -> None:
+        """Records the state of a period and writes the progress file"""
+        self.state[self.key(network, period)] = state
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_suffix(".json.tmp")
+        tmp_path.write_text(json.dumps(self.state, indent=2), encoding="utf-8")
+        os.replace(tmp_path, self.path)
+
+
+def payouts_frame(payouts: PeriodPayouts) -> DataFrame:
+    """Transfers and overdrafts of a period as one data frame with exact amounts"""
+    rows = [
+        {
+            "kind": "transfer",
+            "token_address": transfer.token.address.address if transfer.token else None,
+            "recipient": transfer.recipient.address,
+            "name": None,
+            "amount_wei": Decimal(transfer.amount_wei),
+        }
+        for transfer in payouts.transfers
+    ] + [
+        {
+            "kind": "overdraft",
+            "token_address": None,
+            "recipient": overdraft.account.address,
+            "name": overdraft.name,
+            "amount_wei": Decimal(overdraft.wei),
+        }
+        for overdraft in payouts.overdrafts
+    ]
+    return DataFrame(rows, columns=PAYOUT_COLUMNS)
+
+
+class HandOff:
+    """Arrow IPC files (see `src.utils.arrow_ipc`) passing the analytics data of a period
+    to the worker process computing its payouts, and the payouts back. Workers memory map
+    the files instead of receiving pickled data frames. The analytics data is kept until
+    the period is done, so that failed or interrupted periods are retried without fetching
+    their data again."""
+
+    def __init__(self, directory: Path):
+        self.directory = directory
+
+    def path(self, network: Network, period: AccountingPeriod, name: str) -> Path:
+        """File of a frame of a network and period"""
+        return self.directory / network.value / str(period) / f"{name}.arrow"
+
+    def has_inputs(self, network: Network, period: AccountingPeriod) -> bool:
+        """Whether the analytics data of the period was handed off already"""
+        return all(
+            self.path(network, period, name).exists() for name in HAND_OFF_INPUTS
+        )
+
+    def clear(self, network: Network, period: AccountingPeriod) -> None:
+        """Removes the files of a period"""
+        shutil.rmtree(self.directory / network.value / str(period), ignore_errors=True)
+
+
+def compute_period_payouts(
+    network: Network, period: AccountingPeriod, hand_off: HandOff
+) -> Path:
+    """Payouts of one network and period from prefetched analytics data, read from and
+    written to `hand_off`"""
+    data_per_solver, partner_and_protocol_fees = (
+        read_ipc(hand_off.path(network, period, name)) for name in HAND_OFF_INPUTS
+    )
+    path = hand_off.path(network, period, "payouts")
+    with (
+        logging_started(),
+        log_context(network=network.value, period=str(period), stage="payouts"),
+    ):
+        if data_per_solver.empty:
+            log.warning(f"No data for network {network.value} and period {period}")
+            write_ipc(DataFrame(columns=PAYOUT_COLUMNS), path)
+            return path
+        config = AccountingConfig.from_network(network)
+        payouts = prepare_payouts(
+            compute_solver_payouts(data_per_solver, config),
+            compute_partner_payouts(partner_and_protocol_fees),
+            period,
+            config,
+        )
+    write_ipc(payouts_frame(payouts), path)
+    return path
+
+
+def submit_network(
+    executor: ProcessPoolExecutor,
+    orderbook: MultiInstanceDBFetcher,
+    network: Network,
+    periods: list[AccountingPeriod],
+    hand_off: HandOff,
+) -> dict[Future[Path], tuple[Network, AccountingPeriod]]:
+    """Fetches the data of all periods of a network at once (except for periods whose
+    data was handed off already) and submits the payout computation of each period"""
+    missing = [period for period in periods if not hand_off.has_inputs(network, period)]
+    if missing:
+        config = AccountingConfig.from_network(network)
+        frames = {
+            "data_per_solver": orderbook.get_data_per_solver(missing, config),
+            "partner_and_protocol_fees": orderbook.get_partner_and_protocol_fees(
+                missing, config
+            ),
+        }
+        for name in HAND_OFF_INPUTS:
+            split = split_by_accounting_period(frames[name], missing)
+            for period in missing:
+                write_ipc(split[str(period)], hand_off.path(network, period, name))
+    return {
+        executor.submit(compute_period_payouts, network, period, hand_off): (
+            network,
+            period,
+        )
+        for period in periods
+    }
+
+
+def backfill(  # pylint: disable=too-many-arguments,too-many-positional-arguments
+    orderbook: MultiInstanceDBFetcher,
+    networks: list[Network],
+    periods: list[AccountingPeriod],
+    output_dir: Path,
+    max_workers: int | None = None,
+    force: bool = False,
+) -> BackfillProgress:
+    """Recomputes the payouts of all networks and periods which are not done yet.
+
+    While the payouts of one network are computed, the data of the next network is fetched.
+    Failing periods, including all pending periods of a network whose data could not be
+    fetched, are recorded as `failed` and retried by the next backfill.
+    """
+    progress = BackfillProgress(output_dir / "progress.json")
+    hand_off = HandOff(output_dir / "hand-off")
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        futures: dict[Future[Path], tuple[Network, AccountingPeriod]] = {}
+        for network in networks:
+            pending = [
+                period
+                for period in periods
+                if force or not progress.is_done(network, period)
+            ]
+            log.info(f"Backfilling {len(pending)} periods of network {network.value}")
+            if force:
+                for period in pending:
+                    hand_off.clear(network, period)
+            if not pending:
+                continue
+            try:
+                futures |= submit_network(
+                    executor, orderbook, network, pending, hand_off
+                )
+            except Exception as err:  # pylint: disable=broad-exception-caught
+                log.error(f"Fetching data of network {network.value} failed: {err}")
+                for period in pending:
+                    progress.mark(network, period, "failed")
+
+        for future in as_completed(futures):
+            network, period = futures[future]
+            try:
+                write_partition(
+                    read_ipc(future.result()),
+                    output_dir / "payouts",
+                    network=network.value,
+                    period=str(period),
+                )
+            except Exception as err:  # pylint: disable=broad-exception-caught
+                log.error(f"Backfill of {network.value} {period} failed: {err}")
+                progress.mark(network, period, "failed")
+                continue
+            progress.mark(network, period, "done")
+            hand_off.clear(network, period)
+    return progress
+
+
+def main() -> None:
+    """Recompute payouts for a range of accounting periods"""
+    start_logging()
+    parser = argparse.ArgumentParser("Backfill payouts")
+    parser.add_argument(
+        "--start", type=str, required=True, help="Start of first period"
+    )
+    parser.add_argument(
+        "--end", type=str, required=True, help="Latest end of the last period"
+    )
+    parser.add_argument(
+        "--length-days",
+        type=int,
+        default=7,
+        help="Length of accounting periods. The analytics tables are aggregated per "
+        "weekly accounting period, so only 7 is supported",
+    )
+    add_networks_argument(parser, "Networks to backfill. Defaults to all networks")
+    parser.add_argument(
+        "--max-workers", type=int, default=None, help="Number of worker processes"
+    )
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        help="Recompute periods which are already done",
+    )
+    args = parser.parse_args()
+    if args.length_days != 7:
+        parser.error(
+            "--length-days must be 7, the analytics data is aggregated per week"
+        )
+
+    networks = [Network(network) for network in args.networks]
+    periods = AccountingPeriod.split_range(args.start, args.end, args.length_days)
+    # the output directory does not depend on the network
+    output_dir = IOConfig.from_network(networks[0]).csv_output_dir / "backfill"
+
+    progress = backfill(
+        analytics_fetcher(),
+        networks,
+        periods,
+        output_dir,
+        args.max_workers,
+        args.force,
+    )
+    failed = [
+        f"{network.value} {period}"
+        for network in networks
+        for period in periods
+        if not progress.is_done(network, period)
+    ]
+    if failed:
+        raise RuntimeError(f"Backfill failed for {failed}")
+    log.info(f"Backfill written to {output_dir}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,18 +1,37 @@
 """All Dune related query fetching is defined here in the DuneFetcherClass"""
 
-from typing import Optional
+import time
+from datetime import timedelta
+from typing import BinaryIO, Iterable, Iterator, Optional, Sequence
 
+import pandas as pd
 from dune_client.client import DuneClient
+from dune_client.models import ExecutionState, QueryFailed
 from dune_client.query import QueryBase
 from dune_client.types import QueryParameter
+from pandas import DataFrame
 
+from src.config import DuneConfig
+from src.fetch.result_store import DuneResultStore
+from src.fetch.sharding import fetch_sharded, merge_additive
 from src.logger import set_log, log_saver
 from src.models.accounting_period import AccountingPeriod
 from src.queries import QUERIES, QueryData
+from src.utils.amounts import exact_amounts
 from src.utils.print_store import Category
+from src.utils.spans import span
 
 log = set_log(__name__)
 
+# Number of rows requested per page when streaming results as CSV.
+RESULT_BATCH_SIZE = 10_000
+# Columns of the results of `DASHBOARD_SLIPPAGE`: rows are identified by the solver, amounts
+# are sums over the period (other columns are the same in all rows of a solver)
+DASHBOARD_SLIPPAGE_KEY_COLUMNS = ("solver_address",)
+DASHBOARD_SLIPPAGE_AMOUNT_COLUMNS = ("eth_slippage_wei",)
+# Decimal strings with more significant digits are not exactly representable as float64
+FLOAT_DIGITS = 15
+
 
 class DuneFetcher:  # pylint: disable=too-few-public-methods
     """
@@ -29,10 +48,13 @@ class DuneFetcher:  # pylint: disable=too-few-public-methods
         dune: DuneClient,
         blockchain: str,
         period: AccountingPeriod,
+        result_store: Optional[DuneResultStore] = None,
     ):
         self.dune = dune
         self.blockchain = blockchain
         self.period = period
+        # Finished executions (e.g. from `src.fetch.prefetch`) are read from here if present.
+        self.result_store = result_store
         # Already have period set, so we might as well store this upon construction.
         # This may become an issue when we make the fetchers async;
         # since python does not allow async constructors
@@ -44,10 +66,7 @@ class DuneFetcher:  # pylint: disable=too-few-public-methods
 
     def _network_and_period_params(self) -> list[QueryParameter]:
         """Easier access to parameters for network and accounting period."""
-        network_param = QueryParameter.text_type("blockchain", self.blockchain)
-        period_params = self._period_params()
-
-        return period_params + [network_param]
+        return network_and_period_params(self.blockchain, self.period)
 
     @staticmethod
     def _parameterized_query(
@@ -60,6 +79,12 @@ class DuneFetcher:  # pylint: disable=too-few-public-methods
     ) -> list[dict[str, str]]:
         """Internally every dune query execution is routed through here."""
         log.info(f"Fetching {query.name} from query: {query}")
+        if not job_id and self.result_store is not None:
+            stored_rows = self.result_store.load_rows(query)
+            if stored_rows is not None:
+                self._log_stored_execution(query)
+                return stored_rows
+
         if not job_id:
             exec_result = self.dune.refresh(query, ping_frequency=15)
         else:
@@ -77,12 +102,233 @@ class DuneFetcher:  # pylint: disable=too-few-public-methods
             log.warning(f"No execution results found for {exec_result.execution_id}")
         return exec_result.get_rows()
 
+    def _log_stored_execution(self, query: QueryBase) -> None:
+        assert self.result_store is not None
+        execution_id = self.result_store.execution_id(query)
+        log.info(f"Using stored results of execution {execution_id}")
+        log_saver.print(
+            f"{query.name} execution ID: {execution_id}", Category.EXECUTION
+        )
+
+    def _iter_csv_frames(
+        self,
+        query: QueryBase,
+        job_id: Optional[str] = None,
+        batch_size: int = RESULT_BATCH_SIZE,
+    ) -> Iterator[DataFrame]:
+        """Streams the results of a query as string frames of at most `batch_size` rows,
+        from the result store if possible."""
+        if not job_id and self.result_store is not None:
+            stored = self.result_store.load_csv(query)
+            if stored is not None:
+                self._log_stored_execution(query)
+                yield from read_csv_strings(stored, chunksize=batch_size)
+                return
+        yield from execute_query_frames(self.dune, query, job_id, batch_size)
+
+    def iter_query_frames(
+        self,
+        query: QueryBase,
+        job_id: Optional[str] = None,
+        batch_size: int = RESULT_BATCH_SIZE,
+        amount_columns: Sequence[str] = (),
+    ) -> Iterator[DataFrame]:
+        """Streams the results of a query as data frames of at most `batch_size` rows.
+
+        Results are paginated through the CSV endpoint, so that at most one batch is held in
+        memory at a time and no python dict is constructed per row. `amount_columns` are
+        parsed exactly (see `src.utils.amounts`), all other columns are kept as strings:
+        types inferred per batch could differ between batches.
+        """
+        for frame in self._iter_csv_frames(query, job_id, batch_size):
+            yield parse_amount_columns(frame, amount_columns)
+
+    def get_query_frame(
+        self,
+        query: QueryBase,
+        job_id: Optional[str] = None,
+        batch_size: int = RESULT_BATCH_SIZE,
+        amount_columns: Sequence[str] = (),
+    ) -> DataFrame:
+        """Fetches the complete results of a query as a single typed data frame. Types are
+        inferred once for all batches (see `type_columns`). Use `iter_query_frames` to
+        process results which do not fit into memory."""
+        frames = list(self._iter_csv_frames(query, job_id, batch_size))
+        return type_columns(pd.concat(frames, ignore_index=True), amount_columns)
+
+    def get_dashboard_slippage(
+        self,
+        job_id: Optional[str] = None,
+        batch_size: int = RESULT_BATCH_SIZE,
+        period: Optional[AccountingPeriod] = None,
+        shard_length: Optional[timedelta] = None,
+    ) -> DataFrame:
+        """Fetches per solver slippage of the accounting period as data frame.
+        If `period` is given (e.g. a sub-period), slippage of that period is fetched
+        instead. Batches are added up per solver as they arrive (see
+        `sum_dashboard_slippage`). With `shard_length`, sub-periods of that length are
+        fetched in parallel and added up (see `src.fetch.sharding`)."""
+        if shard_length is not None:
+            assert job_id is None, "Sharded results span several executions"
+            shards = fetch_sharded(
+                lambda shard: self.get_dashboard_slippage(
+                    batch_size=batch_size, period=shard
+                ),
+                period or self.period,
+                shard_length,
+            )
+            return merge_additive(
+                shards,
+                DASHBOARD_SLIPPAGE_KEY_COLUMNS,
+                DASHBOARD_SLIPPAGE_AMOUNT_COLUMNS,
+            )
+        query = dashboard_slippage_query(self.blockchain, period or self.period)
+        return sum_dashboard_slippage(self._iter_csv_frames(query, job_id, batch_size))
+
     def get_block_interval(self) -> tuple[str, str]:
         """Returns block numbers corresponding to date interval"""
-        results = self._get_query_results(
-            self._parameterized_query(
-                QUERIES["PERIOD_BLOCK_INTERVAL"], self._network_and_period_params()
+        with span("dune_block_interval"):
+            results = self._get_query_results(
+                self._parameterized_query(
+                    QUERIES["PERIOD_BLOCK_INTERVAL"], self._network_and_period_params()
+                )
             )
-        )
         assert len(results) == 1, "Block Interval Query should return only 1 result!"
         return str(results[0]["start_block"]), str(results[0]["end_block"])
+
+
+def network_and_period_params(
+    blockchain: str, period: AccountingPeriod
+) -> list[QueryParameter]:
+    """Query parameters for network and accounting period."""
+    network_param = QueryParameter.text_type("blockchain", blockchain)
+    return period.as_query_params() + [network_param]
+
+
+def dune_client(config: DuneConfig) -> DuneClient:
+    """Client of the Dune API of a configuration"""
+    return DuneClient(config.dune_api_key, base_url=config.dune_api_url)
+
+
+def dashboard_slippage_query(blockchain: str, period: AccountingPeriod) -> QueryBase:
+    """Query of the per solver slippage of a network and (sub-)period"""
+    return QUERIES["DASHBOARD_SLIPPAGE"].with_params(
+        network_and_period_params(blockchain, period)
+    )
+
+
+def sum_dashboard_slippage(frames: Iterable[DataFrame]) -> DataFrame:
+    """Per solver slippage from the string frames of the results of `DASHBOARD_SLIPPAGE`.
+    Amounts are parsed exactly and added up per solver batch by batch, so that memory is
+    bounded by the number of solvers rather than by the number of result rows."""
+    total: DataFrame | None = None
+    for frame in frames:
+        frame = parse_amount_columns(frame, DASHBOARD_SLIPPAGE_AMOUNT_COLUMNS)
+        total = merge_additive(
+            [frame] if total is None else [total, frame],
+            DASHBOARD_SLIPPAGE_KEY_COLUMNS,
+            DASHBOARD_SLIPPAGE_AMOUNT_COLUMNS,
+        )
+    assert total is not None, "Results have at least one page"
+    return total
+
+
+def execute_query_frames(
+    dune: DuneClient,
+    query: QueryBase,
+    job_id: Optional[str] = None,
+    batch_size: int = RESULT_BATCH_SIZE,
+) -> Iterator[DataFrame]:
+    """Executes a query (unless `job_id` of a finished execution is given) and streams its
+    results as string frames of at most `batch_size` rows."""
+    if not job_id:
+        log.info(f"Executing {query.name} from query: {query}")
+        job_id = dune.execute_query(query).execution_id
+        wait_for_execution(dune, job_id)
+    log_saver.print(f"{query.name} execution ID: {job_id}", Category.EXECUTION)
+    for page in iter_result_pages(dune, job_id, batch_size):
+        yield read_csv_page(page)
+
+
+def wait_for_execution(dune: DuneClient, job_id: str, ping_frequency: int = 15) -> None:
+    """Waits until an execution reaches a terminal state. Raises if it did not complete."""
+    status = dune.get_execution_status(job_id)
+    while status.state not in ExecutionState.terminal_states():
+        time.sleep(ping_frequency)
+        status = dune.get_execution_status(job_id)
+    if status.state != ExecutionState.COMPLETED:
+        raise QueryFailed(
+            f"Execution {job_id} ended in state {status.state}: {status.error}"
+        )
+
+
+def iter_result_pages(
+    dune: DuneClient, job_id: str, batch_size: int = RESULT_BATCH_SIZE
+) -> Iterator[BinaryIO]:
+    """Pages through the CSV results of a finished execution."""
+    offset = 0
+    while True:
+        batch = dune.get_execution_results_csv(job_id, limit=batch_size, offset=offset)
+        log.debug(f"Fetched batch at offset {offset} for execution {job_id}")
+        yield batch.data
+        if batch.next_offset is None:
+            break
+        offset = int(batch.next_offset)
+
+
+def read_csv_strings(data: BinaryIO, chunksize: int) -> Iterator[DataFrame]:
+    """Reads CSV data in chunks without any type inference."""
+    yield from pd.read_csv(
+        data, dtype=str, keep_default_na=False, na_values=[""], chunksize=chunksize
+    )
+
+
+def read_csv_page(data: BinaryIO) -> DataFrame:
+    """Reads a page of CSV results without any type inference."""
+    return pd.read_csv(data, dtype=str, keep_default_na=False, na_values=[""])
+
+
+def csv_to_frame(data: BinaryIO, amount_columns: Sequence[str] = ()) -> DataFrame:
+    """Parses a CSV batch of Dune results into a typed data frame (see `type_columns`)."""
+    return type_columns(read_csv_page(data), amount_columns)
+
+
+def parse_amount_columns(frame: DataFrame, amount_columns: Sequence[str]) -> DataFrame:
+    """Parses the `amount_columns` (if present) of a string frame into exact amounts."""
+    for column in amount_columns:
+        if column in frame.columns:
+            frame[column] = exact_amounts(frame[column], fill_value=None)
+    return frame
+
+
+def type_columns(frame: DataFrame, amount_columns: Sequence[str] = ()) -> DataFrame:
+    """Converts the string columns of a frame of Dune results into typed columns.
+
+    Columns in `amount_columns`, columns consisting only of integers and decimal columns
+    with values which are not exactly representable as floats are parsed into exact amounts
+    (see `src.utils.amounts`). Other numeric columns are parsed as floats and all remaining
+    columns are kept as strings. Types depend on all values of a column, so the results of
+    a query are typed at once.
+    """
+    frame = parse_amount_columns(frame, amount_columns)
+    for column in frame.columns:
+        if column in amount_columns:
+            continue
+        values = frame[column]
+        non_null = values.dropna()
+        if len(non_null) == 0:
+            continue
+        if non_null.str.fullmatch(r"-?\d+").all() or (
+            non_null.str.fullmatch(r"-?\d+(\.\d+)?").all()
+            and non_null.str.replace(r"[-.]", "", regex=True)
+            .str.lstrip("0")
+            .str.len()
+            .max()
+            > FLOAT_DIGITS
+        ):
+            frame[column] = exact_amounts(values, fill_value=None)
+            continue
+        numeric = pd.to_numeric(values, errors="coerce")
+        if numeric.notna().sum() == len(non_null):
+            frame[column] = numeric
+    return frame
@@ -0,0 +1,228 @@
+"""
+Incremental accumulation of per solver aggregates of an accounting period.
+
+Aggregates which are sums over the period (the per solver slippage of the Dune dashboard
+query, see `DASHBOARD_SLIPPAGE_AMOUNT_COLUMNS`) are fetched for each day once the day has
+ended and its data has arrived on Dune (see `DATA_DELAY`), and stored as daily partials.
+Unlike the analytics tables, which hold one row per solver and weekly accounting period,
+the Dune query accepts arbitrary bounds. Aggregates of the ended days of the period are
+merged from the stored partials, only fetching the days which are missing (see
+`src.fetch.sharding`). The day which has not ended yet can be fetched on top of them
+without storing it (see `running_day`). This gives previews during the week (see
+`src.fetch.preview`). The
+week close does not use the partials: it needs the per period values (e.g. consistency
+rewards and conversion rates) of the analytics tables.
+
+Meant to be run daily, e.g. a few hours after midnight for the current accounting period.
+"""
+
+from __future__ import annotations
+
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Callable, Sequence
+
+import pandas as pd
+from dune_client.client import DuneClient
+from pandas import DataFrame
+from pandas.api.types import infer_dtype
+
+from src.config import DuneConfig, IOConfig, Network
+from src.fetch.dune import (
+    DASHBOARD_SLIPPAGE_AMOUNT_COLUMNS,
+    DASHBOARD_SLIPPAGE_KEY_COLUMNS,
+    dune_client,
+    dashboard_slippage_query,
+    execute_query_frames,
+    sum_dashboard_slippage,
+)
+from src.fetch.sharding import merge_additive
+from src.logger import log_context, set_log, start_logging
+from src.models.accounting_period import AccountingPeriod
+from src.utils.amounts import exact_amounts
+from src.utils.columnar import partition_dir, write_partition
+from src.utils.script_args import add_networks_argument, add_start_argument
+
+log = set_log(__name__)
+
+# Time after the end of a day until its data is complete on Dune
+DATA_DELAY = timedelta(hours=2)
+
+
+class PartialStore:
+    """Daily partial aggregates per network, stored as parquet partitions"""
+
+    def __init__(self, root: Path):
+        self.root = root
+
+    def path(self, network: Network, day: AccountingPeriod) -> Path:
+        """File of the partial of a day"""
+        return (
+            partition_dir(self.root, network=network.value, day=str(day))
+            / "part.parquet"
+        )
+
+    def has(self, network: Network, day: AccountingPeriod) -> bool:
+        """Whether the partial of the day is stored"""
+        return self.path(network, day).exists()
+
+    def save(self, network: Network, day: AccountingPeriod, frame: DataFrame) -> None:
+        """Stores the partial of a day"""
+        write_partition(frame, self.root, network=network.value, day=str(day))
+
+    def load(self, network: Network, day: AccountingPeriod) -> DataFrame:
+        """Reads the partial of a day. Amounts stored as decimals are converted back to
+        exact amounts (see `src.utils.amounts`)."""
+        frame = pd.read_parquet(self.path(network, day))
+        for column in frame.columns:
+            if infer_dtype(frame[column], skipna=True) == "decimal":
+                frame[column] = exact_amounts(frame[column], fill_value=None)
+        return frame
+
+
+def completed_days(
+    period: AccountingPeriod, now: datetime | None = None
+) -> list[AccountingPeriod]:
+    """Days of the period which have ended at least `DATA_DELAY` ago"""
+    now = now or datetime.now()
+    return [
+        day for day in period.split(timedelta(days=1)) if day.end + DATA_DELAY <= now
+    ]
+
+
+def data_until(period: AccountingPeriod, now: datetime | None = None) -> datetime:
+    """End of the data of the period which is complete at `now`: `DATA_DELAY` before
+    `now`, truncated to the full hour and bounded by the period"""
+    now = now or datetime.now()
+    until = (now - DATA_DELAY).replace(minute=0, second=0, microsecond=0)
+    return max(period.start, min(until, period.end))
+
+
+def running_day(
+    period: AccountingPeriod, now: datetime | None = None
+) -> AccountingPeriod | None:
+    """Part of the first day of the period which has not ended (see `completed_days`)
+    with complete data, if any"""
+    days = completed_days(period, now)
+    start = days[-1].end if days else period.start
+    end = data_until(period, now)
+    return AccountingPeriod.from_bounds(start, end) if start < end else None
+
+
+def check_columns(
+    day: AccountingPeriod, frame: DataFrame, columns: Sequence[str]
+) -> None:
+    """Raises a ValueError if the partial of a day lacks any of `columns`"""
+    lacking = [column for column in columns if column not in frame]
+    if lacking:
+        raise ValueError(f"Partial of day {day} lacks columns {lacking}")
+
+
+def accumulate(  # pylint: disable=too-many-arguments,too-many-positional-arguments
+    store: PartialStore,
+    network: Network,
+    days: Sequence[AccountingPeriod],
+    fetch: Callable[[AccountingPeriod], DataFrame],
+    columns: Sequence[str],
+    max_workers: int = 4,
+) -> list[DataFrame]:
+    """Partials of all days, fetching (concurrently) and storing the missing ones.
+
+    Partials without rows are returned but not stored, so that they are fetched again
+    next time. Partials lacking any of `columns` raise a ValueError.
+    """
+    missing = [day for day in days if not store.has(network, day)]
+    fetched: dict[str, DataFrame] = {}
+    if missing:
+        log.info(f"Fetching {len(missing)} daily partials of network {network.value}")
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            for day, frame in zip(missing, executor.map(fetch, missing)):
+                check_columns(day, frame, columns)
+                if frame.empty:
+                    log.warning(f"Partial of day {day} is empty, it is not stored")
+                    fetched[str(day)] = frame
+                    continue
+                store.save(network, day, frame)
+    return [
+        fetched[str(day)] if str(day) in fetched else store.load(network, day)
+        for day in days
+    ]
+
+
+def period_aggregate(  # pylint: disable=too-many-arguments,too-many-positional-arguments
+    store: PartialStore,
+    network: Network,
+    period: AccountingPeriod,
+    fetch: Callable[[AccountingPeriod], DataFrame],
+    keys: Sequence[str],
+    additive_columns: Sequence[str],
+    now: datetime | None = None,
+    running: bool = False,
+) -> DataFrame:
+    """Aggregate of all days of the period which have ended, merged from daily partials.
+    With `running`, the day which has not ended yet (see `running_day`) is fetched and
+    added as well, without storing it. Only `additive_columns` are added up, the first
+    value of other columns is used. Raises a ValueError if there is no complete data of
+    the period yet or if all partials are empty."""
+    columns = list(keys) + list(additive_columns)
+    days = completed_days(period, now)
+    frames = accumulate(store, network, days, fetch, columns)
+    day = running_day(period, now) if running else None
+    if day is not None:
+        log.info(f"Fetching the running day {day} of network {network.value}")
+        frames.append(fetch(day))
+        check_columns(day, frames[-1], columns)
+    if not frames:
+        raise ValueError(f"No data of period {period} is complete yet.")
+    frames = [frame for frame in frames if len(frame)]
+    if not frames:
+        raise ValueError(f"All daily partials of period {period} are empty.")
+    log.info(f"Aggregating {len(days)} daily partials of period {period}")
+    return merge_additive(frames, keys, additive_columns)
+
+
+def dashboard_slippage_fetcher(
+    dune: DuneClient, blockchain: str
+) -> Callable[[AccountingPeriod], DataFrame]:
+    """Fetches the per solver slippage of a day from Dune"""
+
+    def fetch(day: AccountingPeriod) -> DataFrame:
+        return sum_dashboard_slippage(
+            execute_query_frames(dune, dashboard_slippage_query(blockchain, day))
+        )
+
+    return fetch
+
+
+def main() -> None:
+    """Stores the daily partials of all ended days of an accounting period"""
+    start_logging()
+    parser = argparse.ArgumentParser("Accumulate daily partials")
+    add_start_argument(parser)
+    add_networks_argument(parser, "Networks to accumulate. Defaults to all networks")
+    args = parser.parse_args()
+
+    period = AccountingPeriod(args.start)
+    networks = [Network(network) for network in args.networks]
+    # the Dune API key and the output directory do not depend on the network
+    dune = dune_client(DuneConfig.from_network(networks[0]))
+    store = PartialStore(IOConfig.from_network(networks[0]).csv_output_dir / "partials")
+
+    for network in networks:
+        with log_context(network=network.value, period=str(period), stage="partials"):
+            blockchain = DuneConfig.from_network(network).dune_blockchain
+            aggregate = period_aggregate(
+                store,
+                network,
+                period,
+                dashboard_slippage_fetcher(dune, blockchain),
+                DASHBOARD_SLIPPAGE_KEY_COLUMNS,
+                DASHBOARD_SLIPPAGE_AMOUNT_COLUMNS,
+            )
+            log.info(f"Slippage of {period} so far:\n{aggregate.to_string()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -13,14 +13,21 @@ from pandas import DataFrame, Series
 
 from src.config import AccountingConfig
 from src.fetch.dune import DuneFetcher
-from src.fetch.prices import exchange_rate_atoms
+from src.fetch.prices import (
+    TOKEN_ADDRESS_TO_ID,
+    TokenId,
+    exchange_rate_atoms,
+    prefetch_usd_prices,
+)
 from src.logger import log_saver, set_log
 from src.models.accounting_period import AccountingPeriod
 from src.models.overdraft import Overdraft
 from src.models.token import Token
 from src.models.transfer import Transfer
 from src.pg_client import MultiInstanceDBFetcher
+from src.utils.amounts import wei_amounts
 from src.utils.print_store import Category
+from src.utils.spans import span
 
 log = set_log(__name__)
 
@@ -273,7 +280,7 @@ class RewardAndPenaltyDatum:  # pylint: disable=too-many-instance-attributes
         return result
 
 
-def prepare_payouts(  # pylint: disable=too-many-locals
+def prepare_payouts(
     solver_payouts: DataFrame,
     partner_payouts: DataFrame,
     period: AccountingPeriod,
@@ -322,6 +329,28 @@ def prepare_payouts(  # pylint: disable=too-many-locals
     assert set(SOLVER_PAYOUTS_COLUMNS) == set(solver_payouts.columns)
     assert set(PARTNER_PAYOUTS_COLUMNS) == set(partner_payouts.columns)
 
+    payouts = prepare_solver_payouts(solver_payouts, period)
+    payouts.transfers += prepare_fee_payouts(solver_payouts, partner_payouts, config)
+    return payouts
+
+
+def prepare_solver_payouts(
+    solver_payouts: DataFrame, period: AccountingPeriod
+) -> PeriodPayouts:
+    """Prepare the reward and reimbursement transfers and the overdrafts of solvers.
+
+    Parameters
+    ----------
+    solver_payouts : DataFrame
+        Data frame containing payout information for solvers, see `prepare_payouts`.
+    period : AccountingPeriod
+        The current accounting period for which the payouts are being prepared.
+
+    Returns
+    -------
+    PeriodPayouts
+        Overdrafts and transfers of solvers.
+    """
     overdrafts: list[Overdraft] = []
     transfers: list[Transfer] = []
     for _, payment in solver_payouts.iterrows():
@@ -336,7 +365,29 @@ def prepare_payouts(  # pylint: disable=too-many-locals
             print(f"Solver Overdraft! {overdraft}")
             overdrafts.append(overdraft)
         transfers += payout_datum.as_payouts()
+    return PeriodPayouts(overdrafts, transfers)
+
+
+def prepare_fee_payouts(
+    solver_payouts: DataFrame, partner_payouts: DataFrame, config: AccountingConfig
+) -> list[Transfer]:
+    """Prepare the transfers of protocol fees, partner fee taxes and partner fees.
+
+    Parameters
+    ----------
+    solver_payouts : DataFrame
+        Data frame containing payout information for solvers, see `prepare_payouts`.
+    partner_payouts : DataFrame
+        Data frame containing payout information for partners, see `prepare_payouts`.
+    config : AccountingConfig
+        Configuration object containing the protocol fee configuration.
 
+    Returns
+    -------
+    list[Transfer]
+        Transfers of fees, which do not depend on the reward configuration.
+    """
+    transfers: list[Transfer] = []
     total_protocol_fee = int(solver_payouts["protocol_fee_eth"].sum())
     total_partner_fee = int(partner_payouts["partner_fee_eth"].sum())
     total_partner_fee_taxed = sum(
@@ -384,43 +435,67 @@ def prepare_payouts(  # pylint: disable=too-many-locals
                 )
             )
 
-    return PeriodPayouts(overdrafts, transfers)
+    return transfers
 
 
-def fetch_exchange_rates(
+def resolve_exchange_rate_native_to_eth(
     period_end: datetime, config: AccountingConfig
-) -> tuple[Fraction, Fraction]:
-    """Fetch exchange rates.
+) -> Fraction:
+    """Resolve the exchange rate from the native token to ETH.
 
-    Fetches exchange rates for converting COW to native tokens and ETH to native tokens. The
-    exchange rate is an average rate from the day before the end of the accounting period.
+    If the native token is ETH, the rate is one and nothing is fetched. Otherwise, the
+    rate is fetched from external price providers. It is an average rate from the day
+    before the end of the accounting period.
 
     Parameters
     ----------
     period_end : datetime
-        The end of the accounting period for which the exchange rates are being fetched.
-
+        The end of the accounting period for which the exchange rate is resolved.
     config : AccountingConfig
-        Configuration object containing reward and payment settings, including token addresses.
+        Configuration object containing payment settings, including token addresses.
 
     Returns
     -------
-    exchange_rate_native_to_cow : Fraction
-        The rate of exchange from the native token to COW.
     exchange_rate_native_to_eth: Fraction
         The rate of exchange from the native token to ETH.
     """
-    reward_token = config.reward_config.reward_token_address
     native_token = Address(config.payment_config.wrapped_native_token_address)
     wrapped_eth = config.payment_config.wrapped_eth_address
+    if native_token == wrapped_eth:
+        return Fraction(1)
+
     price_day = period_end - timedelta(days=1)
-    exchange_rate_native_to_cow = exchange_rate_atoms(
-        native_token, reward_token, price_day
-    )
-    exchange_rate_native_to_eth = exchange_rate_atoms(
-        native_token, wrapped_eth, price_day
-    )
-    return exchange_rate_native_to_cow, exchange_rate_native_to_eth
+    with span("price_lookup"):
+        prefetch_usd_prices(exchange_rate_prices(period_end, config))
+        return exchange_rate_atoms(native_token, wrapped_eth, price_day)
+
+
+def exchange_rate_prices(
+    period_end: datetime, config: AccountingConfig
+) -> list[tuple[TokenId, datetime]]:
+    """Prices (token and day) used by `resolve_exchange_rate_native_to_eth` if the rate
+    is fetched from external price providers, none if the native token is ETH.
+
+    Parameters
+    ----------
+    period_end : datetime
+        The end of the accounting period for which the exchange rate is resolved.
+    config : AccountingConfig
+        Configuration object containing payment settings, including token addresses.
+
+    Returns
+    -------
+    list[tuple[TokenId, datetime]]
+        Token and day of the prices.
+    """
+    native_token = Address(config.payment_config.wrapped_native_token_address)
+    wrapped_eth = config.payment_config.wrapped_eth_address
+    if native_token == wrapped_eth:
+        return []
+    price_day = period_end - timedelta(days=1)
+    return [
+        (TOKEN_ADDRESS_TO_ID[token], price_day) for token in (native_token, wrapped_eth)
+    ]
 
 
 def compute_solver_payouts(
@@ -481,30 +556,28 @@ def compute_solver_payouts(
     solver_payouts = DataFrame(columns=SOLVER_PAYOUTS_COLUMNS, dtype=object)
     solver_payouts["solver"] = data_per_solver["solver"]
     solver_payouts["solver_name"] = data_per_solver["solver_name"]
-    solver_payouts["primary_reward_eth"] = (
-        data_per_solver["sum_batch_reward_native"].fillna(0).astype(object)
-    )
-    solver_payouts["primary_reward_cow"] = (
-        data_per_solver["sum_batch_reward_cow"].fillna(0).astype(object)
+    solver_payouts["primary_reward_eth"] = wei_amounts(
+        data_per_solver["sum_batch_reward_native"]
     )
-    solver_payouts["consistency_reward_eth"] = (
-        data_per_solver["consistency_reward_native"].fillna(0).astype(object)
+    solver_payouts["primary_reward_cow"] = wei_amounts(
+        data_per_solver["sum_batch_reward_cow"]
     )
-    solver_payouts["consistency_reward_cow"] = (
-        data_per_solver["consistency_reward_cow"].fillna(0).astype(object)
+    solver_payouts["consistency_reward_eth"] = wei_amounts(
+        data_per_solver["consistency_reward_native"]
     )
-    solver_payouts["quote_reward_cow"] = (
-        data_per_solver["sum_quote_reward_cow"].fillna(0).astype(object)
+    solver_payouts["consistency_reward_cow"] = wei_amounts(
+        data_per_solver["consistency_reward_cow"]
     )
-    solver_payouts["protocol_fee_eth"] = (
-        data_per_solver["sum_protocol_fee_native"].fillna(0).astype(object)
+    solver_payouts["quote_reward_cow"] = wei_amounts(
+        data_per_solver["sum_quote_reward_cow"]
     )
-    solver_payouts["network_fee_eth"] = (
-        data_per_solver["sum_network_fee_native"].fillna(0).astype(object)
+    solver_payouts["protocol_fee_eth"] = wei_amounts(
+        data_per_solver["sum_protocol_fee_native"]
     )
-    solver_payouts["slippage_eth"] = (
-        data_per_solver["sum_slippage_native"].fillna(0).astype(object)
+    solver_payouts["network_fee_eth"] = wei_amounts(
+        data_per_solver["sum_network_fee_native"]
     )
+    solver_payouts["slippage_eth"] = wei_amounts(data_per_solver["sum_slippage_native"])
     solver_payouts["reward_target"] = data_per_solver["reward_target"]
 
     send_buffers_to_rewards_address_pools_addresses = [
@@ -541,9 +614,9 @@ def compute_partner_payouts(partner_and_protocol_fees: DataFrame) -> DataFrame:
     """
     partner_payouts = DataFrame(columns=PARTNER_PAYOUTS_COLUMNS, dtype=object)
     partner_payouts["partner"] = partner_and_protocol_fees["partner_fee_recipient"]
-    partner_payouts["partner_fee_eth"] = partner_and_protocol_fees[
-        "sum_partner_fee_native"
-    ]
+    partner_payouts["partner_fee_eth"] = wei_amounts(
+        partner_and_protocol_fees["sum_partner_fee_native"]
+    )
     partner_payouts["partner_fee_tax"] = partner_and_protocol_fees["partner_fee_cut"]
 
     partner_payouts = partner_payouts[partner_payouts["partner"].notnull()]
@@ -656,20 +729,51 @@ def construct_payouts(
     -----
     Overdrafts are set and managed by an external contract.
     """
-    # pylint: disable=too-many-locals
-
     data_per_solver = orderbook.get_data_per_solver(
         accounting_period=dune.period, config=config
     )
     partner_and_protocol_fees = orderbook.get_partner_and_protocol_fees(
         accounting_period=dune.period, config=config
     )
-    solver_payouts = compute_solver_payouts(data_per_solver, config)
+    return compute_payouts(
+        data_per_solver, partner_and_protocol_fees, dune.period, config
+    )
+
+
+def compute_payouts(
+    data_per_solver: DataFrame,
+    partner_and_protocol_fees: DataFrame,
+    period: AccountingPeriod,
+    config: AccountingConfig,
+) -> PeriodPayouts:
+    """Compute payouts from fetched analytics data.
+
+    Parameters
+    ----------
+    data_per_solver : DataFrame
+        Data per solver as fetched from the analytics database.
+    partner_and_protocol_fees : DataFrame
+        Partner and protocol fees as fetched from the analytics database.
+    period : AccountingPeriod
+        The accounting period of the data.
+    config : AccountingConfig
+        Configuration object containing all settings relevant to accounting.
+
+    Returns
+    -------
+    PeriodPayouts
+        Transfers and overdrafts of the period.
+    """
+    with span("compute_solver_payouts") as timing:
+        solver_payouts = compute_solver_payouts(data_per_solver, config)
+        timing.add(len(solver_payouts))
     partner_payouts = compute_partner_payouts(partner_and_protocol_fees)
     exchange_rate_native_to_cow = Fraction(
         1 / data_per_solver.iloc[0]["conversion_rate_cow_to_native"]
     )
-    _, exchange_rate_native_to_eth = fetch_exchange_rates(dune.period.end, config)
+    exchange_rate_native_to_eth = resolve_exchange_rate_native_to_eth(
+        period.end, config
+    )
 
     summarize_payments(
         solver_payouts,
@@ -680,7 +784,9 @@ def construct_payouts(
     )
 
     # create transfers and overdrafts
-    payouts = prepare_payouts(solver_payouts, partner_payouts, dune.period, config)
+    with span("prepare_payouts") as timing:
+        payouts = prepare_payouts(solver_payouts, partner_payouts, period, config)
+        timing.add(len(payouts.transfers) + len(payouts.overdrafts))
 
     for overdraft in payouts.overdrafts:
         log_saver.print(str(overdraft), Category.OVERDRAFT)
@@ -0,0 +1,109 @@
+"""
+Script to trigger all Dune executions of an accounting period ahead of the payout run.
+
+All executions (for all queries and networks) are started at once and their ids and results
+are written to the local result store. The payout run (`src.fetch.transfer_file`) then reads
+the finished results instead of waiting for fresh executions.
+Meant to be run on a schedule shortly after the accounting period has ended.
+"""
+
+from __future__ import annotations
+
+import argparse
+
+from dune_client.client import DuneClient
+from dune_client.query import QueryBase
+
+from src.config import DuneConfig, IOConfig, Network
+from src.fetch.dune import (
+    iter_result_pages,
+    network_and_period_params,
+    wait_for_execution,
+)
+from src.fetch.result_store import DuneResultStore
+from src.logger import set_log, start_logging
+from src.models.accounting_period import AccountingPeriod
+from src.queries import QUERIES
+from src.utils.script_args import add_networks_argument, add_start_argument
+
+log = set_log(__name__)
+
+
+def period_queries(
+    networks: list[Network], period: AccountingPeriod
+) -> list[QueryBase]:
+    """All parameterized queries required for the payout run of the given networks"""
+    queries = []
+    for network in networks:
+        params = network_and_period_params(
+            DuneConfig.from_network(network).dune_blockchain, period
+        )
+        queries += [query_data.with_params(params) for query_data in QUERIES.values()]
+    return queries
+
+
+def prefetch(
+    dune: DuneClient,
+    queries: list[QueryBase],
+    store: DuneResultStore,
+    force: bool = False,
+) -> None:
+    """Starts executions for all queries without results in the store and stores results.
+
+    All executions are started before waiting on any of them, so that they run concurrently
+    on Dune's side. Results of the other executions are stored even if an execution fails,
+    the failures are raised together at the end.
+    """
+    pending: dict[str, QueryBase] = {}
+    for query in queries:
+        if not force and store.execution_id(query) is not None:
+            log.info(f"Results for {query.name} ({query.url()}) already stored")
+            continue
+        job_id = dune.execute_query(query).execution_id
+        log.info(f"Started execution {job_id} for {query.name} ({query.url()})")
+        pending[job_id] = query
+
+    failed = []
+    for job_id, query in pending.items():
+        try:
+            wait_for_execution(dune, job_id)
+            store.save(query, job_id, iter_result_pages(dune, job_id))
+        except Exception as err:  # pylint: disable=broad-exception-caught
+            log.error(
+                f"Execution {job_id} for {query.name} ({query.url()}) failed: {err}"
+            )
+            failed.append(f"{query.name} ({job_id})")
+    if failed:
+        raise RuntimeError(f"Prefetching failed for {failed}")
+
+
+def main() -> None:
+    """Prefetch Dune results of an accounting period for all configured networks"""
+    start_logging()
+    parser = argparse.ArgumentParser("Prefetch Dune results")
+    add_start_argument(parser)
+    add_networks_argument(
+        parser, "Networks to prefetch results for. Defaults to all networks"
+    )
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        help="Re-execute queries even if results are already stored",
+    )
+    args = parser.parse_args()
+
+    networks = [Network(network) for network in args.networks]
+    period = AccountingPeriod(args.start)
+    # the Dune API key and the output directory do not depend on the network
+    dune_config = DuneConfig.from_network(networks[0])
+
+    prefetch(
+        dune=DuneClient(dune_config.dune_api_key, base_url=dune_config.dune_api_url),
+        queries=period_queries(networks, period),
+        store=DuneResultStore(IOConfig.from_network(networks[0]).dune_result_dir),
+        force=args.force,
+    )
+
+
+if __name__ == "__main__":
+    main()
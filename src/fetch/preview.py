@@ -0,0 +1,325 @@
+"""
+Running estimate of the slippage of the current (unfinished) accounting period.
+
+The per solver slippage of the days of the period which have ended is merged from daily
+partials of the Dune dashboard slippage query (see `src.fetch.partials`, only days which
+are not stored yet are fetched), together with the slippage of the running day up to the
+last full hour with complete data. Results are cached per network and period together
+with a digest of the row of each solver, so that a refresh only updates solvers whose
+data changed. Totals are projected linearly from the covered time to the full period.
+Payouts
+are not previewed: rewards and fees are only available per accounting period in the
+analytics tables.
+
+The preview is either computed once (e.g. hourly from cron) or served over HTTP with
+`--serve`, refreshing every `--refresh-interval` seconds. Nothing is proposed or posted.
+"""
+
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import os
+import threading
+from dataclasses import asdict, dataclass
+from datetime import date, datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, Callable
+
+from pandas import DataFrame, Series
+
+from src.config import DuneConfig, IOConfig, Network, load_env
+from src.fetch.dune import (
+    DASHBOARD_SLIPPAGE_AMOUNT_COLUMNS,
+    DASHBOARD_SLIPPAGE_KEY_COLUMNS,
+    dune_client,
+)
+from src.fetch.partials import (
+    PartialStore,
+    data_until,
+    dashboard_slippage_fetcher,
+    period_aggregate,
+)
+from src.logger import log_context, set_log, start_logging
+from src.models.accounting_period import AccountingPeriod
+from src.utils.script_args import add_networks_argument
+
+log = set_log(__name__)
+
+DEFAULT_REFRESH_INTERVAL = 3600
+
+
+@dataclass(frozen=True)
+class SolverPreview:
+    """Slippage of a solver for the period so far"""
+
+    solver: str
+    solver_name: str
+    slippage_wei: int
+
+    @classmethod
+    def from_series(cls, row: Series) -> SolverPreview:
+        """Preview from a row of the dashboard slippage (see `sum_dashboard_slippage`)"""
+        return cls(
+            solver=str(row["solver_address"]),
+            solver_name=str(row.get("solver_name", "")),
+            slippage_wei=int(row["eth_slippage_wei"]),
+        )
+
+
+def row_digest(row: Series) -> str:
+    """Digest of the data of a solver"""
+    values = json.dumps([str(value) for value in row], separators=(",", ":"))
+    return hashlib.sha256(values.encode()).hexdigest()
+
+
+def current_period_start(today: date | None = None) -> str:
+    """Start of the weekly accounting period containing `today` (the last Tuesday)"""
+    today = today or date.today()
+    return str(today - timedelta(days=(today.weekday() - 1) % 7))
+
+
+class SlippagePreview:  # pylint: disable=too-many-instance-attributes
+    """Cached slippage preview of a network and period.
+    The cache is persisted as json, so that runs from cron are incremental as well."""
+
+    def __init__(self, network: Network, period: AccountingPeriod, cache_dir: Path):
+        self.network = network
+        self.period = period
+        self.path = cache_dir / network.value / f"{period}.json"
+        self.lock = threading.Lock()
+        self.digests: dict[str, str] = {}
+        self.solvers: dict[str, SolverPreview] = {}
+        self.updated_at: str | None = None
+        # end of the data of the period the preview is computed from
+        self.data_until = period.start
+        if self.path.exists():
+            cache = json.loads(self.path.read_text(encoding="utf-8"))
+            self.digests = cache["digests"]
+            self.solvers = {
+                solver: SolverPreview(**preview)
+                for solver, preview in cache["solvers"].items()
+            }
+            self.updated_at = cache["updated_at"]
+            self.data_until = datetime.fromisoformat(cache["data_until"])
+
+    def update(
+        self, slippage: DataFrame, until: datetime, now: datetime | None = None
+    ) -> int:
+        """Updates the previews of solvers whose rows changed and drops solvers which are
+        no longer present. `until` is the end of the data the slippage is merged
+        from. Returns the number of updated solvers."""
+        digests = {
+            str(row["solver_address"]): row_digest(row)
+            for _, row in slippage.iterrows()
+        }
+        changed = [
+            row
+            for _, row in slippage.iterrows()
+            if self.digests.get(str(row["solver_address"]))
+            != digests[str(row["solver_address"])]
+        ]
+        previews = [SolverPreview.from_series(row) for row in changed]
+        with self.lock:
+            self.solvers = {
+                solver: preview
+                for solver, preview in self.solvers.items()
+                if solver in digests
+            } | {preview.solver: preview for preview in previews}
+            self.digests = digests
+            self.data_until = until
+            self.updated_at = (now or datetime.now()).isoformat(timespec="seconds")
+            self._save()
+        log.info(f"Updated {len(changed)} of {len(digests)} solvers")
+        return len(changed)
+
+    def _save(self) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        cache = {
+            "digests": self.digests,
+            "solvers": {
+                solver: asdict(preview) for solver, preview in self.solvers.items()
+            },
+            "updated_at": self.updated_at,
+            "data_until": self.data_until.isoformat(),
+        }
+        tmp_path = self.path.with_suffix(".json.tmp")
+        tmp_path.write_text(json.dumps(cache, indent=2), encoding="utf-8")
+        os.replace(tmp_path, self.path)
+
+    def summary(self) -> dict[str, Any]:
+        """Per solver slippage and totals so far, with totals projected to the full
+        period"""
+        with self.lock:
+            solvers = sorted(self.solvers.values(), key=lambda preview: preview.solver)
+            updated_at = self.updated_at
+            until = self.data_until
+        elapsed = (until - self.period.start) / (self.period.end - self.period.start)
+        totals = {
+            "slippage_wei": sum(preview.slippage_wei for preview in solvers),
+            "negative_slippage_wei": sum(
+                min(preview.slippage_wei, 0) for preview in solvers
+            ),
+        }
+        return {
+            "network": self.network.value,
+            "period": str(self.period),
+            "updated_at": updated_at,
+            "data_until": until.isoformat(),
+            "elapsed": elapsed,
+            "solvers": [asdict(preview) for preview in solvers],
+            "totals": totals,
+            "projected_totals": {
+                key: int(value / elapsed) if elapsed else 0
+                for key, value in totals.items()
+            },
+        }
+
+
+def refresh_preview(
+    preview: SlippagePreview,
+    store: PartialStore,
+    fetch: Callable[[AccountingPeriod], DataFrame],
+    now: datetime | None = None,
+) -> int:
+    """Merges the daily partials of the slippage of the ended days of the period
+    (fetching missing days with `fetch`) and the slippage of the running day and updates
+    the preview. Raises a ValueError if all partials are empty."""
+    with log_context(
+        network=preview.network.value, period=str(preview.period), stage="preview"
+    ):
+        until = data_until(preview.period, now)
+        if until <= preview.period.start:
+            log.info("No data of the period is complete yet")
+            return 0
+        slippage = period_aggregate(
+            store,
+            preview.network,
+            preview.period,
+            fetch,
+            DASHBOARD_SLIPPAGE_KEY_COLUMNS,
+            DASHBOARD_SLIPPAGE_AMOUNT_COLUMNS,
+            now,
+            running=True,
+        )
+        return preview.update(slippage, until, now)
+
+
+def preview_handler(
+    previews: dict[str, SlippagePreview],
+) -> type[BaseHTTPRequestHandler]:
+    """Request handler serving `/preview` (all networks) and `/preview/<network>`"""
+
+    class PreviewHandler(BaseHTTPRequestHandler):
+        """Serves slippage previews as json"""
+
+        def do_GET(self) -> None:  # pylint: disable=invalid-name
+            """Handles GET requests"""
+            path = self.path.rstrip("/")
+            if path == "/preview":
+                body: dict[str, Any] | None = {
+                    network: preview.summary() for network, preview in previews.items()
+                }
+            elif path.startswith("/preview/") and path[9:] in previews:
+                body = previews[path[9:]].summary()
+            else:
+                body = None
+            if body is None:
+                self.send_error(404)
+                return
+            data = json.dumps(body, indent=2).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, *args: Any) -> None:
+            """Logs requests at debug level instead of writing them to stderr"""
+            log.debug(args[0], *args[1:])
+
+    return PreviewHandler
+
+
+def serve(
+    previews: dict[str, SlippagePreview],
+    refresh: Callable[[], None],
+    address: tuple[str, int],
+    refresh_interval: float = DEFAULT_REFRESH_INTERVAL,
+) -> None:
+    """Serves the previews over HTTP and refreshes them in a background thread"""
+    stop = threading.Event()
+
+    def refresh_loop() -> None:
+        while not stop.wait(refresh_interval):
+            try:
+                refresh()
+            except Exception as err:  # pylint: disable=broad-exception-caught
+                log.error(f"Refreshing the preview failed: {err}")
+
+    thread = threading.Thread(target=refresh_loop, name="preview-refresh", daemon=True)
+    thread.start()
+    server = ThreadingHTTPServer(address, preview_handler(previews))
+    log.info(f"Serving slippage previews on http://{address[0]}:{address[1]}/preview")
+    try:
+        server.serve_forever()
+    finally:
+        stop.set()
+        server.server_close()
+
+
+def main() -> None:
+    """Compute (and optionally serve) a preview of the slippage of the current period"""
+    start_logging()
+    load_env()
+    parser = argparse.ArgumentParser("Preview slippage")
+    parser.add_argument(
+        "--start",
+        type=str,
+        default=current_period_start(),
+        help="Accounting Period Start. Defaults to the start of the current period",
+    )
+    add_networks_argument(parser, "Networks to preview. Defaults to all networks")
+    parser.add_argument(
+        "--serve", action="store_true", help="Serve the preview over HTTP"
+    )
+    parser.add_argument("--host", type=str, default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument(
+        "--refresh-interval",
+        type=float,
+        default=DEFAULT_REFRESH_INTERVAL,
+        help="Seconds between refreshes when serving",
+    )
+    args = parser.parse_args()
+
+    period = AccountingPeriod(args.start)
+    networks = [Network(network) for network in args.networks]
+    # the Dune API key and the output directory do not depend on the network
+    dune = dune_client(DuneConfig.from_network(networks[0]))
+    output_dir = IOConfig.from_network(networks[0]).csv_output_dir
+    store = PartialStore(output_dir / "partials")
+    previews = {
+        network.value: SlippagePreview(network, period, output_dir / "preview")
+        for network in networks
+    }
+
+    def refresh() -> None:
+        for preview in previews.values():
+            blockchain = DuneConfig.from_network(preview.network).dune_blockchain
+            refresh_preview(
+                preview, store, dashboard_slippage_fetcher(dune, blockchain)
+            )
+
+    refresh()
+    if args.serve:
+        serve(previews, refresh, (args.host, args.port), args.refresh_interval)
+    else:
+        for preview in previews.values():
+            print(json.dumps(preview.summary(), indent=2))
+
+
+if __name__ == "__main__":
+    main()
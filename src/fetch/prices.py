@@ -1,22 +1,34 @@
 """
 An interface for fetching prices.
-Currently, only price feed is CoinPaprika's Free tier API.
+Prices are fetched from CoinPaprika's free tier API or, if configured (see `PriceConfig`),
+from several providers (CoinPaprika, CoinGecko, DefiLlama free tier APIs) with hedged
+requests, and cached in a persistent sqlite store shared between runs and processes.
 """
 
+from __future__ import annotations
+
 import functools
-from datetime import datetime
+import math
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from contextlib import contextmanager
+from datetime import datetime, timezone
 from enum import Enum
 from fractions import Fraction
+from pathlib import Path
+from typing import Iterable, Iterator
 
+import requests
 from coinpaprika import client as cp
 from dune_client.types import Address
 
+from src.config import PriceConfig
 from src.logger import set_log
 
 log = set_log(__name__)
 
-client = cp.Client()
-
 
 # Note - we can get historical prices with the free tier and the following stipulation
 # https://api.coinpaprika.com/#operation/getTickersHistoricalById:
@@ -44,6 +56,20 @@ class TokenId(Enum):
             return 6
         return 18
 
+    def coingecko_id(self) -> str:
+        """Coin Ids for CoinGecko (also used by DefiLlama)"""
+        return {
+            TokenId.ETH: "ethereum",
+            TokenId.XDAI: "dai",
+            TokenId.COW: "cow-protocol",
+            TokenId.USDC: "usd-coin",
+            TokenId.AVAX: "avalanche-2",
+            TokenId.POL: "polygon-ecosystem-token",
+            TokenId.GHO: "gho",
+            TokenId.BNB: "binancecoin",
+            TokenId.XPL: "plasma",
+        }[self]
+
 
 TOKEN_ADDRESS_TO_ID = {
     # mainnet COW address
@@ -91,20 +117,308 @@ def exchange_rate_atoms(
     return price_1 / price_2
 
 
+class PriceStore:
+    """Persistent store of daily usd prices keyed by (TokenId, day).
+
+    Every operation uses its own sqlite connection, so that the store can be shared between
+    threads and processes. Concurrent writers are serialized by sqlite.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS usd_prices "
+                "(token TEXT NOT NULL, day TEXT NOT NULL, price REAL NOT NULL, "
+                "PRIMARY KEY (token, day))"
+            )
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            with conn:  # commits on success
+                yield conn
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _day_key(day: datetime) -> str:
+        return day.strftime("%Y-%m-%d")
+
+    def get(self, token: TokenId, day: datetime) -> float | None:
+        """Cached price of token on day, None if it is not cached"""
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT price FROM usd_prices WHERE token = ? AND day = ?",
+                (token.value, self._day_key(day)),
+            ).fetchone()
+        return float(row[0]) if row is not None else None
+
+    def put(self, token: TokenId, day: datetime, price: float) -> None:
+        """Stores price of token on day"""
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO usd_prices (token, day, price) VALUES (?, ?, ?)",
+                (token.value, self._day_key(day), price),
+            )
+
+
 @functools.cache
+def price_store() -> PriceStore:
+    """The price store configured via environment variables"""
+    return PriceStore(PriceConfig.from_env().cache_file)
+
+
+# prices already looked up by this process, avoids hitting the store more than once
+_PRICES: dict[tuple[TokenId, datetime], float] = {}
+_PRICES_LOCK = threading.Lock()
+
+
 def usd_price(token: TokenId, day: datetime) -> float:
     """
-    A cached version of CoinPaprika's API request.
-    This will only ever make an API request on unique (token, day) pairs
+    A cached version of the price request to the configured providers (see
+    `fetch_usd_price`). This will only ever make an API request on unique (token, day)
+    pairs which are neither known to this process nor contained in the persistent price
+    store.
     """
-    log.info("requesting price for token=%s, day=%s", token.value, day.date())
-    response_list = client.historical(
-        coin_id=token.value, start=day.strftime("%Y-%m-%d"), limit=1, interval="1d"
+    key = (token, day)
+    if key in _PRICES:
+        return _PRICES[key]
+
+    store = price_store()
+    price = store.get(token, day)
+    if price is None:
+        if PriceConfig.from_env().cache_only:
+            raise KeyError(
+                f"No cached price for token={token.value}, day={day.date()} "
+                "and price cache is in cache-only mode"
+            )
+        price = fetch_usd_price(token, day)
+        store.put(token, day, price)
+
+    with _PRICES_LOCK:
+        _PRICES[key] = price
+    return price
+
+
+def prefetch_usd_prices(
+    keys: Iterable[tuple[TokenId, datetime]], max_workers: int = 4
+) -> None:
+    """Looks up prices for all (token, day) pairs, fetching cache misses concurrently"""
+    unique_keys = set(keys)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        # list forces evaluation so that exceptions are raised here
+        list(executor.map(lambda key: usd_price(*key), unique_keys))
+
+
+class PriceProvider(ABC):  # pylint: disable=too-few-public-methods
+    """Source of daily usd prices"""
+
+    name: str
+    # base url of the provider's API
+    api_url: str
+
+    def __init__(self, api_url: str | None = None) -> None:
+        if api_url:
+            self.api_url = api_url
+
+    @abstractmethod
+    def usd_price(self, token: TokenId, day: datetime) -> float:
+        """Usd price of token on day. Raises if no valid price is available."""
+
+
+class CoinPaprikaProvider(PriceProvider):  # pylint: disable=too-few-public-methods
+    """CoinPaprika's free tier API"""
+
+    name = "coinpaprika"
+    api_url = cp.Client.API_URL
+
+    def __init__(self, api_url: str | None = None) -> None:
+        super().__init__(api_url)
+        self.client = cp.Client()
+        self.client.API_URL = self.api_url
+
+    def usd_price(self, token: TokenId, day: datetime) -> float:
+        response_list = self.client.historical(
+            coin_id=token.value, start=day.strftime("%Y-%m-%d"), limit=1, interval="1d"
+        )
+        if len(response_list) != 1:
+            raise ValueError(
+                f"invalid results for usd price on date {day} - got {response_list}"
+            )
+        item = response_list[0]
+        price_time = datetime.strptime(item["timestamp"], "%Y-%m-%dT00:00:00Z")
+        if price_time != day:
+            raise ValueError(f"price for {price_time} returned, expected {day}")
+        return float(item["price"])
+
+
+class CoinGeckoProvider(PriceProvider):  # pylint: disable=too-few-public-methods
+    """CoinGecko's free tier API"""
+
+    name = "coingecko"
+    api_url = "https://api.coingecko.com/api/v3"
+
+    def usd_price(self, token: TokenId, day: datetime) -> float:
+        response = requests.get(
+            f"{self.api_url}/coins/{token.coingecko_id()}/history",
+            params={"date": day.strftime("%d-%m-%Y"), "localization": "false"},
+            timeout=10,
+        )
+        response.raise_for_status()
+        return float(response.json()["market_data"]["current_price"]["usd"])
+
+
+class DefiLlamaProvider(PriceProvider):  # pylint: disable=too-few-public-methods
+    """DefiLlama's coins API"""
+
+    name = "defillama"
+    api_url = "https://coins.llama.fi"
+
+    def usd_price(self, token: TokenId, day: datetime) -> float:
+        coin = f"coingecko:{token.coingecko_id()}"
+        timestamp = int(day.replace(tzinfo=timezone.utc).timestamp())
+        response = requests.get(
+            f"{self.api_url}/prices/historical/{timestamp}/{coin}",
+            params={"searchWidth": "4h"},
+            timeout=10,
+        )
+        response.raise_for_status()
+        return float(response.json()["coins"][coin]["price"])
+
+
+PRICE_PROVIDERS: dict[str, type[PriceProvider]] = {
+    provider.name: provider
+    for provider in (CoinPaprikaProvider, CoinGeckoProvider, DefiLlamaProvider)
+}
+
+
+class HedgedPriceFetcher:  # pylint: disable=too-few-public-methods
+    """Fetches prices from several providers with hedged requests.
+
+    The first provider is asked right away. If it has not answered after `hedge_delay`
+    seconds (or failed), the next provider is asked as well, and so on. The first valid
+    answer is returned. If `max_relative_deviation` is set, a price is only accepted once a
+    second provider confirms it up to that relative deviation: further providers are asked
+    while answers disagree or providers fail, and an error is raised if no two answers
+    agree.
+    """
+
+    def __init__(
+        self,
+        providers: list[PriceProvider],
+        hedge_delay: float,
+        max_relative_deviation: float | None = None,
+    ):
+        assert len(providers) > 0, "At least one price provider is required"
+        assert (
+            max_relative_deviation is None or len(providers) > 1
+        ), "Confirming prices requires at least two price providers"
+        self.providers = providers
+        self.hedge_delay = hedge_delay
+        self.max_relative_deviation = max_relative_deviation
+
+    def _required_answers(self) -> int:
+        return 1 if self.max_relative_deviation is None else 2
+
+    def usd_price(self, token: TokenId, day: datetime) -> float:
+        """Usd price of token on day from the fastest valid provider(s)."""
+        answers: list[tuple[str, float]] = []
+        errors: list[Exception] = []
+        remaining = list(self.providers)
+        pending: dict[Future[float], PriceProvider] = {}
+        # not using a context manager: slow providers must not block returning the answer
+        executor = ThreadPoolExecutor(max_workers=len(self.providers))
+
+        def ask_next_provider() -> None:
+            provider = remaining.pop(0)
+            pending[executor.submit(provider.usd_price, token, day)] = provider
+
+        try:
+            while self._accepted_price(answers) is None:
+                # replace failed providers and ask for a second opinion if necessary, or
+                # for a third one if the answers disagree
+                while remaining and (
+                    len(pending) + len(answers) < self._required_answers()
+                    or not pending
+                ):
+                    ask_next_provider()
+                if not pending:
+                    break
+                done, _ = wait(
+                    pending,
+                    timeout=self.hedge_delay if remaining else None,
+                    return_when=FIRST_COMPLETED,
+                )
+                if not done:
+                    # hedge: the pending providers are too slow
+                    ask_next_provider()
+                    continue
+                for future in done:
+                    provider = pending.pop(future)
+                    try:
+                        price = future.result()
+                        if not math.isfinite(price) or price <= 0:
+                            raise ValueError(f"invalid price {price}")
+                        answers.append((provider.name, price))
+                    except Exception as err:  # pylint: disable=broad-exception-caught
+                        log.warning(
+                            f"Price provider {provider.name} failed for "
+                            f"token={token.value}, day={day.date()}: {err}"
+                        )
+                        errors.append(err)
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+        accepted = self._accepted_price(answers)
+        if accepted is not None:
+            return accepted
+        if not answers:
+            raise errors[-1]
+        raise ValueError(
+            f"No two consistent prices for token={token.value}, day={day.date()}: "
+            + ", ".join(f"{name}={price}" for name, price in answers)
+        )
+
+    def _accepted_price(self, answers: list[tuple[str, float]]) -> float | None:
+        """The answer of the most preferred provider which is confirmed by another one
+        (if `max_relative_deviation` is set), None if there is no such answer yet"""
+        # answers completing at the same time arrive in arbitrary order
+        names = [provider.name for provider in self.providers]
+        prices = [
+            price for _, price in sorted(answers, key=lambda a: names.index(a[0]))
+        ]
+        if self.max_relative_deviation is None:
+            return prices[0] if prices else None
+        for index, price in enumerate(prices):
+            for other in prices[:index] + prices[index + 1 :]:
+                if (
+                    abs(price - other) / max(price, other)
+                    <= self.max_relative_deviation
+                ):
+                    return price
+        return None
+
+
+@functools.cache
+def price_fetcher() -> HedgedPriceFetcher:
+    """The price fetcher configured via environment variables"""
+    config = PriceConfig.from_env()
+    return HedgedPriceFetcher(
+        providers=[
+            PRICE_PROVIDERS[name](config.api_urls.get(name))
+            for name in config.providers
+        ],
+        hedge_delay=config.hedge_delay_seconds,
+        max_relative_deviation=config.max_relative_deviation,
     )
-    assert (
-        len(response_list) == 1
-    ), f"invalid results for usd price on date {day} - got {response_list}"
-    item = response_list[0]
-    price_time = datetime.strptime(item["timestamp"], "%Y-%m-%dT00:00:00Z")
-    assert price_time == day
-    return float(item["price"])
+
+
+def fetch_usd_price(token: TokenId, day: datetime) -> float:
+    """Fetches the usd price of a token on a day from the configured providers."""
+    log.info("requesting price for token=%s, day=%s", token.value, day.date())
+    assert day == datetime(day.year, day.month, day.day), "prices are daily"
+    return price_fetcher().usd_price(token, day)
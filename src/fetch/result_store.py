@@ -0,0 +1,93 @@
+"""
+Local store for finished Dune executions.
+Results are stored as raw CSV next to a small json file with the execution id, keyed by
+query id and parameters. This allows the payout run to read results which were
+prefetched (see `src.fetch.prefetch`) instead of waiting for a fresh execution.
+"""
+
+from __future__ import annotations
+
+import csv
+import hashlib
+import io
+import json
+import os
+from pathlib import Path
+from typing import BinaryIO, Iterable
+
+from dune_client.query import QueryBase
+
+from src.logger import set_log
+
+log = set_log(__name__)
+
+
+class DuneResultStore:
+    """Stores execution ids and CSV results of Dune queries in a local directory."""
+
+    def __init__(self, directory: Path):
+        self.directory = directory
+
+    @staticmethod
+    def key(query: QueryBase) -> str:
+        """Unique key of a query, consisting of query id and parameter values"""
+        params = query.request_format()["query_parameters"]
+        digest = hashlib.sha256(json.dumps(params, sort_keys=True).encode()).hexdigest()
+        return f"{query.query_id}-{digest[:16]}"
+
+    def _meta_path(self, query: QueryBase) -> Path:
+        return self.directory / f"{self.key(query)}.json"
+
+    def _csv_path(self, query: QueryBase) -> Path:
+        return self.directory / f"{self.key(query)}.csv"
+
+    def save(
+        self, query: QueryBase, execution_id: str, pages: Iterable[BinaryIO]
+    ) -> None:
+        """Stores the execution id and the CSV pages of a finished execution.
+
+        The header row of all but the first page is dropped. Files are written to a
+        temporary location first, so that readers never observe partial results.
+        """
+        self.directory.mkdir(parents=True, exist_ok=True)
+        csv_path = self._csv_path(query)
+        tmp_path = csv_path.with_suffix(".csv.tmp")
+        with open(tmp_path, "wb") as file:
+            for index, page in enumerate(pages):
+                data = page.read()
+                if index > 0:
+                    data = data.split(b"\n", 1)[1] if b"\n" in data else b""
+                file.write(data)
+        os.replace(tmp_path, csv_path)
+
+        meta = {
+            "query_id": query.query_id,
+            "name": query.name,
+            "parameters": query.request_format()["query_parameters"],
+            "execution_id": execution_id,
+        }
+        self._meta_path(query).write_text(json.dumps(meta, indent=2), encoding="utf-8")
+        log.info(f"Stored results of execution {execution_id} for {query.name}")
+
+    def execution_id(self, query: QueryBase) -> str | None:
+        """Execution id of a stored execution, None if the query was not stored"""
+        meta_path = self._meta_path(query)
+        if not meta_path.exists():
+            return None
+        execution_id: str = json.loads(meta_path.read_text(encoding="utf-8"))[
+            "execution_id"
+        ]
+        return execution_id
+
+    def load_csv(self, query: QueryBase) -> BinaryIO | None:
+        """Stored CSV results of a query, None if no results are available"""
+        if self.execution_id(query) is None or not self._csv_path(query).exists():
+            return None
+        return io.BytesIO(self._csv_path(query).read_bytes())
+
+    def load_rows(self, query: QueryBase) -> list[dict[str, str]] | None:
+        """Stored results of a query as list of rows"""
+        data = self.load_csv(query)
+        if data is None:
+            return None
+        return list(csv.DictReader(io.TextIOWrapper(data, encoding="utf-8")))
@@ -0,0 +1,103 @@
+"""
+Sharding of an accounting period into sub-periods which are fetched in parallel.
+
+Results of per sub-period queries are merged by adding up their additive aggregates
+(e.g. per solver sums), see `merge_additive`. Only queries whose results are sums over
+the period can be sharded this way; ratios, averages or per period tables (such as the
+analytics tables of `src.pg_client`) cannot. `check_merged` compares a merged result
+with the result of the unsharded query, e.g. when introducing sharding for a query.
+
+The per solver slippage of the Dune dashboard query is sharded this way (see
+`DuneFetcher.get_dashboard_slippage`), and the daily partials of `src.fetch.partials` are
+merged with `merge_additive`.
+"""
+
+from __future__ import annotations
+
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from typing import Callable, Sequence
+
+import pandas as pd
+from pandas import DataFrame
+from pandas.api.types import is_integer_dtype
+
+from src.logger import set_log
+from src.models.accounting_period import AccountingPeriod
+
+log = set_log(__name__)
+
+
+def fetch_sharded(
+    fetch: Callable[[AccountingPeriod], DataFrame],
+    period: AccountingPeriod,
+    shard_length: timedelta,
+    max_workers: int | None = None,
+) -> list[DataFrame]:
+    """Fetches the sub-periods of `shard_length` of a period concurrently.
+    Results are returned in order of the sub-periods."""
+    shards = list(period.split(shard_length))
+    log.info(f"Fetching {len(shards)} shards of period {period}")
+    with ThreadPoolExecutor(max_workers=max_workers or len(shards)) as executor:
+        return list(executor.map(fetch, shards))
+
+
+def merge_additive(
+    frames: Sequence[DataFrame],
+    keys: Sequence[str],
+    additive_columns: Sequence[str],
+) -> DataFrame:
+    """Merges per shard results by adding up `additive_columns` per `keys`.
+
+    Columns which are neither keys nor additive must not differ between shards for the
+    same keys (e.g. solver names); the first value is used. Integer columns are summed
+    exactly.
+    """
+    combined = pd.concat(frames, ignore_index=True)
+    for column in additive_columns:
+        # sums of wei amounts exceed int64, sum them as exact python integers
+        if is_integer_dtype(combined[column]):
+            combined[column] = combined[column].astype(object)
+    other_columns = [
+        column
+        for column in combined.columns
+        if column not in keys and column not in additive_columns
+    ]
+    aggregations = {column: "sum" for column in additive_columns} | {
+        column: "first" for column in other_columns
+    }
+    return (
+        combined.groupby(list(keys), sort=True, dropna=False)
+        .agg(aggregations)
+        .reset_index()[list(combined.columns)]
+    )
+
+
+def check_merged(
+    merged: DataFrame,
+    unsharded: DataFrame,
+    keys: Sequence[str],
+    additive_columns: Sequence[str],
+    relative_tolerance: float = 0.0,
+) -> None:
+    """Raises a ValueError if the merged result differs from the unsharded one.
+
+    Float columns can be compared up to `relative_tolerance` (float sums depend on the
+    order of summation), exact amounts (see `src.utils.amounts`) are compared exactly.
+    Keys have to match exactly.
+    """
+    left = merged.set_index(list(keys)).sort_index()
+    right = unsharded.set_index(list(keys)).sort_index()
+    if not left.index.equals(right.index):
+        missing = right.index.difference(left.index).tolist()
+        extra = left.index.difference(right.index).tolist()
+        raise ValueError(f"Sharded keys differ: missing {missing}, extra {extra}")
+    for column in additive_columns:
+        if relative_tolerance:
+            deviation = (left[column] - right[column]).abs()
+            differs = deviation > right[column].abs() * relative_tolerance
+        else:
+            differs = left[column] != right[column]
+        mismatches = left.index[differs].tolist()
+        if mismatches:
+            raise ValueError(f"Sharded {column} differs for {mismatches}")
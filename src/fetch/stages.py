@@ -0,0 +1,301 @@
+"""
+Checkpointed stages of the accounting of one network (see `src.utils.stage_cache`):
+
+1. `fetch`: block range from Dune and analytics data per solver and partner (fetched
+   concurrently, see `src.scheduler`, from the analytics database or exported files, see
+   `src.pg_client.analytics_fetcher`),
+2. `compute`: transfers and overdrafts (and the messages logged while computing them),
+3. `filter`: native token and COW transfers above the minimum transfer amounts.
+
+Proposing is not checkpointed. A rerun for the same period (e.g. posting after a dry run)
+reads the outputs of all stages whose inputs did not change, so that only the failed or
+changed part of a run is repeated. The inputs of `fetch` include a fingerprint of the
+analytics data of the period (see `MultiInstanceDBFetcher.freshness`), so that data which
+changed since the last run is fetched again.
+"""
+
+from __future__ import annotations
+
+from dataclasses import asdict, dataclass
+
+from dune_client.client import DuneClient
+from dune_client.types import Address
+from pandas import DataFrame
+
+from src import pg_client
+from src.config import AccountingConfig
+from src.fetch import dune as dune_module
+from src.fetch import payouts as payouts_module
+from src.fetch import prices
+from src.fetch.dune import DuneFetcher
+from src.fetch.result_store import DuneResultStore
+from src.logger import log_saver, set_log
+from src.models.accounting_period import AccountingPeriod
+from src.models.overdraft import Overdraft
+from src.models.token import Token
+from src.models.transfer import Transfer
+from src.scheduler import RESOURCE_LIMITS, Scheduler
+from src.utils.print_store import Category
+from src.utils.stage_cache import Checkpoint, StageCache, digest, source_digest
+
+log = set_log(__name__)
+
+TRANSFER_COLUMNS = ["token_address", "token_decimals", "recipient", "amount_wei"]
+OVERDRAFT_COLUMNS = ["account", "name", "wei"]
+MESSAGE_COLUMNS = ["category", "message"]
+
+
+def transfers_frame(transfers: list[Transfer]) -> DataFrame:
+    """Transfers as data frame with exact amounts"""
+    return DataFrame(
+        [
+            {
+                "token_address": (
+                    transfer.token.address.address if transfer.token else None
+                ),
+                "token_decimals": transfer.token.decimals if transfer.token else None,
+                "recipient": transfer.recipient.address,
+                "amount_wei": transfer.amount_wei,
+            }
+            for transfer in transfers
+        ],
+        columns=TRANSFER_COLUMNS,
+        dtype=object,
+    )
+
+
+def transfers_from_frame(frame: DataFrame) -> list[Transfer]:
+    """Inverse of `transfers_frame`"""
+    return [
+        Transfer(
+            token=(
+                Token(row.token_address, int(row.token_decimals))
+                if row.token_address is not None
+                else None
+            ),
+            recipient=Address(row.recipient),
+            amount_wei=int(row.amount_wei),
+        )
+        for row in frame.itertuples(index=False)
+    ]
+
+
+def overdrafts_frame(overdrafts: list[Overdraft]) -> DataFrame:
+    """Overdrafts as data frame with exact amounts"""
+    return DataFrame(
+        [
+            {
+                "account": overdraft.account.address,
+                "name": overdraft.name,
+                "wei": overdraft.wei,
+            }
+            for overdraft in overdrafts
+        ],
+        columns=OVERDRAFT_COLUMNS,
+        dtype=object,
+    )
+
+
+def overdrafts_from_frame(
+    frame: DataFrame, period: AccountingPeriod
+) -> list[Overdraft]:
+    """Inverse of `overdrafts_frame`"""
+    return [
+        Overdraft(
+            period=period,
+            account=Address(row.account),
+            name=row.name,
+            wei=int(row.wei),
+        )
+        for row in frame.itertuples(index=False)
+    ]
+
+
+@dataclass
+class FilteredPayouts:
+    """Outputs of the last checkpointed stage of a network"""
+
+    transfers_cow: list[Transfer]
+    transfers_native: list[Transfer]
+    overdrafts: list[Overdraft]
+
+
+def prefetch_exchange_rate_prices(
+    period: AccountingPeriod, config: AccountingConfig
+) -> None:
+    """Prefetches the prices of the exchange rate of the native token to ETH, which are
+    only used if the analytics data does not contain the rate (see
+    `resolve_exchange_rate_native_to_eth`). Failures are logged only, as the prices are
+    fetched again if they are used."""
+    try:
+        prices.prefetch_usd_prices(
+            payouts_module.exchange_rate_prices(period.end, config)
+        )
+    except Exception as err:  # pylint: disable=broad-exception-caught
+        log.warning(f"Prefetching exchange rate prices failed: {err}")
+
+
+def fetch_stage(
+    cache: StageCache, period: AccountingPeriod, config: AccountingConfig
+) -> Checkpoint:
+    """Fetches the analytics data of a period (frames `data_per_solver` and
+    `partner_and_protocol_fees`) and its block range (metadata)"""
+
+    def block_interval() -> tuple[str, str]:
+        dune = DuneFetcher(
+            dune=DuneClient(
+                config.dune_config.dune_api_key,
+                base_url=config.dune_config.dune_api_url,
+            ),
+            blockchain=config.dune_config.dune_blockchain,
+            period=period,
+            result_store=DuneResultStore(config.io_config.dune_result_dir),
+        )
+        return dune.start_block, dune.end_block
+
+    orderbook = pg_client.analytics_fetcher()
+
+    def fetch() -> tuple[dict[str, DataFrame], dict[str, str]]:
+        # the block interval, both analytics tables and the prices do not depend on each
+        # other and are fetched at the same time
+        scheduler = Scheduler(RESOURCE_LIMITS)
+        scheduler.add("block_interval", block_interval, resource="dune")
+        scheduler.add(
+            "data_per_solver",
+            lambda: orderbook.get_data_per_solver(period, config),
+            resource="database",
+        )
+        scheduler.add(
+            "partner_and_protocol_fees",
+            lambda: orderbook.get_partner_and_protocol_fees(period, config),
+            resource="database",
+        )
+        scheduler.add(
+            "prices",
+            lambda: prefetch_exchange_rate_prices(period, config),
+            resource="prices",
+        )
+        results = scheduler.run()
+        start_block, end_block = results["block_interval"]
+        frames = {
+            "data_per_solver": results["data_per_solver"],
+            "partner_and_protocol_fees": results["partner_and_protocol_fees"],
+        }
+        return frames, {"start_block": start_block, "end_block": end_block}
+
+    orderbook_config = config.orderbook_config
+    checkpoint, _ = cache.run(
+        "fetch",
+        {
+            "period": str(period),
+            "blockchain": config.dune_config.dune_blockchain,
+            "database": orderbook.source(config),
+            # row counts and checksums, so that changed analytics data is fetched again
+            "freshness": orderbook.freshness(period, config),
+            "network_db_name": orderbook_config.network_db_name,
+            "schema": orderbook_config.schema,
+            "source": source_digest(pg_client, dune_module),
+        },
+        fetch,
+    )
+    log.info(
+        f"Blockrange for accounting period {period} is from "
+        f"{checkpoint.metadata['start_block']} to {checkpoint.metadata['end_block']}."
+    )
+    return checkpoint
+
+
+def compute_stage(
+    cache: StageCache,
+    fetched: Checkpoint,
+    period: AccountingPeriod,
+    config: AccountingConfig,
+) -> Checkpoint:
+    """Computes transfers and overdrafts from the fetched data (frames `transfers`,
+    `overdrafts` and `messages`, the messages logged to `log_saver`)"""
+
+    def compute() -> tuple[dict[str, DataFrame], dict[str, str]]:
+        sizes = log_saver.sizes()
+        payouts = payouts_module.compute_payouts(
+            fetched.frames["data_per_solver"],
+            fetched.frames["partner_and_protocol_fees"],
+            period,
+            config,
+        )
+        messages = DataFrame(
+            [
+                (category.name, message)
+                for category, message in log_saver.messages_since(sizes)
+            ],
+            columns=MESSAGE_COLUMNS,
+            dtype=object,
+        )
+        return {
+            "transfers": transfers_frame(payouts.transfers),
+            "overdrafts": overdrafts_frame(payouts.overdrafts),
+            "messages": messages,
+        }, {}
+
+    payment_config = asdict(config.payment_config)
+    del payment_config["signing_key"]
+    checkpoint, cached = cache.run(
+        "compute",
+        {
+            "fetch": fetched.digest,
+            "period": str(period),
+            "config": digest(
+                payment_config,
+                asdict(config.reward_config),
+                asdict(config.protocol_fee_config),
+                asdict(config.buffer_accounting_config),
+            ),
+            "source": source_digest(payouts_module, prices),
+        },
+        compute,
+    )
+    if cached:
+        # the messages are part of the Slack thread of the network
+        for row in checkpoint.frames["messages"].itertuples(index=False):
+            log_saver.print(row.message, Category[row.category])
+    return checkpoint
+
+
+def filter_stage(
+    cache: StageCache,
+    computed: Checkpoint,
+    period: AccountingPeriod,
+    config: AccountingConfig,
+) -> FilteredPayouts:
+    """Drops transfers below the minimum transfer amount of their token (frames
+    `transfers_cow`, `transfers_native` and `overdrafts`)"""
+    min_native = config.payment_config.min_native_token_transfer
+    min_cow = config.payment_config.min_cow_transfer
+
+    def filter_transfers() -> tuple[dict[str, DataFrame], dict[str, str]]:
+        transfers_native, transfers_cow = [], []
+        for transfer in transfers_from_frame(computed.frames["transfers"]):
+            if transfer.token is None:
+                if transfer.amount_wei >= min_native:
+                    transfers_native.append(transfer)
+            elif transfer.amount_wei >= min_cow:
+                transfers_cow.append(transfer)
+        return {
+            "transfers_cow": transfers_frame(transfers_cow),
+            "transfers_native": transfers_frame(transfers_native),
+            "overdrafts": computed.frames["overdrafts"],
+        }, {}
+
+    checkpoint, _ = cache.run(
+        "filter",
+        {
+            "compute": computed.digest,
+            "min_native_token_transfer": min_native,
+            "min_cow_transfer": min_cow,
+        },
+        filter_transfers,
+    )
+    return FilteredPayouts(
+        transfers_cow=transfers_from_frame(checkpoint.frames["transfers_cow"]),
+        transfers_native=transfers_from_frame(checkpoint.frames["transfers_native"]),
+        overdrafts=overdrafts_from_frame(checkpoint.frames["overdrafts"], period),
+    )
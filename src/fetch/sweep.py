@@ -0,0 +1,312 @@
+"""
+Script to compare the payouts of an accounting period under different reward and payment
+parameters, e.g. while discussing a change of the service fee or of the quote reward.
+
+The analytics data of the period is fetched once (from the analytics database or exported
+files, see `src.pg_client.analytics_fetcher`) and solver and partner payouts are computed
+once. Each scenario overrides some of the parameters in `SWEEP_PARAMETERS`, and its
+transfers, overdrafts and totals are computed from these payouts in a process pool. The
+comparison of all scenarios is printed and written to a csv file.
+
+Quote rewards are part of the analytics data (`sum_quote_reward_cow`). They are rescaled by
+the ratio of the reward per quote (`quote_reward_cow`, capped at `quote_reward_cap_native`
+converted to COW) of a scenario to the reward per quote of the configuration of the network.
+Nothing is proposed or posted.
+"""
+
+from __future__ import annotations
+
+import argparse
+import contextlib
+import io
+import itertools
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field, replace
+from fractions import Fraction
+from functools import partial
+from typing import Any
+
+from pandas import DataFrame, Series
+
+from src.config import AccountingConfig, Network
+from src.fetch.payouts import (
+    compute_partner_payouts,
+    compute_solver_payouts,
+    prepare_fee_payouts,
+    prepare_solver_payouts,
+)
+from src.logger import set_log, start_logging
+from src.models.accounting_period import AccountingPeriod
+from src.models.transfer import Transfer
+from src.pg_client import MultiInstanceDBFetcher, analytics_fetcher
+from src.utils.amounts import parse_exact_amount
+from src.utils.script_args import add_start_argument
+
+log = set_log(__name__)
+
+# parameters which can be overridden, with the part of the configuration they belong to
+SWEEP_PARAMETERS = {
+    "service_fee_factor": "reward_config",
+    "quote_reward_cow": "reward_config",
+    "quote_reward_cap_native": "reward_config",
+    "min_cow_transfer": "payment_config",
+    "min_native_token_transfer": "payment_config",
+}
+TOTAL_COLUMNS = [
+    "cow_transfers",
+    "cow_wei",
+    "native_transfers",
+    "native_wei",
+    "dropped_transfers",
+    "overdrafts",
+    "overdraft_wei",
+    "service_fee_cow",
+]
+
+
+@dataclass(frozen=True)
+class Scenario:
+    """Overrides of parameters in `SWEEP_PARAMETERS`, by name"""
+
+    overrides: dict[str, Any] = field(default_factory=dict)
+
+    def __post_init__(self) -> None:
+        unknown = set(self.overrides) - set(SWEEP_PARAMETERS)
+        if unknown:
+            raise ValueError(
+                f"Unknown parameters {sorted(unknown)}, "
+                f"expected some of {list(SWEEP_PARAMETERS)}"
+            )
+
+    def apply(self, config: AccountingConfig) -> AccountingConfig:
+        """Configuration with the overrides of the scenario"""
+        for part in set(SWEEP_PARAMETERS.values()):
+            overrides = {
+                name: value
+                for name, value in self.overrides.items()
+                if SWEEP_PARAMETERS[name] == part
+            }
+            if overrides:
+                config = replace(
+                    config, **{part: replace(getattr(config, part), **overrides)}
+                )
+        return config
+
+
+def parse_parameter(name: str, value: str) -> Any:
+    """Parses a value of a parameter in `SWEEP_PARAMETERS`: a fraction for the service
+    fee factor (e.g. `0.15` or `3/20`) and exact integers (e.g. `6e18`) otherwise"""
+    if name not in SWEEP_PARAMETERS:
+        raise ValueError(
+            f"Unknown parameter {name}, expected one of {SWEEP_PARAMETERS}"
+        )
+    if name == "service_fee_factor":
+        return Fraction(value)
+    amount = parse_exact_amount(value)
+    if not isinstance(amount, int):
+        raise ValueError(f"Invalid value {value!r} of {name}, expected an integer")
+    return amount
+
+
+def scenario_grid(grid: dict[str, list[Any]]) -> list[Scenario]:
+    """Scenarios of all combinations of the values of each parameter"""
+    return [
+        Scenario(dict(zip(grid, values)))
+        for values in itertools.product(*grid.values())
+    ]
+
+
+def quote_reward_per_quote(
+    config: AccountingConfig, conversion_rate_cow_to_native: Fraction
+) -> Fraction:
+    """Reward per quote in atoms of COW: `quote_reward_cow`, capped at
+    `quote_reward_cap_native` (in wei of the native token) converted to COW"""
+    return min(
+        Fraction(config.reward_config.quote_reward_cow),
+        config.reward_config.quote_reward_cap_native / conversion_rate_cow_to_native,
+    )
+
+
+@dataclass
+class SweepInputs:
+    """Payouts of a period under the configuration of the network, shared by all
+    scenarios. Fee transfers do not depend on the parameters of a scenario."""
+
+    solver_payouts: DataFrame
+    service_fee_enabled: Series
+    conversion_rate_cow_to_native: Fraction
+    fee_transfers: list[Transfer]
+    period: AccountingPeriod
+    config: AccountingConfig
+
+    @classmethod
+    def from_analytics_data(
+        cls,
+        data_per_solver: DataFrame,
+        partner_and_protocol_fees: DataFrame,
+        period: AccountingPeriod,
+        config: AccountingConfig,
+    ) -> SweepInputs:
+        """Computes solver payouts and fee transfers from the analytics data of a period"""
+        solver_payouts = compute_solver_payouts(data_per_solver, config)
+        return cls(
+            solver_payouts=solver_payouts,
+            service_fee_enabled=data_per_solver["service_fee_enabled"],
+            conversion_rate_cow_to_native=Fraction(
+                str(data_per_solver.iloc[0]["conversion_rate_cow_to_native"])
+            ),
+            fee_transfers=prepare_fee_payouts(
+                solver_payouts,
+                compute_partner_payouts(partner_and_protocol_fees),
+                config,
+            ),
+            period=period,
+            config=config,
+        )
+
+
+def evaluate_scenario(scenario: Scenario, inputs: SweepInputs) -> dict[str, Any]:
+    """Parameters (all of `SWEEP_PARAMETERS`) and totals of the transfers and overdrafts
+    (columns `TOTAL_COLUMNS`) of a scenario"""
+    scenario_config = scenario.apply(inputs.config)
+    solver_payouts = inputs.solver_payouts.copy()
+    # aligned by index, the solver payouts are sorted by solver
+    solver_payouts["service_fee"] = (
+        inputs.service_fee_enabled * scenario_config.reward_config.service_fee_factor
+    )
+    quote_reward_scaling = quote_reward_per_quote(
+        scenario_config, inputs.conversion_rate_cow_to_native
+    ) / quote_reward_per_quote(inputs.config, inputs.conversion_rate_cow_to_native)
+    if quote_reward_scaling != 1:
+        solver_payouts["quote_reward_cow"] = (
+            solver_payouts["quote_reward_cow"]
+            .map(lambda amount: int(quote_reward_scaling * amount))
+            .astype(object)
+        )
+
+    # overdrafts are printed while preparing payouts
+    with contextlib.redirect_stdout(io.StringIO()):
+        payouts = prepare_solver_payouts(solver_payouts, inputs.period)
+    payouts.transfers += inputs.fee_transfers
+    min_native = scenario_config.payment_config.min_native_token_transfer
+    min_cow = scenario_config.payment_config.min_cow_transfer
+    cow = [t.amount_wei for t in payouts.transfers if t.token is not None]
+    native = [t.amount_wei for t in payouts.transfers if t.token is None]
+    cow = [amount for amount in cow if amount >= min_cow]
+    native = [amount for amount in native if amount >= min_native]
+    service_fee = sum(
+        Fraction(row.service_fee)
+        * (
+            max(int(row.primary_reward_cow) + int(row.consistency_reward_cow), 0)
+            + int(row.quote_reward_cow)
+        )
+        for row in solver_payouts.itertuples(index=False)
+    )
+    return {
+        name: getattr(getattr(scenario_config, part), name)
+        for name, part in SWEEP_PARAMETERS.items()
+    } | {
+        "cow_transfers": len(cow),
+        "cow_wei": sum(cow),
+        "native_transfers": len(native),
+        "native_wei": sum(native),
+        "dropped_transfers": len(payouts.transfers) - len(cow) - len(native),
+        "overdrafts": len(payouts.overdrafts),
+        "overdraft_wei": sum(overdraft.wei for overdraft in payouts.overdrafts),
+        "service_fee_cow": int(service_fee),
+    }
+
+
+def sweep(  # pylint: disable=too-many-arguments,too-many-positional-arguments
+    orderbook: MultiInstanceDBFetcher,
+    network: Network,
+    period: AccountingPeriod,
+    scenarios: list[Scenario],
+    config: AccountingConfig | None = None,
+    max_workers: int | None = None,
+) -> DataFrame:
+    """Compares the payouts of a network and period under several scenarios.
+
+    The analytics data is fetched once. Returns one row per scenario, preceded by the
+    configuration of the network (the baseline), with the parameters and totals of
+    `evaluate_scenario`.
+    """
+    config = config or AccountingConfig.from_network(network)
+    data_per_solver = orderbook.get_data_per_solver(period, config)
+    partner_and_protocol_fees = orderbook.get_partner_and_protocol_fees(period, config)
+    if data_per_solver.empty:
+        raise ValueError(f"No data for network {network.value} and period {period}")
+
+    start = time.perf_counter()
+    inputs = SweepInputs.from_analytics_data(
+        data_per_solver, partner_and_protocol_fees, period, config
+    )
+    scenarios = [Scenario()] + scenarios
+    workers = max_workers or os.cpu_count() or 1
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        # scenarios are sent in chunks, so that the inputs are not pickled per scenario
+        rows = list(
+            executor.map(
+                partial(evaluate_scenario, inputs=inputs),
+                scenarios,
+                chunksize=max(1, len(scenarios) // (4 * workers)),
+            )
+        )
+    log.info(
+        f"Evaluated {len(scenarios)} scenarios of network {network.value} "
+        f"in {time.perf_counter() - start:.2f}s"
+    )
+    return DataFrame(rows, columns=list(SWEEP_PARAMETERS) + TOTAL_COLUMNS)
+
+
+def main() -> None:
+    """Compare payouts of an accounting period under different parameters"""
+    start_logging()
+    parser = argparse.ArgumentParser("Sweep payout parameters")
+    add_start_argument(parser)
+    parser.add_argument(
+        "--network",
+        type=str,
+        choices=[network.value for network in Network],
+        required=True,
+        help="Network to compare payouts of",
+    )
+    parser.add_argument(
+        "--grid",
+        action="append",
+        metavar="PARAMETER=VALUES",
+        required=True,
+        help="Comma separated values of a parameter, e.g. "
+        "`--grid service_fee_factor=0,0.15,0.3 --grid min_cow_transfer=0,1e20`. All "
+        f"combinations of the values of all parameters are compared to the current "
+        f"configuration. Parameters: {', '.join(SWEEP_PARAMETERS)}",
+    )
+    parser.add_argument(
+        "--max-workers", type=int, default=None, help="Number of worker processes"
+    )
+    args = parser.parse_args()
+
+    grid: dict[str, list[Any]] = {}
+    for entry in args.grid:
+        name, _, values = entry.partition("=")
+        try:
+            grid[name] = [parse_parameter(name, value) for value in values.split(",")]
+        except ValueError as err:
+            parser.error(str(err))
+    network = Network(args.network)
+    period = AccountingPeriod(args.start)
+    config = AccountingConfig.from_network(network)
+    scenarios = scenario_grid(grid)
+    comparison = sweep(
+        analytics_fetcher(), network, period, scenarios, config, args.max_workers
+    )
+    path = config.io_config.csv_output_dir / f"sweep-{network.value}-{period}.csv"
+    comparison.to_csv(path, index=False)
+    print(comparison.to_string(index=False))
+    log.info(f"Comparison written to {path}")
+
+
+if __name__ == "__main__":
+    main()
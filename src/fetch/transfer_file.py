@@ -4,32 +4,54 @@ Script to generate the CSV Airdrop file for Solver Rewards over an Accounting Pe
 
 from __future__ import annotations
 
-import os
 import ssl
-from dataclasses import asdict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import asdict, dataclass, field, replace
 from fractions import Fraction
+from pathlib import Path
 import urllib.parse
 
 import certifi
-from dune_client.client import DuneClient
 from dune_client.file.interface import FileIO
 from eth_typing import URI
 from safe_eth.eth.ethereum_client import EthereumClient
 from safe_eth.eth.ethereum_network import EthereumNetwork
+from safe_eth.safe.multi_send import MultiSendTx
 from slack.web.client import WebClient
 
 from src.config import AccountingConfig, Network
-from src.fetch.dune import DuneFetcher
-from src.fetch.payouts import construct_payouts
-from src.logger import log_saver, set_log
+from src.fetch.stages import compute_stage, fetch_stage, filter_stage
+from src.logger import (
+    log_context,
+    log_saver,
+    logging_started,
+    set_log,
+    start_logging,
+)
 from src.models.accounting_period import AccountingPeriod
 from src.models.transfer import Transfer, CSVTransfer
 from src.models.overdraft import Overdraft
-from src.multisend import post_multisend, prepend_unwrap_if_necessary
-from src.pg_client import MultiInstanceDBFetcher
+from src.multisend import (
+    chunk_transactions,
+    post_multisend,
+    prepend_unwrap_if_necessary,
+    retrieve_safe_nonce,
+)
+from src.scheduler import RESOURCE_LIMITS, Scheduler
 from src.slack_utils import post_to_slack
+from src.utils.cassette import Cassette, Interaction, use_cassette
 from src.utils.print_store import Category, PrintStore
-from src.utils.script_args import generic_script_init
+from src.utils.profiling import configure_profiling, profile_stage
+from src.utils.script_args import ScriptArgs, generic_script_init
+from src.utils.stage_cache import StageCache
+from src.utils.spans import (
+    Span,
+    recorder,
+    span,
+    timing_summary,
+    write_json_report,
+    write_openmetrics,
+)
 
 log = set_log(__name__)
 
@@ -131,23 +153,54 @@ def auto_propose(
         Transfer.summarize(transfers_cow + transfers_native), category=Category.TOTALS
     )
 
-    transactions_cow = prepend_unwrap_if_necessary(
-        client_mainnet,
-        config.payment_config.payment_safe_address_cow,
-        wrapped_native_token=config.payment_config.wrapped_native_token_address,
-        transactions=[t.as_multisend_tx() for t in transfers_cow],
-        skip_validation=True,
+    safe_cow = config.payment_config.payment_safe_address_cow
+    safe_native = config.payment_config.payment_safe_address_native
+    # balances and nonces of the safes are read at the same time
+    scheduler = Scheduler(RESOURCE_LIMITS)
+    scheduler.add(
+        "balance_cow", lambda: client_mainnet.get_balance(safe_cow), resource="node"
     )
-
-    transactions_native = prepend_unwrap_if_necessary(
-        client,
-        config.payment_config.payment_safe_address_native,
-        wrapped_native_token=config.payment_config.wrapped_native_token_address,
-        transactions=[t.as_multisend_tx() for t in transfers_native],
-        skip_validation=True,
+    scheduler.add(
+        "balance_native", lambda: client.get_balance(safe_native), resource="node"
     )
+    if not dry_run:
+        scheduler.add(
+            "nonce_cow",
+            lambda: retrieve_safe_nonce(client_mainnet, safe_cow),
+            resource="node",
+        )
+        scheduler.add(
+            "nonce_native",
+            lambda: retrieve_safe_nonce(client, safe_native),
+            resource="node",
+        )
+    with span("read_safes"):
+        safes = scheduler.run()
+
+    with span("encode_transactions") as timing, profile_stage("encode"):
+        transactions_cow = prepend_unwrap_if_necessary(
+            client_mainnet,
+            safe_cow,
+            wrapped_native_token=config.payment_config.wrapped_native_token_address,
+            transactions=[t.as_multisend_tx() for t in transfers_cow],
+            skip_validation=True,
+            eth_balance=safes["balance_cow"],
+        )
+
+        transactions_native = prepend_unwrap_if_necessary(
+            client,
+            safe_native,
+            wrapped_native_token=config.payment_config.wrapped_native_token_address,
+            transactions=[t.as_multisend_tx() for t in transfers_native],
+            skip_validation=True,
+            eth_balance=safes["balance_native"],
+        )
 
-    ovedrafts_txs = [ov.as_multisend_tx() for ov in overdrafts]
+        ovedrafts_txs = [
+            ov.as_multisend_tx(config.overdraft_config) for ov in overdrafts
+        ]
+        all_txs = transactions_cow + transactions_native + ovedrafts_txs
+        timing.add(len(all_txs), sum(len(tx.data) for tx in all_txs))
 
     if len(transactions_native) > len(transfers_native):
         log_saver_obj.print("Prepended WETH unwrap", Category.GENERAL)
@@ -163,16 +216,17 @@ def auto_propose(
         assert slack_channel is not None
 
         nonce_cow = post_multisend(
-            safe_address=config.payment_config.payment_safe_address_cow,
+            safe_address=safe_cow,
             transactions=transactions_cow,
             network=EthereumNetwork.MAINNET,
             signing_key=signing_key,
             client=client_mainnet,
             nonce_modifier=config.payment_config.nonce_modifier,
+            nonce=safes["nonce_cow"],
         )
 
         nonce_native = post_multisend(
-            safe_address=config.payment_config.payment_safe_address_native,
+            safe_address=safe_native,
             transactions=transactions_native,
             network=config.payment_config.network,
             signing_key=signing_key,
@@ -182,10 +236,11 @@ def auto_propose(
                 if config.payment_config.network == EthereumNetwork.MAINNET
                 else 0
             ),
+            nonce=safes["nonce_native"],
         )
 
         nonce_overdrafts = post_multisend(
-            safe_address=config.payment_config.payment_safe_address_native,
+            safe_address=safe_native,
             transactions=ovedrafts_txs,
             network=config.payment_config.network,
             signing_key=signing_key,
@@ -195,6 +250,7 @@ def auto_propose(
                 if config.payment_config.network == EthereumNetwork.MAINNET
                 else (1 if nonce_native is not None else 0)
             ),
+            nonce=safes["nonce_native"],
         )
 
         post_to_slack(
@@ -215,91 +271,388 @@ def auto_propose(
         )
 
 
-def main() -> None:
-    """Generate transfers for an accounting period"""
+@dataclass
+class NetworkPayouts:
+    """Transfers and overdrafts of one network, together with the messages logged while
+    computing them"""
+
+    network: Network
+    transfers_cow: list[Transfer]
+    transfers_native: list[Transfer]
+    overdrafts: list[Overdraft]
+    log_saver_obj: PrintStore
+    # timing spans of the network, see `src.utils.spans`
+    spans: list[Span] = field(default_factory=list)
+    # HTTP responses recorded in a worker process, see `src.utils.cassette`
+    http_interactions: list[Interaction] = field(default_factory=list)
+
+
+def compute_network_payouts(
+    network: Network,
+    accounting_period: AccountingPeriod,
+    profile: str | None = None,
+    cassette: Cassette | None = None,
+    fresh: bool = False,
+) -> NetworkPayouts:
+    """Fetch, compute and filter stages of the accounting of one network.
+
+    When run in a worker process of a multi network run, the messages of the network are
+    collected in the (then process local) `log_saver` and returned to the main process.
+    With `profile`, the stages are profiled (see `src.utils.profiling`). With `cassette`,
+    HTTP responses are recorded to or replayed from it (see `src.utils.cassette`).
+    Stages with unchanged inputs are read from their checkpoints, unless `fresh` is set
+    (see `src.fetch.stages`).
+    """
+    config = AccountingConfig.from_network(network)
+    if profile:
+        configure_profiling(profile, config.io_config.csv_output_dir)
+    cache = StageCache(
+        config.io_config.checkpoint_dir / network.value / str(accounting_period),
+        fresh=fresh,
+    )
 
-    args = generic_script_init(description="Fetch Complete Reimbursement")
+    with (
+        logging_started(),
+        use_cassette(cassette),
+        log_context(network=network.value, period=str(accounting_period)),
+    ):
+        with log_context(stage="fetch"), profile_stage("fetch"):
+            fetched = fetch_stage(cache, accounting_period, config)
+
+            log_saver.print(
+                "The data aggregated can be visualized at\n"
+                f"{dashboard_url(accounting_period, config)}",
+                category=Category.GENERAL,
+            )
+
+        with log_context(stage="payouts"), profile_stage("compute"):
+            computed = compute_stage(cache, fetched, accounting_period, config)
+            payouts = filter_stage(cache, computed, accounting_period, config)
+
+    return NetworkPayouts(
+        network=network,
+        transfers_cow=payouts.transfers_cow,
+        transfers_native=payouts.transfers_native,
+        overdrafts=payouts.overdrafts,
+        log_saver_obj=log_saver,
+        spans=recorder.snapshot(),
+        http_interactions=(
+            cassette.interactions
+            if cassette is not None and not cassette.replay
+            else []
+        ),
+    )
 
-    config = AccountingConfig.from_network(Network(os.environ["NETWORK"]))
 
-    accounting_period = AccountingPeriod(args.start)
+def compute_all_payouts(
+    networks: list[Network],
+    accounting_period: AccountingPeriod,
+    profile: str | None = None,
+    cassette: Cassette | None = None,
+    fresh: bool = False,
+) -> tuple[list[NetworkPayouts], dict[Network, BaseException]]:
+    """Fetch and payout stages of several networks, run concurrently in worker processes.
 
-    orderbook = MultiInstanceDBFetcher()
-    dune = DuneFetcher(
-        dune=DuneClient(config.dune_config.dune_api_key),
-        blockchain=config.dune_config.dune_blockchain,
-        period=accounting_period,
-    )
+    Each worker process handles a single network, so that module level state (e.g. the
+    `log_saver`) is not shared between networks. Prices are shared via the persistent
+    price store. Returns the payouts of all successful networks (in the order of
+    `networks`) and the errors of all failed networks.
 
-    log.info(
-        f"Blockrange for accounting period {accounting_period} is from {dune.start_block} to "
-        f"{dune.end_block}."
+    The HTTP responses of worker processes are recorded to (or replayed from) `cassette`,
+    which is expected to be in use in the main process.
+    """
+    if len(networks) == 1:
+        return [
+            compute_network_payouts(
+                networks[0], accounting_period, profile, fresh=fresh
+            )
+        ], {}
+
+    # workers record to an empty cassette, their responses are added to `cassette`
+    worker_cassette = cassette if cassette is None or cassette.replay else Cassette()
+    results: dict[Network, NetworkPayouts] = {}
+    errors: dict[Network, BaseException] = {}
+    with ProcessPoolExecutor(
+        max_workers=len(networks), max_tasks_per_child=1
+    ) as executor:
+        futures = {
+            executor.submit(
+                compute_network_payouts,
+                network,
+                accounting_period,
+                profile,
+                worker_cassette,
+                fresh,
+            ): network
+            for network in networks
+        }
+        for future in as_completed(futures):
+            network = futures[future]
+            try:
+                results[network] = future.result()
+                # spans of worker processes are collected in the main process
+                recorder.extend(results[network].spans)
+                if cassette is not None:
+                    cassette.extend(results[network].http_interactions)
+                log.info(f"Computed payouts for network {network.value}")
+            except Exception as err:  # pylint: disable=broad-exception-caught
+                log.error(
+                    f"Computing payouts for network {network.value} failed: {err}"
+                )
+                errors[network] = err
+    return [results[network] for network in networks if network in results], errors
+
+
+def write_combined_report(
+    all_payouts: list[NetworkPayouts],
+    accounting_period: AccountingPeriod,
+    config: AccountingConfig,
+) -> str:
+    """Writes totals per network to a single CSV file and returns them as summary text"""
+    rows = [
+        {
+            "network": payouts.network.value,
+            "native_transfers": len(payouts.transfers_native),
+            "native_total": sum(t.amount_wei for t in payouts.transfers_native)
+            / 10**18,
+            "cow_transfers": len(payouts.transfers_cow),
+            "cow_total": sum(t.amount_wei for t in payouts.transfers_cow) / 10**18,
+            "overdrafts": len(payouts.overdrafts),
+            "overdraft_total": sum(o.wei for o in payouts.overdrafts) / 10**18,
+        }
+        for payouts in all_payouts
+    ]
+    FileIO(config.io_config.csv_output_dir).write_csv(
+        rows, f"transfers-all-{accounting_period}-summary.csv"
     )
+    cow_total = sum(t.amount_wei for p in all_payouts for t in p.transfers_cow) / 10**18
+    lines = [
+        f"{row['network']}: {row['native_total']:.4f} native token "
+        f"({row['native_transfers']} transfers), {row['cow_total']:.4f} COW "
+        f"({row['cow_transfers']} transfers), {row['overdrafts']} overdrafts"
+        for row in rows
+    ]
+    return "\n".join(lines + [f"Total COW Funds needed: {cow_total:.4f}"])
+
+
+def propose_network_payouts(
+    payouts: NetworkPayouts,
+    accounting_period: AccountingPeriod,
+    args: ScriptArgs,
+    slack_client: WebClient | None,
+) -> None:
+    """Propose stage of the accounting of one network"""
+    config = AccountingConfig.from_network(payouts.network)
+    with log_context(
+        network=payouts.network.value, period=str(accounting_period), stage="propose"
+    ):
+        if args.post_tx:
+            assert slack_client is not None
+            auto_propose(
+                transfers_cow=payouts.transfers_cow,
+                transfers_native=payouts.transfers_native,
+                overdrafts=payouts.overdrafts,
+                log_saver_obj=payouts.log_saver_obj,
+                slack_client=slack_client,
+                dry_run=args.dry_run,
+                config=config,
+            )
+        elif args.send_to_slack:
+            manual_propose(
+                transfers_cow=payouts.transfers_cow,
+                transfers_native=payouts.transfers_native,
+                period=accounting_period,
+                config=config,
+                send_to_slack=args.send_to_slack,
+                slack_client=slack_client,
+                log_saver_obj=payouts.log_saver_obj,
+            )
+        else:
+            manual_propose(
+                transfers_cow=payouts.transfers_cow,
+                transfers_native=payouts.transfers_native,
+                period=accounting_period,
+                config=config,
+            )
+
+
+def encode_consolidated_cow(transfers_cow: list[Transfer]) -> list[list[MultiSendTx]]:
+    """Multisend transactions of the consolidated COW transfers of all networks, chunked
+    by the gas limit. Raises a ValueError if they need more transactions than there are
+    nonce modifiers reserved for them."""
+    with span("encode_transactions", network="all") as timing, profile_stage("encode"):
+        chunks = chunk_transactions([t.as_multisend_tx() for t in transfers_cow])
+        timing.add(
+            len(transfers_cow), sum(len(tx.data) for chunk in chunks for tx in chunk)
+        )
+    # nonces from len(Network) on are used for the mainnet native and overdraft transactions
+    if len(chunks) > len(Network):
+        raise ValueError(f"Too many COW transfers for {len(Network)} transactions.")
+    return chunks
+
+
+def propose_consolidated_cow(
+    transfers_cow: list[Transfer],
+    chunks: list[list[MultiSendTx]],
+    accounting_period: AccountingPeriod,
+    args: ScriptArgs,
+    slack_client: WebClient | None,
+) -> None:
+    """Proposes the consolidated COW transfers of all networks (see `Transfer.consolidate`)
+    as the multisend transactions `chunks` (see `encode_consolidated_cow`) on mainnet"""
+    config = AccountingConfig.from_network(Network.MAINNET)
+    log_saver_obj = PrintStore()
+    log_saver_obj.print(Transfer.summarize(transfers_cow), category=Category.TOTALS)
+
+    if not args.post_tx:
+        FileIO(config.io_config.csv_output_dir).write_csv(
+            [asdict(CSVTransfer.from_transfer(t)) for t in transfers_cow],
+            f"transfers-all-{accounting_period}-COW.csv",
+        )
+        return
 
-    log_saver.print(
-        f"The data aggregated can be visualized at\n{dashboard_url(accounting_period, config)}",
+    log_saver_obj.print(
+        f"{len(transfers_cow)} COW transfers in {len(chunks)} transaction(s)",
         category=Category.GENERAL,
     )
+    if args.dry_run:
+        return
 
-    payout_temp = construct_payouts(
-        orderbook=orderbook,
-        dune=dune,
-        config=config,
-    )  # this is a PeriodPayouts object now
-
-    payout_transfers_temp = payout_temp.transfers
-    payout_overdrafts = payout_temp.overdrafts
-
-    payout_transfers_cow = []
-    payout_transfers_native = []
-    for tr in payout_transfers_temp:
-        if tr.token is None:
-            if tr.amount_wei >= config.payment_config.min_native_token_transfer:
-                payout_transfers_native.append(tr)
-        else:
-            if tr.amount_wei >= config.payment_config.min_cow_transfer:
-                payout_transfers_cow.append(tr)
+    signing_key = config.payment_config.signing_key
+    assert signing_key is not None and slack_client is not None
+    slack_channel = config.io_config.slack_channel
+    assert slack_channel is not None
+    client_mainnet = EthereumClient(URI(config.node_config.node_url_mainnet))
+    nonce = retrieve_safe_nonce(
+        client_mainnet, config.payment_config.payment_safe_address_cow
+    )
+    nonces = [
+        post_multisend(
+            safe_address=config.payment_config.payment_safe_address_cow,
+            transactions=chunk,
+            network=EthereumNetwork.MAINNET,
+            signing_key=signing_key,
+            client=client_mainnet,
+            nonce_modifier=nonce_modifier,
+            nonce=nonce,
+        )
+        for nonce_modifier, chunk in enumerate(chunks)
+    ]
+    post_to_slack(
+        slack_client,
+        channel=slack_channel,
+        message=(
+            f"""Solver Rewards COW transfers of all networks pending signatures:\n
+            mainnet transactions with nonces {nonces},
+            see {config.payment_config.safe_queue_url_cow}.\n
+            More details in thread"""
+        ),
+        sub_messages=log_saver_obj.get_values(),
+    )
+
+
+def write_run_report(
+    accounting_period: AccountingPeriod,
+    networks: list[Network],
+    config: AccountingConfig,
+) -> None:
+    """Writes the timing spans of the run as json report and OpenMetrics text file"""
+    spans = recorder.snapshot()
+    output_dir = config.io_config.csv_output_dir
+    write_json_report(
+        spans,
+        output_dir / f"run-report-{accounting_period}.json",
+        period=str(accounting_period),
+        networks=",".join(network.value for network in networks),
+    )
+    write_openmetrics(spans, output_dir / f"run-report-{accounting_period}.prom")
+    log.info(f"Run report written to {output_dir}")
 
-    if args.post_tx:
+
+def main() -> None:
+    """Generate transfers for an accounting period"""
+    start_logging()
+
+    args = generic_script_init(description="Fetch Complete Reimbursement")
+
+    accounting_period = AccountingPeriod(args.start)
+    # the output directory does not depend on the network
+    report_config = AccountingConfig.from_network(args.networks[0])
+    configure_profiling(args.profile, report_config.io_config.csv_output_dir)
+    cassette = None
+    if args.record_http:
+        cassette = Cassette()
+    elif args.replay_http:
+        cassette = Cassette.load(Path(args.replay_http))
+    try:
+        with use_cassette(cassette):
+            run_accounting(args, accounting_period, cassette)
+    finally:
+        write_run_report(accounting_period, args.networks, report_config)
+        if args.record_http and cassette is not None:
+            cassette.save(Path(args.record_http))
+
+
+def run_accounting(
+    args: ScriptArgs,
+    accounting_period: AccountingPeriod,
+    cassette: Cassette | None = None,
+) -> None:
+    """Computes and proposes the payouts of all networks. With `cassette` (in use in this
+    process), worker processes record to or replay from it as well."""
+    all_payouts, errors = compute_all_payouts(
+        args.networks, accounting_period, args.profile, cassette, args.fresh
+    )
+
+    slack_client = None
+    if args.post_tx or args.send_to_slack:
         ssl_context = ssl.create_default_context(cafile=certifi.where())
         ssl_context.verify_mode = ssl.CERT_REQUIRED
+        # the slack token does not depend on the network
+        io_config = AccountingConfig.from_network(args.networks[0]).io_config
         slack_client = WebClient(
-            token=config.io_config.slack_token,
+            token=io_config.slack_token,
+            base_url=io_config.slack_api_url,
             # https://stackoverflow.com/questions/59808346/python-3-slack-client-ssl-sslcertverificationerror
             ssl=ssl_context,
         )
-        auto_propose(
-            transfers_cow=payout_transfers_cow,
-            transfers_native=payout_transfers_native,
-            overdrafts=payout_overdrafts,
-            log_saver_obj=log_saver,
-            slack_client=slack_client,
-            dry_run=args.dry_run,
-            config=config,
+
+    if len(args.networks) > 1:
+        summary = write_combined_report(
+            all_payouts,
+            accounting_period,
+            AccountingConfig.from_network(args.networks[0]),
         )
-    elif args.send_to_slack:
-        ssl_context = ssl.create_default_context(cafile=certifi.where())
-        ssl_context.verify_mode = ssl.CERT_REQUIRED
-        slack_client = WebClient(
-            token=config.io_config.slack_token,
-            # https://stackoverflow.com/questions/59808346/python-3-slack-client-ssl-sslcertverificationerror
-            ssl=ssl_context,
+        log_saver.print(summary, category=Category.TOTALS)
+
+    transfers_cow, chunks = [], []
+    if args.consolidate_cow:
+        # the COW transfers of failed networks would be missing from the consolidated
+        # transfers, and proposing them later would reuse the same nonces
+        if errors:
+            raise RuntimeError(
+                f"Accounting failed for networks {[network.value for network in errors]}"
+                ", nothing is proposed with consolidated COW transfers"
+            )
+        transfers_cow = Transfer.consolidate(
+            [t for payouts in all_payouts for t in payouts.transfers_cow]
         )
-        manual_propose(
-            transfers_cow=payout_transfers_cow,
-            transfers_native=payout_transfers_native,
-            period=dune.period,
-            config=config,
-            send_to_slack=args.send_to_slack,
-            slack_client=slack_client,
-            log_saver_obj=log_saver,
+        # the transactions are checked before anything is proposed
+        chunks = encode_consolidated_cow(transfers_cow) if args.post_tx else []
+        all_payouts = [replace(payouts, transfers_cow=[]) for payouts in all_payouts]
+
+    # proposals are made one network after the other, as they share the mainnet safe
+    for payouts in all_payouts:
+        payouts.log_saver_obj.print(timing_summary(payouts.spans), Category.TIMING)
+        propose_network_payouts(payouts, accounting_period, args, slack_client)
+
+    if args.consolidate_cow:
+        propose_consolidated_cow(
+            transfers_cow, chunks, accounting_period, args, slack_client
         )
-    else:
-        manual_propose(
-            transfers_cow=payout_transfers_cow,
-            transfers_native=payout_transfers_native,
-            period=dune.period,
-            config=config,
+    if errors:
+        raise RuntimeError(
+            f"Accounting failed for networks {[network.value for network in errors]}"
         )
 
 
@@ -1,24 +1,201 @@
-"""Easy universal log configuration"""
+"""Easy universal log configuration
 
+Logging is configured once per process from `logging.conf`. Entry points (and worker
+processes) start a background `QueueListener` thread serving all configured handlers with
+`start_logging`, so that emitting a record only enqueues it and log I/O never blocks the
+payout computation. Importing this module does not start any thread: as long as no
+listener runs in the process (e.g. in tests), records are emitted synchronously.
+
+If `LOG_JSON_FILE` is set, records are additionally written as json lines to that file,
+including the context set with `log_context` (e.g. network, period and stage).
+"""
+
+from __future__ import annotations
+
+import atexit
+import contextvars
+import copy
+import functools
+import json
 import logging.config
+import os
+import queue
+from contextlib import contextmanager
+from datetime import datetime, timezone
 from logging import Logger
+from logging.handlers import QueueHandler, QueueListener
+from typing import Any, Iterator
 
-from src.config import IOConfig
+from src.config import LOG_CONFIG_FILE, load_env
 from src.utils.print_store import PrintStore
 
-io_config = IOConfig.from_env()
+_LOG_CONTEXT: contextvars.ContextVar[dict[str, str]] = contextvars.ContextVar(
+    "log_context", default={}
+)
 
 
-def set_log(name: str) -> Logger:
-    """Removes redundancy when setting log in each file"""
+@contextmanager
+def log_context(**fields: str) -> Iterator[None]:
+    """Adds `fields` to the context of all records logged within the block"""
+    token = _LOG_CONTEXT.set({**_LOG_CONTEXT.get(), **fields})
+    try:
+        yield
+    finally:
+        _LOG_CONTEXT.reset(token)
+
+
+def current_log_context() -> dict[str, str]:
+    """Fields of the current log context"""
+    return dict(_LOG_CONTEXT.get())
+
+
+class ContextFilter(logging.Filter):  # pylint: disable=too-few-public-methods
+    """Attaches the current log context to records.
+    Runs in the thread emitting the record, before it is handed to the queue."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.context = _LOG_CONTEXT.get()
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """Formats records as single line json objects"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry: dict[str, Any] = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            **getattr(record, "context", {}),
+        }
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry)
+
+
+# Running listeners by process id: forked worker processes inherit the module state, but
+# not the listener thread of their parent
+_LISTENERS: dict[int, QueueListener] = {}
+
+
+class _TargetQueueHandler(QueueHandler):
+    """Enqueues records together with the handler which is to emit them, or emits them
+    right away if no listener runs in this process"""
+
+    def __init__(
+        self, records: queue.SimpleQueue[logging.LogRecord], target: logging.Handler
+    ):
+        super().__init__(records)
+        self.target = target
+        self.addFilter(ContextFilter())
+
+    def emit(self, record: logging.LogRecord) -> None:
+        if os.getpid() in _LISTENERS:
+            super().emit(record)
+        elif record.levelno >= self.target.level:
+            self.target.handle(record)
 
-    log = logging.getLogger(name)
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # records do not leave the process, so unlike `QueueHandler.prepare` the exception
+        # is kept for the formatter of the target (e.g. the `exception` field of
+        # `JsonFormatter`) instead of being formatted into the message
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        record.msg = record.message
+        record.args = None
+        record.target = self.target
+        return record
 
+
+class _TargetHandler(logging.Handler):
+    """Passes dequeued records on to their target handler"""
+
+    def emit(self, record: logging.LogRecord) -> None:
+        target: logging.Handler = getattr(record, "target")
+        if record.levelno >= target.level:
+            target.handle(record)
+
+
+@functools.cache
+def _log_queue() -> queue.SimpleQueue[logging.LogRecord]:
+    """Queue of all records, emitted in order by a single background thread"""
+    return queue.SimpleQueue()
+
+
+def start_logging() -> bool:
+    """Configures logging and starts the listener thread emitting the queued records,
+    unless it runs in this process already. Returns whether it was started. The listener
+    is stopped with `stop_logging`, or at exit of the process."""
+    configure_logging()
+    if os.getpid() in _LISTENERS:
+        return False
+    listener = QueueListener(_log_queue(), _TargetHandler())
+    listener.start()
+    _LISTENERS[os.getpid()] = listener
+    # registered once, however often the listener is restarted
+    atexit.unregister(stop_logging)
+    atexit.register(stop_logging)
+    return True
+
+
+def stop_logging() -> None:
+    """Emits all queued records and stops the listener thread of this process, if any"""
+    listener = _LISTENERS.pop(os.getpid(), None)
+    if listener is not None:
+        listener.stop()
+
+
+@contextmanager
+def logging_started() -> Iterator[None]:
+    """Runs the listener thread within the block, unless it runs already (e.g. in the main
+    process). For tasks of worker processes, whose exit does not run `atexit` handlers.
+    """
+    started = start_logging()
+    try:
+        yield
+    finally:
+        if started:
+            stop_logging()
+
+
+@functools.cache
+def configure_logging() -> None:
+    """Reads the log configuration and moves all handlers behind queues (once)"""
     logging.config.fileConfig(
-        fname=io_config.log_config_file.absolute(),
+        fname=LOG_CONFIG_FILE.absolute(),
         disable_existing_loggers=False,
     )
-    return log
+    loggers = [logging.getLogger()] + [
+        logger
+        for logger in logging.Logger.manager.loggerDict.values()
+        if isinstance(logger, Logger) and logger.handlers
+    ]
+
+    queue_handlers: dict[int, QueueHandler] = {}
+    for logger in loggers:
+        for handler in list(logger.handlers):
+            if id(handler) not in queue_handlers:
+                queue_handlers[id(handler)] = _TargetQueueHandler(_log_queue(), handler)
+            logger.removeHandler(handler)
+            logger.addHandler(queue_handlers[id(handler)])
+
+    load_env()
+    json_file = os.environ.get("LOG_JSON_FILE")
+    if json_file:
+        json_handler = logging.FileHandler(json_file, encoding="utf-8")
+        json_handler.setFormatter(JsonFormatter())
+        json_queue_handler = _TargetQueueHandler(_log_queue(), json_handler)
+        # records only reach the root logger's handlers if they propagate
+        for logger in loggers:
+            if logger.name == "root" or not logger.propagate:
+                logger.addHandler(json_queue_handler)
+
+
+def set_log(name: str) -> Logger:
+    """Removes redundancy when setting log in each file"""
+    configure_logging()
+    return logging.getLogger(name)
 
 
 log_saver = PrintStore()
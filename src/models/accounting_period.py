@@ -5,10 +5,14 @@ Common location for shared resources throughout the project.
 from __future__ import annotations
 
 from datetime import datetime, timedelta
+from typing import Iterator
 
 from dune_client.types import QueryParameter
 
 DATE_FORMAT = "%Y-%m-%d"
+# Format of period bounds which do not fall on midnight (e.g. of hourly sub-periods). Periods
+# are part of file names, so the format does not contain colons.
+DATETIME_FORMAT = "%Y-%m-%dT%H%M"
 
 
 class AccountingPeriod:
@@ -18,17 +22,57 @@ class AccountingPeriod:
         self.start = datetime.strptime(start, DATE_FORMAT)
         self.end = self.start + timedelta(days=length_days)
 
+    @classmethod
+    def from_bounds(cls, start: datetime, end: datetime) -> AccountingPeriod:
+        """Period from `start` to `end`, not restricted to whole days"""
+        assert start < end, f"Empty period from {start} to {end}"
+        period = cls(start.strftime(DATE_FORMAT))
+        period.start, period.end = start, end
+        return period
+
+    def split(self, length: timedelta) -> Iterator[AccountingPeriod]:
+        """Consecutive sub-periods of `length` covering the period.
+        The last sub-period is shorter if `length` does not divide the period."""
+        assert length > timedelta(0), "Sub-periods must not be empty"
+        start = self.start
+        while start < self.end:
+            end = min(start + length, self.end)
+            yield AccountingPeriod.from_bounds(start, end)
+            start = end
+
     def __str__(self) -> str:
+        bounds_format = (
+            DATE_FORMAT
+            if self.start.time() == self.end.time() == datetime.min.time()
+            else DATETIME_FORMAT
+        )
         return "-to-".join(
-            [self.start.strftime(DATE_FORMAT), self.end.strftime(DATE_FORMAT)]
+            [self.start.strftime(bounds_format), self.end.strftime(bounds_format)]
         )
 
+    def __eq__(self, other: object) -> bool:
+        if isinstance(other, AccountingPeriod):
+            return (self.start, self.end) == (other.start, other.end)
+        return False
+
     def __hash__(self) -> int:
         """Turns (1985-03-10, 1994-04-05) into only the digits 1985031019940405"""
         return int(
             "".join([self.start.strftime("%Y%m%d"), self.end.strftime("%Y%m%d")])
         )
 
+    @staticmethod
+    def split_range(
+        start: str, end: str, length_days: int = 7
+    ) -> list[AccountingPeriod]:
+        """Consecutive periods of `length_days` days from `start`, ending no later than `end`"""
+        periods = []
+        period = AccountingPeriod(start, length_days)
+        while period.end <= datetime.strptime(end, DATE_FORMAT):
+            periods.append(period)
+            period = AccountingPeriod(period.end.strftime(DATE_FORMAT), length_days)
+        return periods
+
     def as_query_params(self) -> list[QueryParameter]:
         """Returns commonly used (start_time, end_time) query parameters"""
         return [
@@ -2,17 +2,15 @@
 
 from __future__ import annotations
 
-import os
 from dataclasses import dataclass
 
 from dune_client.types import Address
 from safe_eth.safe.multi_send import MultiSendOperation, MultiSendTx
 from web3 import Web3
-from src.abis.load import overdraftsmanager
-from src.models.accounting_period import AccountingPeriod
-from src.config import OverdraftConfig, Network
 
-OVERDRAFTS_CONTRACT = overdraftsmanager()
+from src.abis.load import IndexedContract, abi_function
+from src.models.accounting_period import AccountingPeriod
+from src.config import OverdraftConfig
 
 
 @dataclass
@@ -32,18 +30,16 @@ class Overdraft:
         """Returns amount in units"""
         return self.wei / 10**18
 
-    def as_multisend_tx(self) -> MultiSendTx:
-        """Converts Overdraft into encoded MultiSendTx bytes"""
-        network = Network(os.getenv("NETWORK"))
-        config = OverdraftConfig.from_network(network)
+    def as_multisend_tx(self, config: OverdraftConfig) -> MultiSendTx:
+        """Converts Overdraft into encoded MultiSendTx bytes for the overdrafts manager
+        contract of `config`"""
         contract_address = Web3.to_checksum_address(config.contract_address.address)
         return MultiSendTx(
             operation=MultiSendOperation.CALL,
             to=contract_address,
             value=0,
-            data=OVERDRAFTS_CONTRACT.encode_abi(
-                abi_element_identifier="addOverdraft",
-                args=[Web3.to_checksum_address(self.account.address), self.wei],
+            data=abi_function(IndexedContract.OVERDRAFTSMANAGER, "addOverdraft").encode(
+                Web3.to_checksum_address(self.account.address), self.wei
             ),
         )
 
@@ -8,8 +8,8 @@ from enum import Enum
 from typing import Optional
 
 from dune_client.types import Address
+from web3 import Web3
 
-from src.config import web3
 from src.utils.token_details import get_token_decimals
 
 
@@ -39,18 +39,27 @@ class Token:
     Token class consists of token `address` and additional `decimals` value.
     The constructor exists in a way that we can either
     - provide the decimals (for unit testing) which avoids making web3 calls
-    - fetch the token decimals with eth_call.
+    - fetch the token decimals with eth_call using `web3`.
     Since we primarily work with the COW token, the decimals are hardcoded here.
     """
 
-    def __init__(self, address: str | Address, decimals: Optional[int] = None):
+    def __init__(
+        self,
+        address: str | Address,
+        decimals: Optional[int] = None,
+        web3: Optional[Web3] = None,
+    ):
         if isinstance(address, str):
             address = Address(address)
         self.address = address
 
-        self.decimals = (
-            decimals if decimals is not None else get_token_decimals(web3, address)
-        )
+        if decimals is None:
+            if web3 is None:
+                raise ValueError(
+                    f"Decimals of token {address} require a web3 instance."
+                )
+            decimals = get_token_decimals(web3, address)
+        self.decimals = decimals
 
     def __repr__(self) -> str:
         return str(self.address)
@@ -12,11 +12,9 @@ from eth_typing.encoding import HexStr
 from safe_eth.safe.multi_send import MultiSendOperation, MultiSendTx
 from web3 import Web3
 
-from src.abis.load import erc20
+from src.abis.load import IndexedContract, abi_function
 from src.models.token import TokenType, Token
 
-ERC20_CONTRACT = erc20()
-
 
 @dataclass
 class CSVTransfer:
@@ -56,6 +54,26 @@ class Transfer:
         self._recipient = recipient
         self.amount_wei = amount_wei
 
+    @staticmethod
+    def consolidate(transfers: list[Transfer]) -> list[Transfer]:
+        """Merges transfers of the same token to the same recipient into one transfer.
+        Transfers are returned in order of first occurrence."""
+        merged: dict[tuple[Address | None, Address], Transfer] = {}
+        for transfer in transfers:
+            key = (
+                transfer.token.address if transfer.token else None,
+                transfer.recipient,
+            )
+            if key in merged:
+                merged[key] = Transfer(
+                    token=transfer.token,
+                    recipient=transfer.recipient,
+                    amount_wei=merged[key].amount_wei + transfer.amount_wei,
+                )
+            else:
+                merged[key] = transfer
+        return list(merged.values())
+
     @staticmethod
     def summarize(transfers: list[Transfer]) -> str:
         """Summarizes transfers with totals"""
@@ -107,9 +125,8 @@ class Transfer:
                 operation=MultiSendOperation.CALL,
                 to=Web3.to_checksum_address(str(self.token.address)),
                 value=0,
-                data=ERC20_CONTRACT.encode_abi(
-                    abi_element_identifier="transfer",
-                    args=[receiver, self.amount_wei],
+                data=abi_function(IndexedContract.ERC20, "transfer").encode(
+                    receiver, self.amount_wei
                 ),
             )
         raise ValueError(f"Unsupported type {self.token_type}")
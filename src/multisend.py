@@ -13,13 +13,20 @@ from safe_eth.safe.multi_send import MultiSend, MultiSendOperation, MultiSendTx
 from safe_eth.safe.safe import Safe
 
 
-from src.config import web3
-from src.abis.load import weth9
+from web3 import Web3
+
+from src.abis.load import IndexedContract, abi_function
+from src.config import load_env
 from src.logger import set_log
+from src.utils.cassette import replaying
+from src.utils.spans import span
 
 log = set_log(__name__)
 
-api_key = os.getenv("SAFE_API_KEY")
+# Conservative gas estimate of a single ERC20 transfer within a multisend and the gas
+# budget of one multisend transaction (well below the block gas limit).
+ERC20_TRANSFER_GAS = 40_000
+MULTISEND_GAS_LIMIT = 10_000_000
 
 
 def build_encoded_multisend(
@@ -33,24 +40,42 @@ def build_encoded_multisend(
     return tx_bytes
 
 
+def chunk_transactions(
+    transactions: list[MultiSendTx],
+    gas_per_transaction: int = ERC20_TRANSFER_GAS,
+    gas_limit: int = MULTISEND_GAS_LIMIT,
+) -> list[list[MultiSendTx]]:
+    """Splits transactions into chunks which each fit into one multisend transaction"""
+    chunk_size = max(1, gas_limit // gas_per_transaction)
+    return [
+        transactions[index : index + chunk_size]
+        for index in range(0, len(transactions), chunk_size)
+    ]
+
+
 def prepend_unwrap_if_necessary(
     client: EthereumClient,
     safe_address: ChecksumAddress,
     transactions: list[MultiSendTx],
     wrapped_native_token: ChecksumAddress,
     skip_validation: bool = False,
+    eth_balance: int | None = None,
 ) -> list[MultiSendTx]:
     """
     Given a list of multisend transactions, this checks that
     the total outgoing ETH is sufficient and unwraps entire WETH balance when it isn't.
     Raises if the ETH + WETH balance is still insufficient.
+    The ETH balance of the safe is read from the node unless `eth_balance` is given.
     """
-    eth_balance = client.get_balance(web3.to_checksum_address(safe_address))
+    # pylint: disable=too-many-arguments,too-many-positional-arguments
+    if eth_balance is None:
+        eth_balance = client.get_balance(Web3.to_checksum_address(safe_address))
     # Amount of outgoing ETH from transfer
     eth_needed = sum(t.value for t in transactions)
     if eth_balance < eth_needed:
-        weth = weth9(client.w3, wrapped_native_token)
-        weth_balance = weth.functions.balanceOf(safe_address).call()
+        weth_balance = abi_function(IndexedContract.WETH9, "balanceOf").call(
+            client.w3, wrapped_native_token, safe_address
+        )
         weth_unwrap_amount = eth_needed - eth_balance
 
         if weth_balance + eth_balance < eth_needed:
@@ -68,16 +93,25 @@ def prepend_unwrap_if_necessary(
             0,
             MultiSendTx(
                 operation=MultiSendOperation.CALL,
-                to=weth.address,
+                to=wrapped_native_token,
                 value=0,
-                data=weth.encode_abi(
-                    abi_element_identifier="withdraw", args=[weth_unwrap_amount]
+                data=abi_function(IndexedContract.WETH9, "withdraw").encode(
+                    weth_unwrap_amount
                 ),
             ),
         )
     return transactions
 
 
+def retrieve_safe_nonce(client: EthereumClient, safe_address: ChecksumAddress) -> int:
+    """Current (on-chain) nonce of a safe"""
+    safe = Safe(  # type: ignore  # pylint: disable=abstract-class-instantiated
+        address=safe_address, ethereum_client=client
+    )
+    nonce: int = safe.retrieve_nonce()
+    return nonce
+
+
 def post_multisend(
     safe_address: ChecksumAddress,
     network: EthereumNetwork,
@@ -85,18 +119,42 @@ def post_multisend(
     client: EthereumClient,
     signing_key: str,
     nonce_modifier: int = 0,
+    nonce: int | None = None,
 ) -> int | None:
-    """Posts a MultiSend Transaction from a list of Transfers."""
+    """Posts a MultiSend Transaction from a list of Transfers.
+    The nonce of the safe is read from the node unless `nonce` is given."""
     # pylint: disable=too-many-arguments,too-many-positional-arguments
 
     if len(transactions) == 0:
         return None
+    with span("post_multisend", safe=str(safe_address)) as timing:
+        timing.add(len(transactions))
+        if nonce is None:
+            nonce = retrieve_safe_nonce(client, safe_address)
+        return _post_multisend(
+            safe_address,
+            network,
+            transactions,
+            client,
+            signing_key,
+            nonce + nonce_modifier,
+        )
+
+
+def _post_multisend(  # pylint: disable=too-many-arguments,too-many-positional-arguments
+    safe_address: ChecksumAddress,
+    network: EthereumNetwork,
+    transactions: list[MultiSendTx],
+    client: EthereumClient,
+    signing_key: str,
+    nonce: int,
+) -> int:
     encoded_multisend = build_encoded_multisend(transactions, client=client)
     safe = Safe(  # type: ignore  # pylint: disable=abstract-class-instantiated
         address=safe_address, ethereum_client=client
     )
 
-    multisend_contract = web3.to_checksum_address(
+    multisend_contract = Web3.to_checksum_address(
         "0x40A2aCCbd92BCA938b02010E17A5b8929b49130D"
     )
 
@@ -105,16 +163,24 @@ def post_multisend(
         value=0,
         data=encoded_multisend,
         operation=MultiSendOperation.DELEGATE_CALL.value,
-        safe_nonce=safe.retrieve_nonce() + nonce_modifier,
+        safe_nonce=nonce,
     )
     # There is a deep warning being raised here:
     # Details in issue: https://github.com/safe-global/safe-eth-py/issues/294
     safe_tx.sign(signing_key)
-    tx_service = TransactionServiceApi(network, client, api_key=api_key)
+    load_env()
+    tx_service = TransactionServiceApi(
+        network,
+        client,
+        # defaults to the public transaction service of the network
+        base_url=os.getenv("SAFE_TRANSACTION_SERVICE_URL") or None,
+        api_key=os.getenv("SAFE_API_KEY"),
+    )
     print(
         f"Posting transaction with hash"
         f" {safe_tx.safe_tx_hash.hex()} to {safe.address}"
     )
     tx_service.post_transaction(safe_tx=safe_tx)
-    time.sleep(2)  # attempt to avoid Safe API's rate limits
+    if not replaying():
+        time.sleep(2)  # attempt to avoid Safe API's rate limits
     return int(safe_tx.safe_nonce)
@@ -2,17 +2,55 @@
 
 from __future__ import annotations
 
+import os
+from pathlib import Path
+from typing import Any, Sequence
+
 import pandas as pd
+import pyarrow.parquet as pq
 from pandas import DataFrame, Series, read_sql_query
 from sqlalchemy import create_engine
 from sqlalchemy.engine import Engine
 
-from src.config import AccountingConfig
+from src.config import AccountingConfig, load_env
 from src.logger import set_log
 from src.models.accounting_period import AccountingPeriod
+from src.utils.amounts import parse_exact_amount
+from src.utils.arrow_ipc import read_ipc
+from src.utils.spans import span
+from src.utils.stage_cache import digest
 
 log = set_log(__name__)
 
+# address columns of the analytics tables, converted to hex strings
+HEX_COLUMNS = {
+    "fct_data_per_solver_and_accounting_period": [
+        "solver",
+        "pool_address",
+        "reward_target",
+    ],
+    "fct_partner_and_protocol_fees": ["partner_fee_recipient"],
+}
+# amount columns of the analytics tables, parsed exactly from exported CSV files
+AMOUNT_COLUMNS = {
+    "fct_data_per_solver_and_accounting_period": [
+        "sum_batch_reward_native",
+        "sum_batch_reward_cow",
+        "consistency_reward_native",
+        "consistency_reward_cow",
+        "sum_quote_reward_cow",
+        "sum_protocol_fee_native",
+        "sum_network_fee_native",
+        "sum_slippage_native",
+    ],
+    "fct_partner_and_protocol_fees": [
+        "sum_partner_fee_native",
+        "sum_protocol_fee_native",
+    ],
+}
+# environments of the analytics database, whose rows are combined
+ENVIRONMENTS = ["prod", "staging"]
+
 
 class MultiInstanceDBFetcher:
     """
@@ -23,6 +61,39 @@ class MultiInstanceDBFetcher:
     def __init__(self) -> None:
         log.info("Initializing MultiInstanceDBFetcher")
 
+    def source(self, config: AccountingConfig) -> str:
+        """Identifies the data source of a network, e.g. for keys of cached results"""
+        # host of the database only, the url contains credentials
+        return config.orderbook_config.analytics_db_url.rpartition("@")[2]
+
+    def freshness(
+        self,
+        accounting_period: AccountingPeriod | Sequence[AccountingPeriod],
+        config: AccountingConfig,
+    ) -> str:
+        """Fingerprint of the analytics tables of a period, so that cached results of a
+        period are not reused after the analytics data changed. Per table and environment,
+        it consists of the number of rows of the period and of the table's write counters
+        (inserted, updated and deleted rows, see `pg_stat_user_tables`) and object id,
+        which change with every write or rebuild of the table. Neither scans nor sorts the
+        contents of the table."""
+        schema = config.orderbook_config.schema
+        fingerprints = []
+        for table_name in HEX_COLUMNS:
+            query = f"""SELECT count(*) AS row_count,
+            (SELECT concat_ws(':', relid, n_tup_ins, n_tup_upd, n_tup_del)
+                FROM pg_stat_user_tables
+                WHERE schemaname = '{schema}' AND relname = '{table_name}'
+            ) AS writes
+            FROM {schema}.{table_name}
+            where accounting_period in ({period_strings(accounting_period)})"""
+            for environment in ENVIRONMENTS:
+                result = self.exec_query(query, analytics_engine(config, environment))
+                fingerprints.append(
+                    (table_name, environment, *map(str, result.iloc[0]))
+                )
+        return digest(fingerprints)
+
     @classmethod
     def exec_query(cls, query: str, engine: Engine) -> DataFrame:
         """Executes query on DB engine"""
@@ -31,10 +102,9 @@ class MultiInstanceDBFetcher:
     def get_analytics_db_table_prod_and_barn(
         self,
         table_name: str,
-        accounting_period: AccountingPeriod,
+        accounting_period: AccountingPeriod | Sequence[AccountingPeriod],
         config: AccountingConfig,
     ) -> DataFrame:
-        # pylint: disable=too-many-locals
         """
         Constructs and executes a query on an analytics database for specific environments
         and consolidates the results into a single DataFrame. The function fetches data
@@ -46,10 +116,11 @@ class MultiInstanceDBFetcher:
         ----------
         table_name : str
             The name of the database table to query.
-        accounting_period : AccountingPeriod
+        accounting_period : AccountingPeriod | Sequence[AccountingPeriod]
             The period for which the data should be fetched. The AccountingPeriod
             object must have `start` and `end` attributes formatted as datetime
-            objects.
+            objects. If several periods are given, the data of all of them is fetched
+            with one query, see `split_by_accounting_period`.
         config : AccountingConfig
             Configuration object containing database connection details such as
             analytics_db_url, network_db_name, and schema.
@@ -60,34 +131,25 @@ class MultiInstanceDBFetcher:
             A Pandas DataFrame containing the concatenated query results from the
             `prod` and `staging` environments.
         """
-        db_url = (
-            config.orderbook_config.analytics_db_url
-        )  # this is not compatible with the current format
-        network = config.orderbook_config.network_db_name
         schema = config.orderbook_config.schema
-        start_time_string = accounting_period.start.strftime("%Y-%m-%d %H:%M:%S")
-        end_time_string = accounting_period.end.strftime("%Y-%m-%d %H:%M:%S")
-        accounting_period_string = f"{start_time_string} - {end_time_string}"
         query = f"""SELECT * FROM {schema}.{table_name}
-        where accounting_period = '{accounting_period_string}'"""
+        where accounting_period in ({period_strings(accounting_period)})"""
         result_list = []
-        # for environment in ["prod"]:
-        for environment in ["prod", "staging"]:
-            pg_engine = create_engine(
-                f"postgresql+psycopg2://{db_url}/{environment}_{network}",
-                pool_pre_ping=True,
-                connect_args={
-                    "keepalives": 1,
-                    "keepalives_idle": 30,
-                    "keepalives_interval": 10,
-                    "keepalives_count": 5,
-                },
-            )
-            with pg_engine.connect() as conn:
+        for environment in ENVIRONMENTS:
+            pg_engine = analytics_engine(config, environment)
+            with (
+                span(
+                    "analytics_db", table=table_name, environment=environment
+                ) as timing,
+                pg_engine.connect() as conn,
+            ):
+                # amounts are parsed exactly downstream, see `src.utils.amounts`
                 result = read_sql_query(
                     query,
                     conn,
+                    coerce_float=False,
                 )
+                timing.add(len(result), int(result.memory_usage(deep=True).sum()))
                 result_list.append(result)
 
         results = pd.concat(result_list).reset_index(drop=True)
@@ -95,7 +157,9 @@ class MultiInstanceDBFetcher:
         return results
 
     def get_data_per_solver(
-        self, accounting_period: AccountingPeriod, config: AccountingConfig
+        self,
+        accounting_period: AccountingPeriod | Sequence[AccountingPeriod],
+        config: AccountingConfig,
     ) -> DataFrame:
         """Fetches and processes solver-related data for a specific accounting period.
 
@@ -107,8 +171,9 @@ class MultiInstanceDBFetcher:
 
         Parameters
         ----------
-        accounting_period : AccountingPeriod
+        accounting_period : AccountingPeriod | Sequence[AccountingPeriod]
             The accounting period object used to filter data for the required time range.
+            Several periods can be fetched at once.
         config : AccountingConfig
             Configuration detailing settings and parameters for the data retrieval and
             processing operations.
@@ -123,14 +188,15 @@ class MultiInstanceDBFetcher:
             "fct_data_per_solver_and_accounting_period", accounting_period, config
         )
 
-        hex_columns = ["solver", "pool_address", "reward_target"]
-        for column in hex_columns:
-            results[column] = results[column].apply(bytearray2hex)
+        for column in HEX_COLUMNS["fct_data_per_solver_and_accounting_period"]:
+            results[column] = results[column].apply(normalize_hex)
 
         return results
 
     def get_partner_and_protocol_fees(
-        self, accounting_period: AccountingPeriod, config: AccountingConfig
+        self,
+        accounting_period: AccountingPeriod | Sequence[AccountingPeriod],
+        config: AccountingConfig,
     ) -> DataFrame:
         """
         Fetches and processes partner and protocol fees data from an analytics database table.
@@ -142,8 +208,9 @@ class MultiInstanceDBFetcher:
 
         Parameters
         ----------
-        accounting_period : AccountingPeriod
+        accounting_period : AccountingPeriod | Sequence[AccountingPeriod]
             The accounting period for which the partner and protocol fees data is to be fetched.
+            Several periods can be fetched at once.
         config : AccountingConfig
             Configuration settings specifying the analytics database and environment.
 
@@ -158,12 +225,189 @@ class MultiInstanceDBFetcher:
             "fct_partner_and_protocol_fees", accounting_period, config
         )
 
-        hex_columns = ["partner_fee_recipient"]
-        for column in hex_columns:
-            results[column] = results[column].apply(bytearray2hex)
+        for column in HEX_COLUMNS["fct_partner_and_protocol_fees"]:
+            results[column] = results[column].apply(normalize_hex)
+
+        return results
+
+
+class FileDBFetcher(MultiInstanceDBFetcher):
+    """
+    Reads the analytics tables from exported files instead of the analytics database,
+    e.g. to investigate payouts offline or to compute many variants of them quickly.
+
+    The files of a table are looked up in the directory of the network database (e.g.
+    `<input_dir>/xdai/`) or else in `input_dir` itself, as `<table_name>*.parquet`,
+    `<table_name>*.arrow` (Arrow IPC) or `<table_name>*.csv`. All matching files (e.g.
+    exports of `prod` and `staging`) are concatenated. Addresses are normalized as for
+    the database (bytes, `\\x` or `0x` prefixed hex strings) and amounts in CSV files are
+    parsed exactly.
+    """
+
+    SUFFIXES = (".parquet", ".arrow", ".csv")
+
+    def __init__(  # pylint: disable=super-init-not-called
+        self, input_dir: Path, memory_map: bool = True
+    ) -> None:
+        log.info(f"Initializing FileDBFetcher with files in {input_dir}")
+        self.input_dir = input_dir
+        self.memory_map = memory_map
+
+    def table_files(self, table_name: str, config: AccountingConfig) -> list[Path]:
+        """Exported files of a table"""
+        for directory in (
+            self.input_dir / config.orderbook_config.network_db_name,
+            self.input_dir,
+        ):
+            files = sorted(
+                path
+                for path in directory.glob(f"{table_name}*")
+                if path.suffix in self.SUFFIXES
+            )
+            if files:
+                return files
+        raise FileNotFoundError(
+            f"No exported files of table {table_name} in {self.input_dir}"
+        )
+
+    def freshness(
+        self,
+        accounting_period: AccountingPeriod | Sequence[AccountingPeriod],
+        config: AccountingConfig,
+    ) -> str:
+        """Changes of the exported files are part of `source` already"""
+        return ""
+
+    def source(self, config: AccountingConfig) -> str:
+        """Digest of names, sizes and modification times of the exported files"""
+        return digest(
+            [
+                (str(path), path.stat().st_size, path.stat().st_mtime_ns)
+                for table_name in HEX_COLUMNS
+                for path in self.table_files(table_name, config)
+            ]
+        )
 
+    def read_file(self, path: Path, table_name: str) -> DataFrame:
+        """Reads one exported file of a table"""
+        if path.suffix == ".parquet":
+            return pq.read_table(path, memory_map=self.memory_map).to_pandas()
+        if path.suffix == ".arrow":
+            return read_ipc(path)
+        # amounts are read as strings and parsed exactly, booleans as exported by psql
+        results = pd.read_csv(
+            path,
+            dtype={column: str for column in AMOUNT_COLUMNS[table_name]},
+            true_values=["t", "true", "True"],
+            false_values=["f", "false", "False"],
+            memory_map=self.memory_map,
+        )
+        for column in AMOUNT_COLUMNS[table_name]:
+            if column in results:
+                results[column] = results[column].map(parse_exact_amount).astype(object)
         return results
 
+    def get_analytics_db_table_prod_and_barn(
+        self,
+        table_name: str,
+        accounting_period: AccountingPeriod | Sequence[AccountingPeriod],
+        config: AccountingConfig,
+    ) -> DataFrame:
+        """Reads the rows of the given periods from the exported files of a table (see
+        `MultiInstanceDBFetcher.get_analytics_db_table_prod_and_barn`)"""
+        periods = (
+            [accounting_period]
+            if isinstance(accounting_period, AccountingPeriod)
+            else accounting_period
+        )
+        result_list = []
+        for path in self.table_files(table_name, config):
+            with span("analytics_files", table=table_name, file=path.name) as timing:
+                result = self.read_file(path, table_name)
+                result.columns = [str(column).strip().lower() for column in result]
+                result = result[
+                    result["accounting_period"].isin(
+                        [accounting_period_string(period) for period in periods]
+                    )
+                ]
+                timing.add(len(result), int(result.memory_usage(deep=True).sum()))
+                result_list.append(result)
+        return pd.concat(result_list).reset_index(drop=True)
+
+
+def analytics_fetcher() -> MultiInstanceDBFetcher:
+    """Fetcher of the analytics tables: the analytics database or, if the environment
+    variable `ANALYTICS_INPUT_DIR` is set, exported files in that directory"""
+    load_env()
+    input_dir = os.environ.get("ANALYTICS_INPUT_DIR")
+    if input_dir:
+        return FileDBFetcher(Path(input_dir))
+    return MultiInstanceDBFetcher()
+
+
+def analytics_engine(config: AccountingConfig, environment: str) -> Engine:
+    """Engine of the analytics database of a network and environment"""
+    db_url = (
+        config.orderbook_config.analytics_db_url
+    )  # this is not compatible with the current format
+    network = config.orderbook_config.network_db_name
+    return create_engine(
+        f"postgresql+psycopg2://{db_url}/{environment}_{network}",
+        pool_pre_ping=True,
+        connect_args={
+            "keepalives": 1,
+            "keepalives_idle": 30,
+            "keepalives_interval": 10,
+            "keepalives_count": 5,
+        },
+    )
+
+
+def period_strings(
+    accounting_period: AccountingPeriod | Sequence[AccountingPeriod],
+) -> str:
+    """Quoted values of the `accounting_period` column of one or several periods, e.g. for
+    `where accounting_period in (...)`"""
+    periods = (
+        [accounting_period]
+        if isinstance(accounting_period, AccountingPeriod)
+        else accounting_period
+    )
+    return ", ".join(f"'{accounting_period_string(period)}'" for period in periods)
+
+
+def accounting_period_string(period: AccountingPeriod) -> str:
+    """Value of the `accounting_period` column of the analytics tables for a period"""
+    start_time_string = period.start.strftime("%Y-%m-%d %H:%M:%S")
+    end_time_string = period.end.strftime("%Y-%m-%d %H:%M:%S")
+    return f"{start_time_string} - {end_time_string}"
+
+
+def split_by_accounting_period(
+    results: DataFrame, periods: Sequence[AccountingPeriod]
+) -> dict[str, DataFrame]:
+    """Splits results fetched for several periods into one data frame per period.
+
+    Parameters
+    ----------
+    results : DataFrame
+        Results of a query for several accounting periods, with column `accounting_period`.
+    periods : Sequence[AccountingPeriod]
+        The accounting periods the results were fetched for.
+
+    Returns
+    -------
+    dict[str, DataFrame]
+        Data frames (with a fresh index) keyed by the string representation of each period.
+        Periods without data map to empty data frames.
+    """
+    return {
+        str(period): results[
+            results["accounting_period"] == accounting_period_string(period)
+        ].reset_index(drop=True)
+        for period in periods
+    }
+
 
 def bytearray2hex(address: bytearray) -> str | None:
     """Converts a bytearray into its hexadecimal string representation.
@@ -187,6 +431,33 @@ def bytearray2hex(address: bytearray) -> str | None:
     return "0x" + address.hex() if address else None
 
 
+def normalize_hex(value: Any) -> str | None:
+    """Converts an address as stored in the analytics database or in exports of it
+    (bytes, or hex strings with `0x`, `\\x` or no prefix) into a lowercase `0x` prefixed
+    hex string. Missing and empty values are returned as None.
+
+    Parameters
+    ----------
+    value : Any
+        The address as bytes, bytearray, memoryview or string, or a missing value.
+
+    Returns
+    -------
+    str | None
+        The normalized address, or None if `value` is missing or empty.
+    """
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return bytearray2hex(bytearray(value))
+    if not isinstance(value, str):
+        if value is None or pd.isna(value):
+            return None
+        raise ValueError(f"Invalid address {value!r}")
+    value = value.strip().lower()
+    for prefix in ("0x", "\\x"):
+        value = value.removeprefix(prefix)
+    return "0x" + value if value else None
+
+
 def pg_hex2bytea(hex_address: str) -> str:
     """
     transforms hex string (beginning with 0x) to dune
@@ -0,0 +1,120 @@
+"""
+Concurrent execution of tasks with dependencies.
+
+Tasks are declared with the names of the tasks they depend on and, optionally, the resource
+they use (e.g. the analytics database or a node). All tasks whose dependencies are done are
+run at the same time in threads, up to the concurrency limit of their resource, and receive
+the results of their dependencies as keyword arguments. The wall time of a run is thus the
+longest chain of dependent tasks rather than the sum of all tasks.
+
+Tasks are I/O bound (queries and HTTP requests), so threads suffice. They run in a copy of
+the context of the caller, so that log context and timing spans are labelled as usual and
+tasks are part of the CPU profile of the stage (see `src.utils.profiling`).
+"""
+
+from __future__ import annotations
+
+import contextvars
+import time
+from collections import Counter
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from typing import Any, Callable, Sequence
+
+from src.logger import set_log
+from src.utils.profiling import profile_thread
+
+log = set_log(__name__)
+
+# Concurrency limits of the external services used during a run
+RESOURCE_LIMITS = {"database": 2, "dune": 2, "prices": 2, "node": 4}
+
+
+@dataclass(frozen=True)
+class Task:
+    """A named unit of work, run once all tasks in `after` are done"""
+
+    name: str
+    run: Callable[..., Any]
+    after: tuple[str, ...] = ()
+    resource: str | None = None
+
+
+class Scheduler:
+    """Runs tasks as soon as their dependencies are done, with at most `limits[resource]`
+    tasks of each resource at the same time (resources without limit are unlimited)."""
+
+    def __init__(self, limits: dict[str, int] | None = None):
+        self.limits = limits or {}
+        self.tasks: dict[str, Task] = {}
+
+    def add(
+        self,
+        name: str,
+        run: Callable[..., Any],
+        *,
+        after: Sequence[str] = (),
+        resource: str | None = None,
+    ) -> None:
+        """Adds a task. `run` is called with the results of the tasks in `after` as
+        keyword arguments, which have to be added before (so there are no cycles)."""
+        if name in self.tasks:
+            raise ValueError(f"Task {name} was added already")
+        unknown = [dependency for dependency in after if dependency not in self.tasks]
+        if unknown:
+            raise ValueError(f"Task {name} depends on unknown tasks {unknown}")
+        self.tasks[name] = Task(name, run, tuple(after), resource)
+
+    def _ready(self, task: Task, results: dict[str, Any], busy: Counter[str]) -> bool:
+        if any(dependency not in results for dependency in task.after):
+            return False
+        if task.resource is None or task.resource not in self.limits:
+            return True
+        return busy[task.resource] < self.limits[task.resource]
+
+    @staticmethod
+    def _timed(task: Task, arguments: dict[str, Any]) -> tuple[Any, float]:
+        start = time.perf_counter()
+        with profile_thread():
+            result = task.run(**arguments)
+        return result, time.perf_counter() - start
+
+    def run(self) -> dict[str, Any]:
+        """Runs all tasks and returns their results by name. If a task fails, no further
+        tasks are started and its error is raised once the running tasks are done."""
+        results: dict[str, Any] = {}
+        waiting = list(self.tasks.values())
+        running: dict[Future[tuple[Any, float]], Task] = {}
+        busy: Counter[str] = Counter()
+        error: Exception | None = None
+        start, task_seconds = time.perf_counter(), 0.0
+        with ThreadPoolExecutor(max_workers=max(1, len(self.tasks))) as executor:
+            while waiting or running:
+                for task in [t for t in waiting if error is None]:
+                    if self._ready(task, results, busy):
+                        waiting.remove(task)
+                        busy[task.resource or ""] += 1
+                        arguments = {name: results[name] for name in task.after}
+                        future = executor.submit(
+                            contextvars.copy_context().run, self._timed, task, arguments
+                        )
+                        running[future] = task
+                if not running:
+                    break
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    task = running.pop(future)
+                    busy[task.resource or ""] -= 1
+                    try:
+                        results[task.name], seconds = future.result()
+                        task_seconds += seconds
+                    except Exception as err:  # pylint: disable=broad-exception-caught
+                        log.error(f"Task {task.name} failed: {err}")
+                        error = error or err
+        if error is not None:
+            raise error
+        log.info(
+            f"Ran {len(results)} tasks in {time.perf_counter() - start:.2f}s "
+            f"({task_seconds:.2f}s one after the other)"
+        )
+        return results
@@ -5,11 +5,21 @@ Basic Slack Post functionality. Sends a message thread to a specified channel.
 from slack.web.client import WebClient
 from slack.web.slack_response import SlackResponse
 
+from src.utils.spans import span
+
 
 def post_to_slack(
     slack_client: WebClient, channel: str, message: str, sub_messages: dict[str, str]
 ) -> None:
     """Posts message to Slack channel and sub message inside thread of first message"""
+    with span("slack") as timing:
+        timing.add(1 + len(sub_messages))
+        _post_thread(slack_client, channel, message, sub_messages)
+
+
+def _post_thread(
+    slack_client: WebClient, channel: str, message: str, sub_messages: dict[str, str]
+) -> None:
     response = slack_client.chat_postMessage(
         channel=channel,
         text=message,
@@ -0,0 +1,59 @@
+"""
+Exact parsing of token amounts (wei, atoms) shared by all data fetching paths.
+Amounts are kept as python integers in `object` columns, so that no precision is lost
+to float64 arithmetic.
+"""
+
+from __future__ import annotations
+
+from decimal import Decimal, InvalidOperation
+from numbers import Integral
+from typing import Any
+
+from pandas import Series, isna
+
+
+def parse_exact_amount(value: Any) -> int | Decimal | None:
+    """Converts a raw amount (str, int, Decimal or float) into an exact number.
+
+    Integral values are returned as `int`, non-integral values as `Decimal`.
+    Missing values (None, NaN, empty string) are returned as None.
+    """
+    if not isinstance(value, str) and isna(value):
+        return None
+    if isinstance(value, Integral):
+        return int(value)
+    if isinstance(value, float):
+        # going through str avoids exposing the binary representation of the float
+        value = str(value)
+    if isinstance(value, str):
+        value = value.strip()
+        if value == "":
+            return None
+    try:
+        amount = Decimal(value)
+    except InvalidOperation as err:
+        raise ValueError(f"Invalid amount {value!r}") from err
+    if amount == amount.to_integral_value():
+        return int(amount)
+    return amount
+
+
+def exact_amounts(series: Series, fill_value: int | None = 0) -> Series:
+    """Parses a column of amounts into exact values (`object` dtype).
+
+    Missing values are replaced by `fill_value`.
+    """
+    return series.map(
+        lambda value: (
+            amount if (amount := parse_exact_amount(value)) is not None else fill_value
+        )
+    ).astype(object)
+
+
+def wei_amounts(series: Series) -> Series:
+    """Parses a column of amounts in wei (or atoms) into exact python integers (`object`
+    dtype), e.g. for arithmetic with `Fraction`s. Fractions of a wei are truncated
+    towards zero (as `int`), missing values are replaced by 0.
+    """
+    return exact_amounts(series).map(int).astype(object)
@@ -0,0 +1,167 @@
+"""
+Data frames as Arrow IPC files, e.g. to hand data from one process to another or to store
+the outputs of stages (see `src.utils.stage_cache`).
+
+Files are read memory mapped: the Arrow buffers of a file are not copied into memory but
+paged in on access, and several processes reading the same file share the page cache.
+Numeric columns are converted to pandas without copying where possible.
+
+Exact amounts (python integers and decimals in `object` columns, see `src.utils.amounts`)
+are marked in the field metadata, so that frames are read back with the same values and
+types. Integer amounts (e.g. wei) are stored as `int64` if they fit, else as
+`decimal128(38, 0)`. Both are read from the memory mapped value buffer with vectorized
+conversions to python integers. Amounts of more than 38 digits and decimals are stored as
+strings and parsed per element: strings keep the exponent of decimals, and fractional
+amounts are rare (e.g. numeric columns of the analytics database).
+"""
+
+from __future__ import annotations
+
+import os
+from decimal import Decimal
+from pathlib import Path
+from typing import Any, Callable
+
+import numpy as np
+import pyarrow as pa
+from pandas import DataFrame
+
+from src.utils.amounts import parse_exact_amount
+
+# Field metadata key marking columns of exact amounts, with the python type of their values
+EXACT_TYPE = b"exact_type"
+# Integer amounts of at most this many digits are stored as decimal128
+DECIMAL_PRECISION = 38
+INT64_BOUNDS = (-(2**63), 2**63 - 1)
+
+
+def _exact_type(values: list[Any]) -> str | None:
+    """`int`, `decimal` or `exact` (both) if all values of a column are exact amounts"""
+    types = set()
+    for value in values:
+        if value is None:
+            continue
+        if isinstance(value, int) and not isinstance(value, bool):
+            types.add("int")
+        elif isinstance(value, Decimal):
+            types.add("decimal")
+        else:
+            return None
+    if not types:
+        return None
+    return types.pop() if len(types) == 1 else "exact"
+
+
+def _exact_array(values: list[Any], exact_type: str) -> pa.Array:
+    """Arrow array of a column of exact amounts (see module docstring)"""
+    if exact_type == "int":
+        present = [value for value in values if value is not None]
+        if INT64_BOUNDS[0] <= min(present) and max(present) <= INT64_BOUNDS[1]:
+            return pa.array(values, type=pa.int64())
+        if max(abs(value) for value in present) < 10**DECIMAL_PRECISION:
+            return pa.array(values, type=pa.decimal128(DECIMAL_PRECISION, 0))
+    return pa.array([None if value is None else str(value) for value in values])
+
+
+def _int_values(array: pa.Array) -> np.ndarray:
+    """Python integers (`object` array, None for nulls) of an `int64` or
+    `decimal128(38, 0)` array, converted from its value buffer without parsing"""
+    if len(array) == 0:
+        return np.array([], dtype=object)
+    buffer = array.buffers()[1]
+    if pa.types.is_int64(array.type):
+        values = np.frombuffer(
+            buffer, dtype=np.int64, count=len(array), offset=array.offset * 8
+        ).astype(object)
+    else:
+        # 128 bit two's complement integers: low (unsigned) and high (signed) 64 bits
+        words = np.frombuffer(
+            buffer, dtype=np.uint64, count=2 * len(array), offset=array.offset * 16
+        ).reshape(-1, 2)
+        high = words[:, 1].view(np.int64).astype(object)
+        values = (high << 64) + words[:, 0].astype(object)
+    if array.null_count:
+        values[array.is_null().to_numpy(zero_copy_only=False)] = None
+    return values
+
+
+def frame_to_table(frame: DataFrame) -> pa.Table:
+    """Arrow table of a data frame, with exact amounts stored as marked columns"""
+    frame = frame.reset_index(drop=True)
+    exact_types = {}
+    for column in frame.columns:
+        if frame[column].dtype == object:
+            exact_type = _exact_type(frame[column].tolist())
+            if exact_type is not None:
+                exact_types[column] = exact_type
+    table = pa.Table.from_pandas(
+        frame.drop(columns=list(exact_types)), preserve_index=False
+    )
+    arrays = {name: table.column(name) for name in table.column_names}
+    fields = {table_field.name: table_field for table_field in table.schema}
+    for column, exact_type in exact_types.items():
+        array = _exact_array(frame[column].tolist(), exact_type)
+        arrays[column] = pa.chunked_array([array], type=array.type)
+        fields[column] = pa.field(column, array.type).with_metadata(
+            {EXACT_TYPE: exact_type.encode()}
+        )
+    columns = [str(column) for column in frame.columns]
+    return pa.Table.from_arrays(
+        [arrays[column] for column in columns],
+        schema=pa.schema(
+            [fields[column] for column in columns], metadata=table.schema.metadata
+        ),
+    )
+
+
+def table_to_frame(table: pa.Table) -> DataFrame:
+    """Inverse of `frame_to_table`"""
+    exact_types = {
+        table_field.name: exact_type
+        for table_field in table.schema
+        if (exact_type := (table_field.metadata or {}).get(EXACT_TYPE)) is not None
+    }
+    # without consolidating columns into blocks, numeric columns need not be copied
+    frame = table.drop_columns(list(exact_types)).to_pandas(split_blocks=True)
+    parsers: dict[bytes, Callable[[str], Any]] = {
+        b"int": int,
+        b"decimal": Decimal,
+        b"exact": parse_exact_amount,
+    }
+    for column, exact_type in exact_types.items():
+        chunks = table.column(column).chunks
+        if pa.types.is_string(table.schema.field(column).type):
+            parse = parsers[exact_type]
+            values = np.array(
+                [
+                    None if value is None else parse(value)
+                    for chunk in chunks
+                    for value in chunk.to_pylist()
+                ],
+                dtype=object,
+            )
+        else:
+            values = np.concatenate(
+                [_int_values(chunk) for chunk in chunks] or [np.array([], dtype=object)]
+            )
+        frame.insert(table.column_names.index(column), column, values)
+    return frame
+
+
+def write_ipc(frame: DataFrame, path: Path) -> None:
+    """Writes a data frame as Arrow IPC file. The file is written to a temporary location
+    first, so that readers never observe partial files."""
+    table = frame_to_table(frame)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(path.name + ".tmp")
+    with pa.OSFile(str(tmp_path), "wb") as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    os.replace(tmp_path, path)
+
+
+def read_ipc(path: Path) -> DataFrame:
+    """Reads an Arrow IPC file written by `write_ipc`, memory mapped"""
+    with pa.memory_map(str(path), "r") as source:
+        table = pa.ipc.open_file(source).read_all()
+    return table_to_frame(table)
@@ -0,0 +1,350 @@
+"""
+Record and replay of the HTTP traffic of a run (see `--record-http` and `--replay-http` of
+`src.fetch.transfer_file`).
+
+All external clients send their requests either through `requests` (Dune, CoinPaprika and the
+other price providers, the Safe transaction service, web3 nodes) or, for Slack, through
+`urllib`. While a cassette is in use, both transports are intercepted: when recording, every
+response is stored in the cassette keyed by a fingerprint of its request; when replaying,
+requests are answered from the cassette without any network access.
+
+The fingerprint is a hash of method, url and body. Headers are not part of it (and are not
+stored for requests), so API keys and tokens do not end up in cassettes, and neither do urls
+(nodes often have the API key in their url). JSON-RPC request ids depend on the number of
+earlier requests of a client and are ignored.
+
+On replay, a request recorded several times (e.g. polling the status of a Dune execution) is
+answered with its last response. Requests whose body differs from the recording (e.g. Slack
+messages containing timings) are answered with the responses recorded for the same method and
+url, in order, except for JSON-RPC requests. Requests without any recording raise
+`CassetteMiss`.
+
+Cassettes are gzip compressed json files.
+"""
+
+from __future__ import annotations
+
+import base64
+import gzip
+import hashlib
+import json
+import os
+import threading
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Iterator
+
+import requests
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+from slack.web.base_client import BaseClient as SlackBaseClient
+
+from src.logger import set_log
+
+log = set_log(__name__)
+
+CASSETTE_VERSION = 1
+# Headers describing the transfer of the original response, not its (decoded) content
+TRANSFER_HEADERS = ("content-encoding", "content-length", "transfer-encoding")
+
+
+class CassetteMiss(requests.exceptions.ConnectionError):
+    """No response is recorded for a request"""
+
+
+def _json_body(body: bytes | str | None) -> Any:
+    try:
+        return json.loads(body) if body else None
+    except (ValueError, UnicodeDecodeError):
+        return None
+
+
+def _without_rpc_ids(payload: Any) -> Any:
+    if isinstance(payload, list):
+        return [_without_rpc_ids(item) for item in payload]
+    if isinstance(payload, dict) and "jsonrpc" in payload:
+        return {key: value for key, value in payload.items() if key != "id"}
+    return payload
+
+
+def route(method: str, url: str) -> str:
+    """Hash of method and url of a request"""
+    return hashlib.sha256(f"{method.upper()} {url}".encode()).hexdigest()
+
+
+def _replay_route(method: str, url: str, body: bytes | str | None) -> str:
+    """Route of a request for replay: all calls of a node go to the same url but are not
+    interchangeable, so the route of JSON-RPC requests is their fingerprint"""
+    payload = _json_body(body)
+    if isinstance(payload, list) and payload:
+        payload = payload[0]
+    if isinstance(payload, dict) and "jsonrpc" in payload:
+        return fingerprint(method, url, body)
+    return route(method, url)
+
+
+def fingerprint(method: str, url: str, body: bytes | str | None) -> str:
+    """Hash of method, url and body of a request (ignoring JSON-RPC ids)"""
+    payload = _json_body(body)
+    if payload is not None:
+        content = json.dumps(_without_rpc_ids(payload), sort_keys=True).encode()
+    elif isinstance(body, str):
+        content = body.encode()
+    else:
+        content = body or b""
+    digest = hashlib.sha256(route(method, url).encode())
+    digest.update(content)
+    return digest.hexdigest()
+
+
+def _with_rpc_ids(body: bytes, request_body: bytes | str | None) -> bytes:
+    """Response body of a JSON-RPC request with the ids of the request"""
+    request, response = _json_body(request_body), _json_body(body)
+    if isinstance(request, dict) and isinstance(response, dict) and "id" in request:
+        return json.dumps(response | {"id": request["id"]}).encode()
+    if isinstance(request, list) and isinstance(response, list):
+        # responses of batches are in the order of their requests
+        return json.dumps(
+            [
+                answer | {"id": item["id"]} if isinstance(answer, dict) else answer
+                for item, answer in zip(request, response)
+            ]
+        ).encode()
+    return body
+
+
+@dataclass
+class Interaction:
+    """A recorded response"""
+
+    fingerprint: str
+    route: str
+    status: int
+    headers: dict[str, str]
+    body: bytes
+
+    def to_json(self) -> dict[str, Any]:
+        """Json representation, with the body as text if possible"""
+        try:
+            body, encoding = self.body.decode("utf-8"), "utf-8"
+        except UnicodeDecodeError:
+            body, encoding = base64.b64encode(self.body).decode(), "base64"
+        return {
+            "fingerprint": self.fingerprint,
+            "route": self.route,
+            "status": self.status,
+            "headers": self.headers,
+            "body": body,
+            "encoding": encoding,
+        }
+
+    @staticmethod
+    def from_json(data: dict[str, Any]) -> Interaction:
+        """Inverse of `to_json`"""
+        body = (
+            base64.b64decode(data["body"])
+            if data["encoding"] == "base64"
+            else data["body"].encode("utf-8")
+        )
+        return Interaction(
+            data["fingerprint"], data["route"], data["status"], data["headers"], body
+        )
+
+
+@dataclass
+class Cassette:
+    """Recorded responses of a run, in order of recording. A cassette either records
+    responses or, with `replay`, answers requests."""
+
+    interactions: list[Interaction] = field(default_factory=list)
+    replay: bool = False
+
+    def __post_init__(self) -> None:
+        self.lock = threading.Lock()
+        self.by_fingerprint: dict[str, Interaction] = {}
+        self.by_route: dict[str, list[Interaction]] = {}
+        # number of responses replayed per route
+        self.replayed: dict[str, int] = {}
+        for interaction in self.interactions:
+            self._add(interaction)
+
+    def __getstate__(self) -> dict[str, Any]:
+        # cassettes are sent to worker processes
+        return {"interactions": self.interactions, "replay": self.replay}
+
+    def __setstate__(self, state: dict[str, Any]) -> None:
+        self.interactions = state["interactions"]
+        self.replay = state["replay"]
+        self.__post_init__()
+
+    def _add(self, interaction: Interaction) -> None:
+        # the last response of a request recorded several times is replayed
+        self.by_fingerprint[interaction.fingerprint] = interaction
+        self.by_route.setdefault(interaction.route, []).append(interaction)
+
+    def record(self, interaction: Interaction) -> None:
+        """Adds a response"""
+        with self.lock:
+            self.interactions.append(interaction)
+            self._add(interaction)
+
+    def extend(self, interactions: list[Interaction]) -> None:
+        """Adds responses (e.g. recorded in a worker process)"""
+        for interaction in interactions:
+            self.record(interaction)
+
+    def play(self, request_fingerprint: str, request_route: str) -> Interaction | None:
+        """Recorded response to a request, see module docstring"""
+        with self.lock:
+            if request_fingerprint in self.by_fingerprint:
+                return self.by_fingerprint[request_fingerprint]
+            recorded = self.by_route.get(request_route)
+            if not recorded:
+                return None
+            position = self.replayed.get(request_route, 0)
+            self.replayed[request_route] = position + 1
+            return recorded[min(position, len(recorded) - 1)]
+
+    def save(self, path: Path) -> None:
+        """Writes the cassette as compressed json"""
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(path.name + ".tmp")
+        with gzip.open(tmp_path, "wt", encoding="utf-8") as file:
+            json.dump(
+                {
+                    "version": CASSETTE_VERSION,
+                    "interactions": [i.to_json() for i in self.interactions],
+                },
+                file,
+            )
+        os.replace(tmp_path, path)
+        log.info(f"Recorded {len(self.interactions)} HTTP responses to {path}")
+
+    @staticmethod
+    def load(path: Path) -> Cassette:
+        """Reads a cassette written by `save` for replay"""
+        with gzip.open(path, "rt", encoding="utf-8") as file:
+            data = json.load(file)
+        if data["version"] != CASSETTE_VERSION:
+            raise ValueError(f"Unsupported cassette version {data['version']}")
+        return Cassette(
+            [Interaction.from_json(i) for i in data["interactions"]], replay=True
+        )
+
+
+# the transports which are intercepted: all requests of `requests` sessions and of the
+# (synchronous) Slack client
+SLACK_TRANSPORT = "_perform_urllib_http_request"
+_SEND = HTTPAdapter.send
+_SLACK_REQUEST = getattr(SlackBaseClient, SLACK_TRANSPORT)
+_ACTIVE: Cassette | None = None
+
+
+def replaying() -> bool:
+    """Whether requests are currently answered from a cassette"""
+    return _ACTIVE is not None and _ACTIVE.replay
+
+
+def _send(
+    adapter: HTTPAdapter, request: requests.PreparedRequest, **kwargs: Any
+) -> requests.Response:
+    active = _ACTIVE
+    if active is None:
+        return _SEND(adapter, request, **kwargs)
+    method, url = str(request.method), str(request.url)
+    request_fingerprint = fingerprint(method, url, request.body)
+    if not active.replay:
+        response = _SEND(adapter, request, **kwargs)
+        active.record(
+            Interaction(
+                request_fingerprint,
+                _replay_route(method, url, request.body),
+                response.status_code,
+                {
+                    key: value
+                    for key, value in response.headers.items()
+                    if key.lower() not in TRANSFER_HEADERS
+                },
+                response.content,
+            )
+        )
+        return response
+
+    interaction = active.play(
+        request_fingerprint, _replay_route(method, url, request.body)
+    )
+    if interaction is None:
+        raise CassetteMiss(
+            f"No recorded response for {method} request", request=request
+        )
+    response = requests.Response()
+    response.status_code = interaction.status
+    response.headers = CaseInsensitiveDict(interaction.headers)
+    response._content = _with_rpc_ids(  # pylint: disable=protected-access
+        interaction.body, request.body
+    )
+    response.encoding = requests.utils.get_encoding_from_headers(response.headers)
+    response.url = url
+    response.request = request
+    return response
+
+
+def _slack_request(
+    client: SlackBaseClient, *, url: str, args: dict[str, Any]
+) -> dict[str, Any]:
+    active = _ACTIVE
+    response: dict[str, Any]
+    if active is None:
+        response = _SLACK_REQUEST(client, url=url, args=args)
+        return response
+    body = json.dumps(
+        {key: args.get(key) for key in ("json", "data", "params")},
+        sort_keys=True,
+        default=str,
+    )
+    request_fingerprint = fingerprint("POST", url, body)
+    request_route = route("POST", url)
+    if not active.replay:
+        response = _SLACK_REQUEST(client, url=url, args=args)
+        active.record(
+            Interaction(
+                request_fingerprint,
+                request_route,
+                response["status"],
+                dict(response["headers"]),
+                response["body"].encode("utf-8"),
+            )
+        )
+        return response
+
+    interaction = active.play(request_fingerprint, request_route)
+    if interaction is None:
+        raise CassetteMiss("No recorded response for Slack request")
+    return {
+        "status": interaction.status,
+        "headers": interaction.headers,
+        "body": interaction.body.decode("utf-8"),
+    }
+
+
+@contextmanager
+def use_cassette(cassette: Cassette | None) -> Iterator[None]:
+    """Records the HTTP responses of the block to `cassette` or, if it is a cassette for
+    replay, answers the requests of the block from it. Does nothing without `cassette`.
+    """
+    global _ACTIVE  # pylint: disable=global-statement
+    if cassette is None:
+        yield
+        return
+    if _ACTIVE is not None:
+        raise RuntimeError("A cassette is already in use")
+    _ACTIVE = cassette
+    setattr(HTTPAdapter, "send", _send)
+    setattr(SlackBaseClient, SLACK_TRANSPORT, _slack_request)
+    try:
+        yield
+    finally:
+        setattr(HTTPAdapter, "send", _SEND)
+        setattr(SlackBaseClient, SLACK_TRANSPORT, _SLACK_REQUEST)
+        _ACTIVE = None
@@ -0,0 +1,60 @@
+"""
+Columnar (parquet) storage of data frames, partitioned by directory.
+Partitions are laid out as `<root>/<key>=<value>/.../part.parquet`, so that the whole
+store (or any sub directory) can be read back as one data frame with `read_partitions`.
+"""
+
+from __future__ import annotations
+
+import os
+from decimal import Decimal
+from pathlib import Path
+
+import pandas as pd
+from pandas import DataFrame
+
+
+def partition_dir(root: Path, **partition: str) -> Path:
+    """Directory of the partition with the given key value pairs (in order)"""
+    return root.joinpath(*(f"{key}={value}" for key, value in partition.items()))
+
+
+def write_partition(frame: DataFrame, root: Path, **partition: str) -> Path:
+    """Writes (or replaces) a partition. The file is written to a temporary location
+    first, so that readers never observe partial partitions.
+
+    Exact integer amounts (see `src.utils.amounts`) are stored as decimals, as they do
+    not fit into 64 bit integer columns.
+    """
+    directory = partition_dir(root, **partition)
+    directory.mkdir(parents=True, exist_ok=True)
+    path = directory / "part.parquet"
+    tmp_path = directory / "part.parquet.tmp"
+    frame = frame.copy()
+    for column in frame.columns:
+        if frame[column].dtype == object and frame[column].map(_is_int).any():
+            frame[column] = frame[column].map(
+                lambda value: Decimal(value) if _is_int(value) else value
+            )
+    frame.to_parquet(tmp_path, index=False)
+    os.replace(tmp_path, path)
+    return path
+
+
+def _is_int(value: object) -> bool:
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def read_partitions(root: Path) -> DataFrame:
+    """Reads all partitions below root into one data frame, with one column per
+    partition key"""
+    frames = []
+    for path in sorted(root.rglob("part.parquet")):
+        frame = pd.read_parquet(path)
+        for part in path.parent.relative_to(root).parts:
+            key, value = part.split("=", 1)
+            frame[key] = value
+        frames.append(frame)
+    if not frames:
+        return DataFrame()
+    return pd.concat(frames, ignore_index=True)
@@ -1,7 +1,9 @@
 """
 Simple wrapper for print statements that saves all the messages chronologically in a list
+Messages are emitted through logging (see `src.logger`), so printing does not block.
 """
 
+import logging
 from collections import defaultdict
 from enum import Enum
 
@@ -16,6 +18,7 @@ class Category(Enum):
     ETH_REDIRECT = "ETH Redirects (Positive Slippage)"
     SLIPPAGE = "Negative Slippage"
     EXECUTION = "Execution Details"
+    TIMING = "Timing"
 
 
 class PrintStore:
@@ -23,11 +26,12 @@ class PrintStore:
 
     def __init__(self) -> None:
         self.store: dict[Category, list[str]] = defaultdict(list)
+        self.log = logging.getLogger(__name__)
 
     def print(self, message: str, category: Category) -> None:
         """Add message to store and print"""
         self.store[category].append(message)
-        print(message)
+        self.log.info(message)
 
     def get_value(self, category: Category) -> str:
         """Returns the print history"""
@@ -36,3 +40,15 @@ class PrintStore:
     def get_values(self) -> dict[str, str]:
         """Returns partitioned dictionary of values per category"""
         return {category.value: self.get_value(category) for category in self.store}
+
+    def sizes(self) -> dict[Category, int]:
+        """Number of messages per category, see `messages_since`"""
+        return {category: len(messages) for category, messages in self.store.items()}
+
+    def messages_since(self, sizes: dict[Category, int]) -> list[tuple[Category, str]]:
+        """Messages added since `sizes` was taken, per category in order"""
+        return [
+            (category, message)
+            for category, messages in self.store.items()
+            for message in messages[sizes.get(category, 0) :]
+        ]
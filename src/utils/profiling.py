@@ -0,0 +1,249 @@
+"""
+Optional profiling of the stages of a run (see `--profile` of `src.fetch.transfer_file`).
+
+With CPU profiling, each stage runs under `cProfile`. Work of the stage in other threads
+is profiled with `profile_thread` (e.g. the tasks of `src.scheduler`) and merged into the
+statistics of the stage. They are written as pstats file (e.g. for `snakeviz` or
+`python -m pstats`) and as collapsed stacks (e.g. for `flamegraph.pl` or speedscope).
+Collapsed stacks are derived from the call graph of the deterministic profiler: the own
+time of a function is attributed to its callers in proportion to the time spent in it per
+caller, as the profiler does not record full stacks.
+
+With memory profiling, `tracemalloc` snapshots are taken before and after each stage and the
+top allocation sites (and the peak of traced memory) are written as text.
+
+Profiling is configured per process with `configure_profiling`; `profile_stage` does nothing
+if profiling is not configured.
+"""
+
+from __future__ import annotations
+
+import contextvars
+import cProfile
+import os
+import pstats
+import threading
+import tracemalloc
+from contextlib import contextmanager
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Iterator
+
+from src.logger import current_log_context, set_log
+
+log = set_log(__name__)
+
+PROFILE_MODES = ("cpu", "mem", "both")
+# Number of allocation sites in memory reports
+TOP_ALLOCATIONS = 25
+# Functions with less own time (in seconds) are left out of collapsed stacks
+MIN_STACK_TIME = 1e-6
+MAX_STACK_DEPTH = 128
+# Stacks leading to a function with a smaller share of its time are merged into one
+# truncated stack (`...;<function>`), which bounds the number of stacks per function
+MIN_STACK_FRACTION = 1e-3
+
+
+@dataclass(frozen=True)
+class ProfileConfig:
+    """Profiling mode and output directory of a process"""
+
+    mode: str
+    output_dir: Path
+
+    @property
+    def cpu(self) -> bool:
+        """Whether stages are profiled with `cProfile`"""
+        return self.mode in ("cpu", "both")
+
+    @property
+    def mem(self) -> bool:
+        """Whether stages are profiled with `tracemalloc`"""
+        return self.mode in ("mem", "both")
+
+
+_CONFIG: ProfileConfig | None = None
+# thread of the CPU profiled stage and the profilers of its work in other threads
+_THREAD_PROFILERS: contextvars.ContextVar[tuple[int, list[cProfile.Profile]] | None] = (
+    contextvars.ContextVar("thread_profilers", default=None)
+)
+
+
+def configure_profiling(mode: str | None, output_dir: Path) -> None:
+    """Enables (or, without `mode`, disables) profiling of stages in this process"""
+    global _CONFIG  # pylint: disable=global-statement
+    if mode is not None and mode not in PROFILE_MODES:
+        raise ValueError(
+            f"Unknown profile mode {mode}, expected one of {PROFILE_MODES}"
+        )
+    _CONFIG = ProfileConfig(mode, output_dir) if mode else None
+
+
+def _profile_path(stage: str, suffix: str) -> Path:
+    """File of a stage, named after the period and network of the log context"""
+    assert _CONFIG is not None
+    context = current_log_context()
+    parts = [context.get("period"), context.get("network"), stage]
+    name = "-".join(part for part in parts if part)
+    return _CONFIG.output_dir / "profile" / f"{name}{suffix}"
+
+
+def _write(path: Path, text: str) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(path.name + ".tmp")
+    tmp_path.write_text(text, encoding="utf-8")
+    os.replace(tmp_path, path)
+
+
+@contextmanager
+def profile_stage(stage: str) -> Iterator[None]:
+    """Profiles the block as `stage` if profiling is configured"""
+    config = _CONFIG
+    if config is None:
+        yield
+        return
+
+    profiler = cProfile.Profile() if config.cpu else None
+    started_tracing = config.mem and not tracemalloc.is_tracing()
+    if started_tracing:
+        tracemalloc.start()
+    if config.mem:
+        tracemalloc.reset_peak()
+    before = tracemalloc.take_snapshot() if config.mem else None
+    thread_profilers: list[cProfile.Profile] = []
+    token = _THREAD_PROFILERS.set(
+        (threading.get_ident(), thread_profilers) if profiler is not None else None
+    )
+    if profiler is not None:
+        profiler.enable()
+    try:
+        yield
+    finally:
+        _THREAD_PROFILERS.reset(token)
+        if profiler is not None:
+            profiler.disable()
+            write_cpu_profile(profiler, stage, thread_profilers)
+        if before is not None:
+            write_memory_report(before, tracemalloc.take_snapshot(), stage)
+        if started_tracing:
+            tracemalloc.stop()
+
+
+@contextmanager
+def profile_thread() -> Iterator[None]:
+    """Profiles the block as part of the CPU profile of the current stage, if the block
+    runs in another thread than the stage (in a copy of the context of the stage)"""
+    state = _THREAD_PROFILERS.get()
+    if state is None or state[0] == threading.get_ident():
+        yield
+        return
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError:
+        # since python 3.12, `cProfile` is based on `sys.monitoring`: only one profiler
+        # can be enabled, and the profiler of the stage receives the events of all threads
+        yield
+        return
+    try:
+        yield
+    finally:
+        profiler.disable()
+        state[1].append(profiler)
+
+
+def write_cpu_profile(
+    profiler: cProfile.Profile,
+    stage: str,
+    thread_profilers: list[cProfile.Profile] | None = None,
+) -> None:
+    """Writes pstats and collapsed stacks of a stage, merged with the profiles of its
+    work in other threads"""
+    stats = pstats.Stats(profiler)
+    if thread_profilers:
+        stats.add(*thread_profilers)
+    stats_path = _profile_path(stage, ".pstats")
+    stats_path.parent.mkdir(parents=True, exist_ok=True)
+    stats.dump_stats(stats_path)
+    stacks = collapsed_stacks(stats)
+    _write(
+        _profile_path(stage, ".collapsed"),
+        "".join(
+            f"{stack} {round(seconds * 1e6)}\n"
+            for stack, seconds in sorted(stacks.items())
+            if round(seconds * 1e6) > 0
+        ),
+    )
+    log.info(f"CPU profile of stage {stage} written to {stats_path}")
+
+
+def write_memory_report(
+    before: tracemalloc.Snapshot, after: tracemalloc.Snapshot, stage: str
+) -> None:
+    """Writes the top allocation sites of a stage"""
+    _, peak = tracemalloc.get_traced_memory()
+    differences = after.compare_to(before, "lineno")
+    lines = [f"Peak traced memory: {peak / 2**20:.1f} MiB", ""]
+    lines += [str(difference) for difference in differences[:TOP_ALLOCATIONS]]
+    path = _profile_path(stage, "-mem.txt")
+    _write(path, "\n".join(lines) + "\n")
+    log.info(f"Memory profile of stage {stage} written to {path}")
+
+
+def _label(function: tuple[str, int, str]) -> str:
+    filename, line, name = function
+    if filename == "~":
+        # built-in functions, e.g. `<built-in method time.sleep>`
+        return name
+    return f"{name} ({os.path.basename(filename)}:{line})"
+
+
+def collapsed_stacks(stats: pstats.Stats) -> dict[str, float]:
+    """Approximate collapsed stacks (root first, `;` separated) with their own time in
+    seconds, from the call graph of a deterministic profile"""
+    # {function: (primitive calls, calls, own time, cumulative time, callers)}
+    raw: dict[Any, Any] = stats.stats  # type: ignore[attr-defined]
+    # stacks leading to a function (root first) with the fraction of its time spent in
+    # each, for functions whose stacks do not depend on the path they were reached by
+    memo: dict[Any, dict[str, float]] = {}
+
+    def caller_stacks(function: Any, path: list[Any]) -> tuple[dict[str, float], bool]:
+        """Stacks leading to `function`, reached from its callees `path`, and whether
+        they are independent of the path (no caller was left out to break a cycle and
+        the depth limit was not reached)"""
+        if function in memo:
+            return memo[function], True
+        callers = {
+            caller: timing[3]
+            for caller, timing in raw[function][4].items()
+            if caller in raw and caller not in path
+        }
+        independent = len(callers) == len(
+            [caller for caller in raw[function][4] if caller in raw]
+        )
+        total = sum(callers.values())
+        if not callers or total <= 0 or len(path) >= MAX_STACK_DEPTH:
+            return {_label(function): 1.0}, independent and len(path) < MAX_STACK_DEPTH
+        stacks: dict[str, float] = {}
+        for caller, cumulative in callers.items():
+            above, caller_independent = caller_stacks(caller, path + [function])
+            independent = independent and caller_independent
+            for stack, fraction in above.items():
+                key = f"{stack};{_label(function)}"
+                stacks[key] = stacks.get(key, 0.0) + fraction * cumulative / total
+        truncated = sum(f for f in stacks.values() if f < MIN_STACK_FRACTION)
+        if truncated > 0:
+            stacks = {k: f for k, f in stacks.items() if f >= MIN_STACK_FRACTION}
+            key = f"...;{_label(function)}"
+            stacks[key] = stacks.get(key, 0.0) + truncated
+        if independent:
+            memo[function] = stacks
+        return stacks, independent
+
+    stacks: dict[str, float] = {}
+    for function, (_, _, own_time, _, _) in raw.items():
+        if own_time < MIN_STACK_TIME:
+            continue
+        for stack, fraction in caller_stacks(function, [])[0].items():
+            stacks[stack] = stacks.get(stack, 0.0) + fraction * own_time
+    return stacks
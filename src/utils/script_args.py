@@ -1,18 +1,51 @@
 """Common method for initializing setup for scripts"""
 
 import argparse
+import os
 from datetime import date, timedelta
 from dataclasses import dataclass
 
+from src.config import Network, check_network_env, load_env
+from src.utils.profiling import PROFILE_MODES
+
 
 @dataclass
 class ScriptArgs:
     """A collection of common script arguments relevant to this project"""
 
+    # pylint: disable=too-many-instance-attributes
+
     start: str
+    networks: list[Network]
     post_tx: bool
     dry_run: bool
     send_to_slack: bool
+    consolidate_cow: bool
+    profile: str | None = None
+    record_http: str | None = None
+    replay_http: str | None = None
+    fresh: bool = False
+
+
+def add_start_argument(parser: argparse.ArgumentParser) -> None:
+    """Adds the `--start` argument for the accounting period start"""
+    parser.add_argument(
+        "--start",
+        type=str,
+        help="Accounting Period Start. Defaults to previous Tuesday",
+        default=str(date.today() - timedelta(days=7)),
+    )
+
+
+def add_networks_argument(parser: argparse.ArgumentParser, help_text: str) -> None:
+    """Adds the `--networks` argument, defaulting to all networks"""
+    parser.add_argument(
+        "--networks",
+        nargs="+",
+        choices=[network.value for network in Network],
+        default=[network.value for network in Network],
+        help=help_text,
+    )
 
 
 def generic_script_init(description: str) -> ScriptArgs:
@@ -21,12 +54,16 @@ def generic_script_init(description: str) -> ScriptArgs:
     2. establishes dune connection
     and returns this info
     """
+    load_env()
     parser = argparse.ArgumentParser(description)
+    add_start_argument(parser)
     parser.add_argument(
-        "--start",
-        type=str,
-        help="Accounting Period Start. Defaults to previous Tuesday",
-        default=str(date.today() - timedelta(days=7)),
+        "--networks",
+        nargs="+",
+        choices=[network.value for network in Network] + ["all"],
+        default=[os.environ["NETWORK"]] if os.environ.get("NETWORK") else None,
+        help="Networks to do the accounting for (concurrently), `all` for all networks. "
+        "Defaults to env var `NETWORK`",
     )
     parser.add_argument(
         "--post-tx",
@@ -44,10 +81,60 @@ def generic_script_init(description: str) -> ScriptArgs:
         action="store_true",
         help="Flag indicating whether or not the script should send the results to a slack channel",
     )
+    parser.add_argument(
+        "--consolidate-cow",
+        action="store_true",
+        help="Flag indicating whether the COW transfers of all networks should be merged "
+        "by recipient and proposed in one (or few) mainnet transactions",
+    )
+    parser.add_argument(
+        "--profile",
+        nargs="?",
+        const="cpu",
+        choices=PROFILE_MODES,
+        default=None,
+        help="Profile the fetch, compute and encode stages (CPU with cProfile, memory "
+        "with tracemalloc or both). Profiles are written to the output directory",
+    )
+    parser.add_argument(
+        "--fresh",
+        action="store_true",
+        help="Run all stages instead of reusing the checkpoints of stages with unchanged "
+        "inputs (see `src.fetch.stages`)",
+    )
+    cassette = parser.add_mutually_exclusive_group()
+    cassette.add_argument(
+        "--record-http",
+        metavar="CASSETTE",
+        help="Record all HTTP responses of the run to a cassette file "
+        "(see `src.utils.cassette`)",
+    )
+    cassette.add_argument(
+        "--replay-http",
+        metavar="CASSETTE",
+        help="Answer all HTTP requests of the run from a recorded cassette file, "
+        "without network access (except to the analytics database)",
+    )
     args = parser.parse_args()
+    if args.networks is None:
+        parser.error("--networks is required if env var `NETWORK` is not set")
+    if "all" in args.networks:
+        networks = list(Network)
+    else:
+        networks = list(dict.fromkeys(Network(network) for network in args.networks))
+    try:
+        check_network_env(networks)
+    except ValueError as err:
+        parser.error(str(err))
     return ScriptArgs(
         start=args.start,
+        networks=networks,
         post_tx=args.post_tx,
         dry_run=args.dry_run,
         send_to_slack=args.send_to_slack,
+        consolidate_cow=args.consolidate_cow,
+        profile=args.profile,
+        record_http=args.record_http,
+        replay_http=args.replay_http,
+        fresh=args.fresh,
     )
@@ -0,0 +1,191 @@
+"""
+Lightweight timing spans around the stages of a run.
+
+A span records wall and CPU time of a block together with optional row and byte counts.
+Spans are labelled with the current log context (e.g. network) and collected per process
+in `recorder`. At the end of a run they are written as a json report and as an
+OpenMetrics text file (e.g. for the textfile collector of the Prometheus node exporter),
+and summarized for Slack.
+
+CPU time is the CPU time of the process (see `time.process_time`), so it includes other
+threads running concurrently with the span.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Callable, Iterator
+
+from src.logger import current_log_context
+
+METRIC_PREFIX = "solver_rewards_stage"
+# Fields of the log context which are used as labels of spans
+LABEL_FIELDS = ("network", "stage")
+
+
+@dataclass
+class Span:  # pylint: disable=too-many-instance-attributes
+    """Timing of one stage"""
+
+    name: str
+    labels: dict[str, str]
+    started_at: str
+    wall_seconds: float = 0.0
+    cpu_seconds: float = 0.0
+    rows: int | None = None
+    bytes: int | None = None
+    error: str | None = None
+
+    def add(self, rows: int | None = None, size: int | None = None) -> None:
+        """Adds to the row and byte counts of the span"""
+        if rows is not None:
+            self.rows = (self.rows or 0) + rows
+        if size is not None:
+            self.bytes = (self.bytes or 0) + size
+
+
+class SpanRecorder:
+    """Spans of a process, in order of completion"""
+
+    def __init__(self) -> None:
+        self.spans: list[Span] = []
+        self.lock = threading.Lock()
+
+    def record(self, finished: Span) -> None:
+        """Adds a finished span"""
+        with self.lock:
+            self.spans.append(finished)
+
+    def extend(self, spans: list[Span]) -> None:
+        """Adds spans recorded in another process"""
+        with self.lock:
+            self.spans.extend(spans)
+
+    def snapshot(self) -> list[Span]:
+        """Copy of the recorded spans"""
+        with self.lock:
+            return list(self.spans)
+
+
+recorder = SpanRecorder()
+
+
+@contextmanager
+def span(name: str, **labels: str) -> Iterator[Span]:
+    """Records the wall and CPU time of the block as a span named `name`.
+    Row and byte counts can be added to the yielded span."""
+    context = current_log_context()
+    current = Span(
+        name=name,
+        labels={key: context[key] for key in LABEL_FIELDS if key in context} | labels,
+        started_at=datetime.now(timezone.utc).isoformat(timespec="milliseconds"),
+    )
+    wall_start, cpu_start = time.perf_counter(), time.process_time()
+    try:
+        yield current
+    except BaseException as err:
+        current.error = type(err).__name__
+        raise
+    finally:
+        current.wall_seconds = time.perf_counter() - wall_start
+        current.cpu_seconds = time.process_time() - cpu_start
+        recorder.record(current)
+
+
+def _write_atomic(path: Path, text: str) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(path.name + ".tmp")
+    tmp_path.write_text(text, encoding="utf-8")
+    os.replace(tmp_path, path)
+
+
+def write_json_report(spans: list[Span], path: Path, **run: str) -> None:
+    """Writes the spans of a run, together with information on the run (e.g. the period)"""
+    report = {"run": run, "spans": [asdict(finished) for finished in spans]}
+    _write_atomic(path, json.dumps(report, indent=2))
+
+
+SpanKey = tuple[str, tuple[tuple[str, str], ...]]
+
+
+def _key(finished: Span) -> SpanKey:
+    return finished.name, tuple(sorted(finished.labels.items()))
+
+
+def _aggregate(spans: list[Span]) -> dict[SpanKey, tuple[Span, int]]:
+    """Spans summed up per name and labels (with their number), in order of first
+    completion"""
+    totals: dict[SpanKey, tuple[Span, int]] = {}
+    for finished in spans:
+        total, count = totals.get(
+            _key(finished),
+            (Span(finished.name, finished.labels, finished.started_at), 0),
+        )
+        total.wall_seconds += finished.wall_seconds
+        total.cpu_seconds += finished.cpu_seconds
+        total.add(finished.rows, finished.bytes)
+        totals[_key(finished)] = (total, count + 1)
+    return totals
+
+
+def _labels(key: SpanKey) -> str:
+    def escape(value: str) -> str:
+        return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+    return ",".join(
+        f'{label}="{escape(value)}"' for label, value in (("name", key[0]),) + key[1]
+    )
+
+
+METRICS: list[tuple[str, str, Callable[[Span, int], float | int | None]]] = [
+    ("wall_seconds", "Wall time of the stage", lambda s, _: s.wall_seconds),
+    (
+        "cpu_seconds",
+        "CPU time of the process during the stage",
+        lambda s, _: s.cpu_seconds,
+    ),
+    ("rows", "Rows processed by the stage", lambda s, _: s.rows),
+    ("bytes", "Bytes processed by the stage", lambda s, _: s.bytes),
+    ("runs", "Number of times the stage ran", lambda _, count: count),
+]
+
+
+def openmetrics_text(spans: list[Span]) -> str:
+    """Spans (summed up per name and labels) in the OpenMetrics text format"""
+    totals = _aggregate(spans)
+    lines = []
+    for metric, help_text, value in METRICS:
+        name = f"{METRIC_PREFIX}_{metric}"
+        lines += [f"# TYPE {name} gauge", f"# HELP {name} {help_text}"]
+        for key, (total, count) in totals.items():
+            if value(total, count) is not None:
+                lines.append(f"{name}{{{_labels(key)}}} {value(total, count)}")
+    return "\n".join(lines + ["# EOF", ""])
+
+
+def write_openmetrics(spans: list[Span], path: Path) -> None:
+    """Writes the spans as OpenMetrics text file"""
+    _write_atomic(path, openmetrics_text(spans))
+
+
+def timing_summary(spans: list[Span]) -> str:
+    """Short summary of the spans (summed up per name and labels), e.g. for Slack"""
+    lines = []
+    for total, count in _aggregate(spans).values():
+        network = total.labels.get("network")
+        line = total.name + (f" [{network}]" if network else "")
+        line += f" (x{count}): " if count > 1 else ": "
+        line += f"{total.wall_seconds:.1f}s wall, {total.cpu_seconds:.1f}s cpu"
+        if total.rows is not None:
+            line += f", {total.rows} rows"
+        if total.bytes is not None:
+            line += f", {total.bytes / 2**20:.1f} MiB"
+        lines.append(line)
+    return "\n".join(lines)
@@ -0,0 +1,151 @@
+"""
+Content addressed checkpoints of the stages of a run (see `src.fetch.transfer_file`).
+
+A stage is identified by its name and a digest of its inputs (configuration, the digests of
+the outputs of upstream stages and the source of the modules implementing it). Its outputs
+are data frames, stored as Arrow IPC files in `<directory>/<stage>-<input digest>/` together
+with a `meta.json` file containing the digest of the outputs. A rerun with the same inputs
+reads the outputs instead of running the stage again. As downstream stages depend on the
+digest of the outputs (not of the inputs) of upstream stages, a stage which is run again but
+produces the same outputs does not invalidate later stages.
+
+Checkpoints are read memory mapped (see `src.utils.arrow_ipc`), so reloading them on a
+rerun is almost instant.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import shutil
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from pathlib import Path
+from types import ModuleType
+from typing import Any, Callable
+
+from pandas import DataFrame
+
+from src.logger import set_log
+from src.utils.arrow_ipc import read_ipc, write_ipc
+from src.utils.spans import span
+
+log = set_log(__name__)
+
+# Bumped when the layout of checkpoints changes, invalidating all existing checkpoints
+CHECKPOINT_VERSION = 1
+META_FILE = "meta.json"
+
+
+def digest(*inputs: Any) -> str:
+    """Digest of json serializable inputs (other values are serialized by `str`)"""
+    data = json.dumps(inputs, sort_keys=True, default=str).encode()
+    return hashlib.sha256(data).hexdigest()
+
+
+def source_digest(*modules: ModuleType) -> str:
+    """Digest of the source files of modules, so that checkpoints of a stage are
+    invalidated when its implementation changes"""
+    sha = hashlib.sha256()
+    for module in modules:
+        assert module.__file__ is not None
+        sha.update(Path(module.__file__).read_bytes())
+    return sha.hexdigest()
+
+
+@dataclass
+class Checkpoint:
+    """Outputs of a stage"""
+
+    stage: str
+    key: str
+    # digest of the output files, the input of downstream stages
+    digest: str
+    frames: dict[str, DataFrame]
+    metadata: dict[str, str] = field(default_factory=dict)
+
+
+class StageCache:
+    """Checkpoints of stages in a local directory. With `fresh`, all stages are run
+    (and their checkpoints replaced)."""
+
+    def __init__(self, directory: Path, fresh: bool = False):
+        self.directory = directory
+        self.fresh = fresh
+
+    def _path(self, stage: str, key: str) -> Path:
+        return self.directory / f"{stage}-{key[:16]}"
+
+    @staticmethod
+    def key(stage: str, inputs: dict[str, Any]) -> str:
+        """Digest of the inputs of a stage"""
+        return digest(CHECKPOINT_VERSION, stage, inputs)
+
+    def load(self, stage: str, key: str) -> Checkpoint | None:
+        """Stored outputs of a stage, None if there is no (complete) checkpoint"""
+        path = self._path(stage, key)
+        meta_path = path / META_FILE
+        if not meta_path.exists():
+            return None
+        meta = json.loads(meta_path.read_text(encoding="utf-8"))
+        if meta["key"] != key:
+            return None
+        frames = {}
+        for name in meta["frames"]:
+            frames[name] = read_ipc(path / f"{name}.arrow")
+        return Checkpoint(stage, key, meta["digest"], frames, meta["metadata"])
+
+    def save(
+        self,
+        stage: str,
+        key: str,
+        frames: dict[str, DataFrame],
+        metadata: dict[str, str] | None = None,
+    ) -> Checkpoint:
+        """Stores the outputs of a stage. The checkpoint is written to a temporary
+        directory first, so that readers never observe partial checkpoints."""
+        path = self._path(stage, key)
+        tmp_path = path.with_name(f"{path.name}.tmp-{os.getpid()}")
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        tmp_path.mkdir(parents=True)
+        sha = hashlib.sha256()
+        for name, frame in sorted(frames.items()):
+            write_ipc(frame, tmp_path / f"{name}.arrow")
+            sha.update(name.encode())
+            sha.update((tmp_path / f"{name}.arrow").read_bytes())
+        checkpoint = Checkpoint(stage, key, sha.hexdigest(), frames, metadata or {})
+        meta = {
+            "stage": stage,
+            "key": key,
+            "digest": checkpoint.digest,
+            "frames": sorted(frames),
+            "metadata": checkpoint.metadata,
+            "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        }
+        (tmp_path / META_FILE).write_text(json.dumps(meta, indent=2), encoding="utf-8")
+        shutil.rmtree(path, ignore_errors=True)
+        os.replace(tmp_path, path)
+        return checkpoint
+
+    def run(
+        self,
+        stage: str,
+        inputs: dict[str, Any],
+        compute: Callable[[], tuple[dict[str, DataFrame], dict[str, str]]],
+    ) -> tuple[Checkpoint, bool]:
+        """Outputs of a stage, read from its checkpoint if there is one for `inputs` and
+        computed (and stored) with `compute` otherwise. Returns the outputs and whether
+        they were read from a checkpoint."""
+        key = self.key(stage, inputs)
+        if not self.fresh:
+            with span("checkpoint_load", checkpoint=stage) as timing:
+                checkpoint = self.load(stage, key)
+                if checkpoint is not None:
+                    timing.add(sum(len(f) for f in checkpoint.frames.values()))
+            if checkpoint is not None:
+                log.info(f"Stage {stage} is up to date, using checkpoint {key[:16]}")
+                return checkpoint, True
+        frames, metadata = compute()
+        with span("checkpoint_save", checkpoint=stage):
+            return self.save(stage, key, frames, metadata), False
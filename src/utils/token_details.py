@@ -7,7 +7,7 @@ import functools
 from dune_client.types import Address
 from web3 import Web3
 
-from src.abis.load import erc20
+from src.abis.load import IndexedContract, abi_function
 from src.logger import set_log
 
 log = set_log(__name__)
@@ -22,7 +22,8 @@ def get_token_decimals(web3: Web3, address: str | Address) -> int:
         checksum_address = web3.to_checksum_address(address.address)
     else:
         checksum_address = web3.to_checksum_address(address)
-    token = erc20(web3, checksum_address)
     # This "trick" is because of the unknown type returned from the contract call.
-    token_decimals: int = token.functions.decimals().call()
+    token_decimals: int = abi_function(IndexedContract.ERC20, "decimals").call(
+        web3, checksum_address
+    )
     return token_decimals
@@ -0,0 +1,264 @@
+"""
+End-to-end benchmark of `src.fetch.transfer_file` without any external service.
+
+The analytics database is a local Postgres (e.g. the one of `Dockerfile.db`, see
+`make bench-db`), seeded with synthetic data (see `tests.bench.synthetic`). Dune, CoinPaprika,
+the Safe transaction service, Slack and the nodes are local stand-ins with injected latency
+(see `tests.bench.stand_ins`). The whole run, including posting the payout transactions and
+the Slack thread, is timed and the latency per stage (see `src.utils.spans`) is reported.
+
+    make bench-db
+    python -m tests.bench.e2e --networks mainnet gnosis --latency 0.05 --latency dune=2
+
+Latency is given in seconds per request, for all stand-ins or per stand-in (`SERVICE=SECONDS`).
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import tempfile
+from pathlib import Path
+
+from pandas import DataFrame
+from sqlalchemy import LargeBinary, Numeric, create_engine, text
+
+from src.config import Network, OrderbookConfig, PaymentConfig
+from src.fetch.prices import TokenId
+from src.fetch.transfer_file import run_accounting
+from src.logger import start_logging
+from src.models.accounting_period import AccountingPeriod
+from src.queries import QUERIES
+from src.utils.script_args import ScriptArgs, add_networks_argument
+from src.utils.spans import recorder, span, timing_summary, write_json_report
+from tests.bench.stand_ins import (
+    CoinPaprikaStandIn,
+    DuneStandIn,
+    NodeStandIn,
+    SafeStandIn,
+    SlackStandIn,
+    StandIn,
+)
+from tests.bench.synthetic import (
+    data_per_solver_frame,
+    partner_and_protocol_fees_frame,
+)
+
+SERVICES = ("dune", "coinpaprika", "safe", "slack", "node")
+# analytics database of `make bench-db`
+DEFAULT_DB_URL = "postgres:postgres@localhost:5432"
+SAFE_ADDRESS = "0xA03be496e67Ec29bC62F01a428683D7F9c204930"
+# a throwaway key, the Safe stand-in does not check signatures
+PROPOSER_KEY = "0x" + "01" * 32
+# usd prices of the CoinPaprika stand-in
+USD_PRICES = {TokenId.ETH: 2000.0, TokenId.COW: 0.2} | {
+    token: 1.0 for token in TokenId if token not in (TokenId.ETH, TokenId.COW)
+}
+# every this many solvers (and partners) is in the staging instead of the prod database
+STAGING_EVERY = 10
+HEX_COLUMNS = ("solver", "pool_address", "reward_target", "partner_fee_recipient")
+
+
+def parse_latency(values: list[str]) -> dict[str, float]:
+    """Latency per stand-in from `SECONDS` (all stand-ins) and `SERVICE=SECONDS` values"""
+    latency = dict.fromkeys(SERVICES, 0.0)
+    for value in values:
+        service, _, seconds = value.rpartition("=")
+        if service and service not in SERVICES:
+            raise ValueError(f"Unknown service {service}, expected one of {SERVICES}")
+        for name in [service] if service else SERVICES:
+            latency[name] = float(seconds)
+    return latency
+
+
+def db_table(frame: DataFrame) -> tuple[DataFrame, dict[str, object]]:
+    """Synthetic data as stored in the analytics database (addresses as bytea, amounts as
+    numeric) and the column types to store it with"""
+    frame = frame.copy()
+    dtype: dict[str, object] = {}
+    for column in frame.columns:
+        if column in HEX_COLUMNS:
+            frame[column] = [
+                bytes.fromhex(value[2:]) if value else None for value in frame[column]
+            ]
+            dtype[column] = LargeBinary()
+        elif frame[column].dtype == object and not isinstance(frame[column][0], str):
+            dtype[column] = Numeric()
+    return frame, dtype
+
+
+def seed_analytics_db(
+    db_url: str, network: Network, period: AccountingPeriod, rows: int, seed: int
+) -> None:
+    """Creates (or replaces) the analytics tables of a network in the prod and staging
+    databases, with `rows` synthetic solvers and partners in total"""
+    # pylint: disable=too-many-locals
+    config = OrderbookConfig.from_network(network)
+    tables = {
+        "fct_data_per_solver_and_accounting_period": data_per_solver_frame(
+            rows, period, seed
+        ),
+        "fct_partner_and_protocol_fees": partner_and_protocol_fees_frame(
+            rows, period, seed
+        ),
+    }
+    admin = create_engine(
+        f"postgresql+psycopg2://{db_url}/postgres", isolation_level="AUTOCOMMIT"
+    )
+    for environment in ("prod", "staging"):
+        database = f"{environment}_{config.network_db_name}"
+        with admin.connect() as conn:
+            exists = conn.execute(
+                text("SELECT 1 FROM pg_database WHERE datname = :name"),
+                {"name": database},
+            ).scalar()
+            if not exists:
+                conn.execute(text(f'CREATE DATABASE "{database}"'))
+        engine = create_engine(f"postgresql+psycopg2://{db_url}/{database}")
+        with engine.begin() as conn:
+            conn.execute(text(f"CREATE SCHEMA IF NOT EXISTS {config.schema}"))
+            for table, frame in tables.items():
+                staging = frame.index % STAGING_EVERY == 0
+                part = frame[staging if environment == "staging" else ~staging]
+                values, dtype = db_table(part.reset_index(drop=True))
+                values.to_sql(
+                    table,
+                    conn,
+                    schema=config.schema,
+                    if_exists="replace",
+                    index=False,
+                    dtype=dtype,  # type: ignore[arg-type]
+                )
+        engine.dispose()
+    admin.dispose()
+
+
+def start_stand_ins(latency: dict[str, float]) -> dict[str, StandIn]:
+    """Starts the stand-ins of all external services"""
+    block_interval = QUERIES["PERIOD_BLOCK_INTERVAL"].query.query_id
+    return {
+        "dune": DuneStandIn(
+            {block_interval: lambda: [{"start_block": 1, "end_block": 2}]},
+            latency["dune"],
+        ).start(),
+        "coinpaprika": CoinPaprikaStandIn(
+            {token.value: price for token, price in USD_PRICES.items()},
+            latency["coinpaprika"],
+        ).start(),
+        "safe": SafeStandIn(latency["safe"]).start(),
+        "slack": SlackStandIn(latency["slack"]).start(),
+        "node": NodeStandIn(latency["node"]).start(),
+    }
+
+
+def configure_environment(
+    stand_ins: dict[str, StandIn],
+    networks: list[Network],
+    db_url: str,
+    output_dir: Path,
+) -> None:
+    """Points the configuration (see `src.config`) at the stand-ins and the outputs of the
+    run (transfer files, checkpoints and the price cache) at `output_dir`, taking
+    precedence over a `.env` file"""
+    os.environ.update(
+        {
+            "FILE_OUT_PATH": str(output_dir),
+            "ANALYTICS_DB_URL": db_url,
+            "DUNE_API_KEY": "bench",
+            "DUNE_API_BASE_URL": stand_ins["dune"].url,
+            "PRICE_PROVIDERS": "coinpaprika",
+            "COINPAPRIKA_API_URL": f"{stand_ins['coinpaprika'].url}/v1",
+            "PRICE_CACHE_FILE": str(output_dir / "prices.sqlite"),
+            "PRICE_CACHE_ONLY": "",
+            "SAFE_TRANSACTION_SERVICE_URL": stand_ins["safe"].url,
+            "SAFE_API_KEY": "bench",
+            "PAYOUTS_SAFE_ADDRESS": SAFE_ADDRESS,
+            "PAYOUTS_SAFE_ADDRESS_MAINNET": SAFE_ADDRESS,
+            "PROPOSER_PK": PROPOSER_KEY,
+            "SLACK_API_URL": stand_ins["slack"].url,
+            "SLACK_TOKEN": "bench",
+            "SLACK_CHANNEL": "bench",
+        }
+    )
+    node = stand_ins["node"]
+    assert isinstance(node, NodeStandIn)
+    # COW transfers are proposed on mainnet (`NODE_URL_MAINNET`) for all networks
+    for network in set(networks) | {Network.MAINNET}:
+        chain_id = PaymentConfig.from_network(network).network.value
+        os.environ[f"NODE_URL_{network.name}"] = node.chain_url(chain_id)
+
+
+def main() -> None:
+    """Seed the database, start the stand-ins and time a run of the accounting"""
+    start_logging()
+    parser = argparse.ArgumentParser("End-to-end benchmark of the payout script")
+    parser.add_argument("--start", type=str, default="2024-01-02")
+    add_networks_argument(parser, "Networks to run the accounting for")
+    parser.add_argument("--rows", type=int, default=1_000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--db-url",
+        default=DEFAULT_DB_URL,
+        help="Analytics database server (user:password@host:port) to seed",
+    )
+    parser.add_argument(
+        "--latency",
+        action="append",
+        default=[],
+        help="Latency in seconds per request, e.g. `0.05` or `dune=2` (repeatable)",
+    )
+    parser.add_argument(
+        "--report",
+        default=None,
+        help="File to write the timing spans to as json report",
+    )
+    args = parser.parse_args()
+    networks = [Network(network) for network in args.networks]
+    period = AccountingPeriod(args.start)
+    latency = parse_latency(args.latency)
+
+    for network in networks:
+        seed_analytics_db(args.db_url, network, period, args.rows, args.seed)
+    stand_ins = start_stand_ins(latency)
+    try:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            configure_environment(stand_ins, networks, args.db_url, Path(tmp_dir))
+            with span("end_to_end"):
+                run_accounting(
+                    ScriptArgs(
+                        start=args.start,
+                        networks=networks,
+                        post_tx=True,
+                        dry_run=False,
+                        send_to_slack=True,
+                        consolidate_cow=False,
+                        # time all stages, not the checkpoints of an earlier run
+                        fresh=True,
+                    ),
+                    period,
+                )
+    finally:
+        for stand_in in stand_ins.values():
+            stand_in.stop()
+
+    spans = recorder.snapshot()
+    print(timing_summary(spans))
+    for name, stand_in in stand_ins.items():
+        print(
+            f"{name} stand-in: {stand_in.requests} requests, "
+            f"{latency[name]:.3f}s latency each"
+        )
+    if args.report:
+        write_json_report(
+            spans,
+            Path(args.report),
+            period=str(period),
+            networks=",".join(network.value for network in networks),
+            rows=str(args.rows),
+            latency=",".join(f"{name}={seconds}" for name, seconds in latency.items()),
+        )
+        print(f"Report written to {args.report}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,196 @@
+"""
+Benchmark of the payout pipeline on synthetic data (see `tests.bench.synthetic`).
+
+Time (best of several runs) and peak traced memory are measured per stage and size, and
+compared to a saved baseline. Baselines depend on the machine, save them with `--save` on
+the machine used for comparisons (e.g. before changing the pipeline).
+
+    python -m tests.bench.payout_pipeline --save
+    python -m tests.bench.payout_pipeline
+
+Exits with status 1 if a stage regressed.
+"""
+
+from __future__ import annotations
+
+import argparse
+import contextlib
+import io
+import json
+import logging
+import platform
+import sys
+import time
+import tracemalloc
+from fractions import Fraction
+from pathlib import Path
+from typing import Any, Callable, TypeVar
+
+from src.config import AccountingConfig, Network, load_env
+from src.fetch.payouts import (
+    compute_partner_payouts,
+    compute_solver_payouts,
+    prepare_payouts,
+    summarize_payments,
+)
+from src.models.accounting_period import AccountingPeriod
+from src.multisend import chunk_transactions
+from tests.bench.synthetic import (
+    data_per_solver_frame,
+    partner_and_protocol_fees_frame,
+)
+
+SIZES = (10, 100, 1_000, 10_000, 100_000)
+DEFAULT_BASELINE = Path("out/bench/baseline.json")
+# relative slowdown and memory growth which count as regression
+TIME_TOLERANCE = 0.5
+MEMORY_TOLERANCE = 0.2
+# differences below this many seconds or bytes are noise
+MIN_TIME_DIFFERENCE = 0.01
+MIN_MEMORY_DIFFERENCE = 2**20
+
+T = TypeVar("T")
+Results = dict[str, dict[str, dict[str, float]]]
+
+
+def measure(func: Callable[[], T], repeat: int) -> tuple[T, dict[str, float]]:
+    """Best wall time of `repeat` runs and peak traced memory of one more run"""
+    seconds = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        seconds.append(time.perf_counter() - start)
+    tracemalloc.start()
+    try:
+        result = func()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return result, {"seconds": min(seconds), "peak_bytes": peak}
+
+
+def run_pipeline(rows: int, config: AccountingConfig, seed: int) -> dict[str, Any]:
+    """Measures all stages of the pipeline on synthetic data of `rows` solvers and
+    partners"""
+    period = AccountingPeriod("2024-01-02")
+    data_per_solver = data_per_solver_frame(rows, period, seed)
+    fees = partner_and_protocol_fees_frame(rows, period, seed)
+    repeat = 5 if rows <= 1_000 else 1
+    stages: dict[str, dict[str, float]] = {}
+
+    def stage(name: str, func: Callable[[], T]) -> T:
+        result, stages[name] = measure(func, repeat)
+        return result
+
+    solver_payouts = stage(
+        "compute_solver_payouts",
+        lambda: compute_solver_payouts(data_per_solver, config),
+    )
+    partner_payouts = stage(
+        "compute_partner_payouts", lambda: compute_partner_payouts(fees)
+    )
+    payouts = stage(
+        "prepare_payouts",
+        lambda: prepare_payouts(solver_payouts, partner_payouts, period, config),
+    )
+    stage(
+        "summarize_payments",
+        lambda: summarize_payments(
+            solver_payouts, partner_payouts, Fraction(10_000), Fraction(1), config
+        ),
+    )
+    # the multisend call data without the outer (network dependent) contract call
+    stage(
+        "encode_multisend",
+        lambda: [
+            b"".join(tx.encoded_data for tx in chunk)
+            for chunk in chunk_transactions(
+                [transfer.as_multisend_tx() for transfer in payouts.transfers]
+            )
+        ],
+    )
+    return stages
+
+
+def regressions(
+    results: Results,
+    baseline: Results,
+    time_tolerance: float = TIME_TOLERANCE,
+    memory_tolerance: float = MEMORY_TOLERANCE,
+) -> list[str]:
+    """Stages (per size) which are slower or use more memory than the baseline"""
+    found = []
+    for size, stages in results.items():
+        for name, result in stages.items():
+            base = baseline.get(size, {}).get(name)
+            if base is None:
+                continue
+            if (
+                result["seconds"] > base["seconds"] * (1 + time_tolerance)
+                and result["seconds"] - base["seconds"] > MIN_TIME_DIFFERENCE
+            ):
+                found.append(
+                    f"{name} ({size} rows): {result['seconds']:.3f}s "
+                    f"vs. {base['seconds']:.3f}s"
+                )
+            if (
+                result["peak_bytes"] > base["peak_bytes"] * (1 + memory_tolerance)
+                and result["peak_bytes"] - base["peak_bytes"] > MIN_MEMORY_DIFFERENCE
+            ):
+                found.append(
+                    f"{name} ({size} rows): {result['peak_bytes'] / 2**20:.1f} MiB "
+                    f"vs. {base['peak_bytes'] / 2**20:.1f} MiB"
+                )
+    return found
+
+
+def main() -> None:
+    """Run the benchmark and compare it to (or save it as) the baseline"""
+    parser = argparse.ArgumentParser("Benchmark the payout pipeline")
+    parser.add_argument("--sizes", type=int, nargs="+", default=list(SIZES))
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--baseline", type=Path, default=DEFAULT_BASELINE)
+    parser.add_argument(
+        "--save", action="store_true", help="Save the results as baseline"
+    )
+    args = parser.parse_args()
+
+    load_env()
+    config = AccountingConfig.from_network(Network.MAINNET)
+    # the pipeline reports overdrafts and totals, which are of no interest here
+    logging.disable(logging.INFO)
+
+    results: Results = {}
+    for rows in args.sizes:
+        with contextlib.redirect_stdout(io.StringIO()):
+            results[str(rows)] = run_pipeline(rows, config, args.seed)
+        for name, result in results[str(rows)].items():
+            print(
+                f"{rows:>7} rows {name:<24} {result['seconds']:>9.4f}s "
+                f"{result['peak_bytes'] / 2**20:>9.1f} MiB"
+            )
+
+    if args.save:
+        args.baseline.parent.mkdir(parents=True, exist_ok=True)
+        args.baseline.write_text(
+            json.dumps(
+                {"python": platform.python_version(), "results": results}, indent=2
+            ),
+            encoding="utf-8",
+        )
+        print(f"Baseline saved to {args.baseline}")
+        return
+    if not args.baseline.exists():
+        print(f"No baseline at {args.baseline}, save one with --save")
+        return
+    baseline = json.loads(args.baseline.read_text(encoding="utf-8"))["results"]
+    found = regressions(results, baseline)
+    for regression in found:
+        print(f"Regression: {regression}")
+    if found:
+        sys.exit(1)
+    print("No regressions")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,316 @@
+"""
+Local stand-ins of the external HTTP services used by `src.fetch.transfer_file`: Dune,
+CoinPaprika, the Safe transaction service, Slack and a JSON-RPC node.
+
+Each stand-in is a threaded HTTP server on a free local port which answers with responses of
+the shape the respective client library expects, after an injected latency per request. They
+are stand-ins, not simulations: Dune executions complete immediately, the node answers calls
+to the Safe and token contracts with fixed values, and posted transactions and messages are
+only recorded.
+"""
+
+from __future__ import annotations
+
+import csv
+import io
+import json
+import re
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable
+from urllib.parse import parse_qs, urlparse
+
+from eth_abi import encode
+
+from src.logger import set_log
+
+log = set_log(__name__)
+
+# (status, content type, body)
+Response = tuple[int, str, bytes]
+Query = dict[str, list[str]]
+
+# Safe version reported by the node stand-in (the version of the payout safes)
+SAFE_VERSION = "1.3.0"
+# Native token balance of every account on the node stand-in, large enough for all payouts
+BALANCE_WEI = 10**30
+SELECTORS = {
+    "affed0e0": "nonce",
+    "ffa1ad74": "VERSION",
+    "70a08231": "balanceOf",
+}
+
+
+def json_response(data: Any, status: int = 200) -> Response:
+    """A json response"""
+    return status, "application/json", json.dumps(data).encode()
+
+
+class StandIn(ThreadingHTTPServer):
+    """Threaded HTTP server on a free local port, answering via `respond` after
+    `latency` seconds"""
+
+    daemon_threads = True
+    name = "stand-in"
+
+    def __init__(self, latency: float = 0.0) -> None:
+        super().__init__(("127.0.0.1", 0), self._handler())
+        self.latency = latency
+        self.requests = 0
+        self.lock = threading.Lock()
+        self.thread = threading.Thread(target=self.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        """Base url of the server"""
+        host, port = self.server_address[:2]
+        return f"http://{host!s}:{port}"
+
+    def start(self) -> StandIn:
+        """Starts serving in a background thread"""
+        self.thread.start()
+        return self
+
+    def stop(self) -> None:
+        """Stops serving and closes the socket"""
+        self.shutdown()
+        self.server_close()
+
+    def respond(self, method: str, path: str, query: Query, body: bytes) -> Response:
+        """Response to a request"""
+        raise NotImplementedError
+
+    def _handler(self) -> type[BaseHTTPRequestHandler]:
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            """Dispatches requests to the stand-in"""
+
+            protocol_version = "HTTP/1.1"
+
+            def _handle(self, method: str) -> None:
+                body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+                url = urlparse(self.path)
+                with server.lock:
+                    server.requests += 1
+                time.sleep(server.latency)
+                try:
+                    status, content_type, data = server.respond(
+                        method, url.path, parse_qs(url.query), body
+                    )
+                except Exception as err:  # pylint: disable=broad-exception-caught
+                    log.error(f"{server.name} stand-in failed on {self.path}: {err}")
+                    status, content_type, data = json_response({"error": str(err)}, 500)
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_GET(self) -> None:  # pylint: disable=invalid-name
+                """GET request"""
+                self._handle("GET")
+
+            def do_POST(self) -> None:  # pylint: disable=invalid-name
+                """POST request"""
+                self._handle("POST")
+
+            def log_message(self, *args: Any) -> None:
+                log.debug(args[0], *args[1:])
+
+        return Handler
+
+
+class DuneStandIn(StandIn):
+    """Dune API (v1): query executions complete immediately with the rows returned by
+    `results` for the query id (no rows for unknown queries)"""
+
+    name = "dune"
+
+    def __init__(
+        self,
+        results: dict[int, Callable[[], list[dict[str, Any]]]],
+        latency: float = 0.0,
+    ) -> None:
+        super().__init__(latency)
+        self.results = results
+        self.executions: dict[str, int] = {}
+
+    def _rows(self, execution_id: str) -> list[dict[str, Any]]:
+        rows = self.results.get(self.executions[execution_id])
+        return rows() if rows is not None else []
+
+    def _times(self) -> dict[str, str]:
+        now = datetime.now(timezone.utc).isoformat()
+        return {
+            "submitted_at": now,
+            "execution_started_at": now,
+            "execution_ended_at": now,
+        }
+
+    def _metadata(self, rows: list[dict[str, Any]]) -> dict[str, Any]:
+        columns = list(rows[0]) if rows else []
+        return {
+            "column_names": columns,
+            "column_types": ["varchar"] * len(columns),
+            "total_row_count": len(rows),
+            "result_set_bytes": len(json.dumps(rows)),
+            "datapoint_count": len(rows) * len(columns),
+            "execution_time_millis": 0,
+        }
+
+    def respond(self, method: str, path: str, query: Query, body: bytes) -> Response:
+        if match := re.fullmatch(r"/api/v1/query/(\d+)/execute", path):
+            execution_id = uuid.uuid4().hex
+            self.executions[execution_id] = int(match.group(1))
+            return json_response(
+                {"execution_id": execution_id, "state": "QUERY_STATE_PENDING"}
+            )
+        match = re.fullmatch(
+            r"/api/v1/execution/(\w+)/(status|results|results/csv)", path
+        )
+        if match is None or match.group(1) not in self.executions:
+            return json_response({"error": f"not found: {path}"}, 404)
+        execution_id, endpoint = match.groups()
+        rows = self._rows(execution_id)
+        execution = {
+            "execution_id": execution_id,
+            "query_id": self.executions[execution_id],
+            "state": "QUERY_STATE_COMPLETED",
+            **self._times(),
+        }
+        if endpoint == "status":
+            return json_response(execution | {"result_metadata": self._metadata(rows)})
+        if endpoint == "results":
+            return json_response(
+                execution | {"result": {"rows": rows, "metadata": self._metadata(rows)}}
+            )
+        output = io.StringIO()
+        writer = csv.DictWriter(output, fieldnames=list(rows[0]) if rows else [])
+        writer.writeheader()
+        writer.writerows(rows)
+        return 200, "text/csv", output.getvalue().encode()
+
+
+class CoinPaprikaStandIn(StandIn):
+    """CoinPaprika API (v1): daily historical usd prices by coin id"""
+
+    name = "coinpaprika"
+
+    def __init__(self, prices: dict[str, float], latency: float = 0.0) -> None:
+        super().__init__(latency)
+        self.prices = prices
+
+    def respond(self, method: str, path: str, query: Query, body: bytes) -> Response:
+        match = re.fullmatch(r"/v1/tickers/([\w-]+)/historical", path)
+        if match is None or match.group(1) not in self.prices:
+            return json_response({"error": f"not found: {path}"}, 404)
+        day = query["start"][0]
+        return json_response(
+            [
+                {
+                    "timestamp": f"{day}T00:00:00Z",
+                    "price": self.prices[match.group(1)],
+                    "volume_24h": 0,
+                    "market_cap": 0,
+                }
+            ]
+        )
+
+
+class SafeStandIn(StandIn):
+    """Safe transaction service: records proposed multisig transactions"""
+
+    name = "safe"
+
+    def __init__(self, latency: float = 0.0) -> None:
+        super().__init__(latency)
+        self.transactions: list[dict[str, Any]] = []
+
+    def respond(self, method: str, path: str, query: Query, body: bytes) -> Response:
+        if method != "POST" or not re.fullmatch(
+            r"/api/v2/safes/0x[0-9a-fA-F]{40}/multisig-transactions/", path
+        ):
+            return json_response({"error": f"not found: {path}"}, 404)
+        with self.lock:
+            self.transactions.append(json.loads(body))
+        return 201, "application/json", b""
+
+
+class SlackStandIn(StandIn):
+    """Slack web API: records posted messages"""
+
+    name = "slack"
+
+    def __init__(self, latency: float = 0.0) -> None:
+        super().__init__(latency)
+        self.messages: list[dict[str, Any]] = []
+
+    @property
+    def url(self) -> str:
+        # the slack client appends the method name to its base url
+        return f"{super().url}/api/"
+
+    def respond(self, method: str, path: str, query: Query, body: bytes) -> Response:
+        if path != "/api/chat.postMessage":
+            return json_response({"ok": False, "error": "unknown_method"})
+        with self.lock:
+            self.messages.append(json.loads(body))
+            ts = f"{time.time():.6f}"
+        return json_response({"ok": True, "ts": ts})
+
+
+class NodeStandIn(StandIn):
+    """JSON-RPC node of any chain, the chain id is the path of the url (e.g. `/100`).
+
+    Every address has code and `BALANCE_WEI`, safes are of version `SAFE_VERSION` with
+    nonce zero and token balances are zero.
+    """
+
+    name = "node"
+
+    def chain_url(self, chain_id: int) -> str:
+        """Url of the node of a chain"""
+        return f"{self.url}/{chain_id}"
+
+    def respond(self, method: str, path: str, query: Query, body: bytes) -> Response:
+        chain_id = int(path.strip("/"))
+        request = json.loads(body)
+        if isinstance(request, list):
+            return json_response([self._call(chain_id, item) for item in request])
+        return json_response(self._call(chain_id, request))
+
+    def _call(self, chain_id: int, request: dict[str, Any]) -> dict[str, Any]:
+        method, params = request["method"], request.get("params", [])
+        result: Any
+        match method:
+            case "eth_chainId":
+                result = hex(chain_id)
+            case "net_version":
+                result = str(chain_id)
+            case "eth_blockNumber":
+                result = hex(1)
+            case "eth_getCode":
+                result = "0x00"
+            case "eth_getBalance":
+                result = hex(BALANCE_WEI)
+            case "eth_call":
+                result = "0x" + self._contract_call(params[0]["data"]).hex()
+            case _:
+                return {
+                    "jsonrpc": "2.0",
+                    "id": request["id"],
+                    "error": {"code": -32601, "message": f"{method} not supported"},
+                }
+        return {"jsonrpc": "2.0", "id": request["id"], "result": result}
+
+    @staticmethod
+    def _contract_call(data: str) -> bytes:
+        match SELECTORS.get(data.removeprefix("0x")[:8]):
+            case "VERSION":
+                return encode(["string"], [SAFE_VERSION])
+            case _:
+                return encode(["uint256"], [0])
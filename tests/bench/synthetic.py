@@ -0,0 +1,92 @@
+"""
+Seeded generator of synthetic analytics data, shaped like the tables
+`fct_data_per_solver_and_accounting_period` and `fct_partner_and_protocol_fees` as returned
+by `src.pg_client.MultiInstanceDBFetcher` (hex addresses, numeric amounts as Decimal).
+"""
+
+from __future__ import annotations
+
+from decimal import Decimal
+
+import numpy as np
+from pandas import DataFrame
+
+from src.models.accounting_period import AccountingPeriod
+from src.pg_client import accounting_period_string
+
+ONE_ETH = 10**18
+# native token per COW, i.e. COW at 0.0001 ETH
+CONVERSION_RATE_COW_TO_NATIVE = 0.0001
+
+
+def _addresses(rng: np.random.Generator, count: int) -> list[str]:
+    return ["0x" + rng.bytes(20).hex() for _ in range(count)]
+
+
+def _amounts(values: np.ndarray) -> list[Decimal]:
+    return [Decimal(int(value)) for value in values]
+
+
+def data_per_solver_frame(
+    rows: int, period: AccountingPeriod, seed: int = 0
+) -> DataFrame:
+    """Synthetic data per solver: rewards are heavy tailed, some solvers are penalized or
+    have negative slippage (and end up with overdrafts), some pay service fees"""
+    rng = np.random.default_rng(seed)
+    solvers = _addresses(rng, rows)
+    pools = _addresses(rng, 5)
+    reward_eth = rng.lognormal(np.log(0.2), 1.5, rows) * ONE_ETH
+    reward_eth *= np.where(rng.random(rows) < 0.1, -1, 1)
+    consistency_eth = np.where(
+        rng.random(rows) < 0.2, rng.lognormal(np.log(0.05), 1.0, rows) * ONE_ETH, 0
+    )
+    return DataFrame(
+        {
+            "accounting_period": accounting_period_string(period),
+            "solver": solvers,
+            "solver_name": [f"solver-{index}" for index in range(rows)],
+            "pool_address": rng.choice(pools, rows),
+            "reward_target": [
+                solver if keep else "0x" + rng.bytes(20).hex()
+                for solver, keep in zip(solvers, rng.random(rows) < 0.7)
+            ],
+            "service_fee_enabled": rng.random(rows) < 0.3,
+            "sum_batch_reward_native": _amounts(reward_eth),
+            "sum_batch_reward_cow": _amounts(
+                reward_eth / CONVERSION_RATE_COW_TO_NATIVE
+            ),
+            "consistency_reward_native": _amounts(consistency_eth),
+            "consistency_reward_cow": _amounts(
+                consistency_eth / CONVERSION_RATE_COW_TO_NATIVE
+            ),
+            "sum_quote_reward_cow": _amounts(rng.poisson(50, rows) * 6.0 * ONE_ETH),
+            "sum_protocol_fee_native": _amounts(
+                rng.lognormal(np.log(0.01), 1.5, rows) * ONE_ETH
+            ),
+            "sum_network_fee_native": _amounts(
+                rng.lognormal(np.log(0.05), 1.0, rows) * ONE_ETH
+            ),
+            "sum_slippage_native": _amounts(rng.normal(0, 0.05, rows) * ONE_ETH),
+            "conversion_rate_cow_to_native": CONVERSION_RATE_COW_TO_NATIVE,
+        }
+    )
+
+
+def partner_and_protocol_fees_frame(
+    rows: int, period: AccountingPeriod, seed: int = 0
+) -> DataFrame:
+    """Synthetic partner fees: a few orders have no partner fee recipient"""
+    rng = np.random.default_rng(seed + 1)
+    recipients: list[str | None] = list(_addresses(rng, rows))
+    for index in np.flatnonzero(rng.random(rows) < 0.05):
+        recipients[index] = None
+    partner_fee = rng.lognormal(np.log(0.01), 1.5, rows) * ONE_ETH
+    return DataFrame(
+        {
+            "accounting_period": accounting_period_string(period),
+            "partner_fee_recipient": recipients,
+            "sum_partner_fee_native": _amounts(partner_fee),
+            "partner_fee_cut": rng.choice([0.0, 0.15, 0.5], rows),
+            "sum_protocol_fee_native": _amounts(partner_fee * 1.5),
+        }
+    )
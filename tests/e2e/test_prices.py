@@ -1,5 +1,8 @@
+import os
+import tempfile
 import unittest
 from datetime import datetime, timedelta
+from unittest.mock import patch
 
 from dune_client.types import Address
 
@@ -7,6 +10,8 @@ from src.config import AccountingConfig, Network
 from src.fetch.prices import (
     TokenId,
     exchange_rate_atoms,
+    price_fetcher,
+    price_store,
     usd_price,
 )
 
@@ -16,6 +21,12 @@ DELTA = 0.00001
 
 class TestPrices(unittest.TestCase):
     def setUp(self) -> None:
+        # the exact prices below are CoinPaprika's
+        environment = patch.dict(os.environ, {"PRICE_PROVIDERS": "coinpaprika"})
+        environment.start()
+        self.addCleanup(environment.stop)
+        price_fetcher.cache_clear()
+        self.addCleanup(price_fetcher.cache_clear)
         self.config = AccountingConfig.from_network(Network.MAINNET)
         self.some_date = datetime.strptime("2024-09-01", "%Y-%m-%d")
         self.cow_price = usd_price(TokenId.COW, self.some_date)
@@ -68,10 +79,16 @@ class TestPrices(unittest.TestCase):
         )
 
     def test_price_cache(self):
-        # First call logs
+        # First call logs (with an empty persistent price cache)
         day = datetime.strptime("2024-08-01", "%Y-%m-%d")  # A date we used yet!
         token = TokenId.USDC
-        with self.assertLogs("src.fetch.prices", level="INFO") as cm:
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        self.addCleanup(price_store.cache_clear)
+        price_store.cache_clear()
+        with patch.dict(
+            os.environ, {"PRICE_CACHE_FILE": os.path.join(tmp_dir.name, "p.sqlite")}
+        ), self.assertLogs("src.fetch.prices", level="INFO") as cm:
             usd_price(token, day)
         expected_msg = f"requesting price for token={token.value}, day={day.date()}"
         self.assertEqual(
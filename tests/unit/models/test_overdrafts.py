@@ -18,9 +18,9 @@ from tests.constants import (
 
 
 @pytest.mark.parametrize("_network", ALL_NETWORKS)
-def test_multisend_tx(_network, monkeypatch):
+def test_multisend_tx(_network):
     contract = overdraftsmanager()
-    monkeypatch.setenv("NETWORK", _network)
+    config = OverdraftConfig.from_network(Network(_network))
     for _wei in [0, 1, 100, 123456789, 1000000000000000000, 999999000000000000000000]:
         for start, length in [("1999-01-01", 7), ("2025-10-07", 7), ("2025-10-7", 3)]:
             period = AccountingPeriod(start=start, length_days=length)
@@ -30,7 +30,7 @@ def test_multisend_tx(_network, monkeypatch):
                 name=DUMMY_SOLVER_NAME_1,
                 wei=_wei,
             )
-            multisendtx = overdraft.as_multisend_tx()
+            multisendtx = overdraft.as_multisend_tx(config)
             assert isinstance(multisendtx, MultiSendTx)
             assert multisendtx.value == 0
             data = contract.encode_abi(
@@ -0,0 +1,44 @@
+import unittest
+
+from web3 import Web3
+
+from src.abis.load import IndexedContract, abi_function, erc20, weth9
+
+ACCOUNT = Web3.to_checksum_address("0xde1c59bc25d806ad9ddcbe246c4b5e5505645718")
+
+
+class TestAbiFunctions(unittest.TestCase):
+    def test_selectors(self):
+        self.assertEqual(
+            abi_function(IndexedContract.ERC20, "transfer").selector.hex(), "a9059cbb"
+        )
+        self.assertEqual(
+            abi_function(IndexedContract.WETH9, "withdraw").selector.hex(), "2e1a7d4d"
+        )
+
+    def test_encoding_matches_contract_encoding(self):
+        cases = [
+            (IndexedContract.ERC20, "transfer", [ACCOUNT, 10**18]),
+            (IndexedContract.WETH9, "balanceOf", [ACCOUNT]),
+            (IndexedContract.ERC20, "decimals", []),
+            (IndexedContract.WETH9, "withdraw", [123]),
+            (IndexedContract.OVERDRAFTSMANAGER, "addOverdraft", [ACCOUNT, 456]),
+        ]
+        for contract, name, args in cases:
+            with self.subTest(function=name):
+                expected = contract.get_contract(None, None).encode_abi(
+                    abi_element_identifier=name, args=args
+                )
+                self.assertEqual(abi_function(contract, name).encode(*args), expected)
+
+    def test_contracts_are_cached(self):
+        self.assertIs(
+            IndexedContract.ERC20.load_contract_abi(),
+            IndexedContract.ERC20.load_contract_abi(),
+        )
+        self.assertIs(erc20(), erc20())
+        self.assertIsNot(weth9(), erc20())
+
+
+if __name__ == "__main__":
+    unittest.main()
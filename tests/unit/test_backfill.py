@@ -0,0 +1,156 @@
+import tempfile
+import unittest
+from decimal import Decimal
+from pathlib import Path
+
+from pandas import DataFrame
+
+from src.config import Network
+from src.fetch.backfill import (
+    HAND_OFF_INPUTS,
+    PAYOUT_COLUMNS,
+    BackfillProgress,
+    HandOff,
+    backfill,
+)
+from src.models.accounting_period import AccountingPeriod
+from src.pg_client import accounting_period_string, split_by_accounting_period
+from src.utils.arrow_ipc import read_ipc, write_ipc
+from src.utils.columnar import read_partitions, write_partition
+
+
+class StandInOrderbook:
+    """Orderbook stand-in without data, recording the periods of each query."""
+
+    def __init__(self):
+        self.queried: list[list[str]] = []
+
+    def get_data_per_solver(self, accounting_period, config):
+        self.queried.append([str(period) for period in accounting_period])
+        return DataFrame({"accounting_period": []})
+
+    def get_partner_and_protocol_fees(self, accounting_period, config):
+        return DataFrame({"accounting_period": []})
+
+
+class FailingOrderbook(StandInOrderbook):
+    """Orderbook stand-in failing to fetch the data of one network."""
+
+    def __init__(self, failing_period_count: int):
+        super().__init__()
+        self.failing_period_count = failing_period_count
+
+    def get_data_per_solver(self, accounting_period, config):
+        if len(accounting_period) == self.failing_period_count:
+            raise ConnectionError("connection refused")
+        return super().get_data_per_solver(accounting_period, config)
+
+
+class TestBackfill(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.root = Path(self.tmp_dir.name)
+
+    def tearDown(self) -> None:
+        self.tmp_dir.cleanup()
+
+    def test_split_range(self):
+        periods = AccountingPeriod.split_range("2024-01-02", "2024-01-22")
+        self.assertEqual(
+            [str(period) for period in periods],
+            ["2024-01-02-to-2024-01-09", "2024-01-09-to-2024-01-16"],
+        )
+
+    def test_split_by_accounting_period(self):
+        periods = AccountingPeriod.split_range("2024-01-02", "2024-01-16")
+        results = DataFrame(
+            {
+                "accounting_period": [
+                    accounting_period_string(periods[1]),
+                    accounting_period_string(periods[0]),
+                    accounting_period_string(periods[1]),
+                ],
+                "value": [1, 2, 3],
+            }
+        )
+        split = split_by_accounting_period(results, periods)
+        self.assertEqual(list(split[str(periods[0])]["value"]), [2])
+        self.assertEqual(list(split[str(periods[1])]["value"]), [1, 3])
+
+    def test_columnar_round_trip(self):
+        amount = Decimal(123456789 * 10**18)
+        frame = DataFrame({"recipient": ["0x1"], "amount_wei": [amount]})
+        write_partition(frame, self.root, network="mainnet", period="p1")
+        write_partition(frame, self.root, network="gnosis", period="p1")
+        result = read_partitions(self.root)
+        self.assertEqual(sorted(result["network"]), ["gnosis", "mainnet"])
+        self.assertEqual(list(result["amount_wei"]), [amount, amount])
+
+    def test_backfill_is_resumable(self):
+        periods = AccountingPeriod.split_range("2024-01-02", "2024-01-16")
+        orderbook = StandInOrderbook()
+        progress = backfill(orderbook, [Network.GNOSIS], periods, self.root, 1)
+        self.assertTrue(all(progress.is_done(Network.GNOSIS, p) for p in periods))
+        self.assertEqual(orderbook.queried, [[str(p) for p in periods]])
+        self.assertEqual(
+            list(read_partitions(self.root / "payouts").columns),
+            PAYOUT_COLUMNS + ["network", "period"],
+        )
+
+        # periods which are done are neither fetched nor recomputed
+        more_periods = AccountingPeriod.split_range("2024-01-02", "2024-01-23")
+        backfill(orderbook, [Network.GNOSIS], more_periods, self.root, 1)
+        self.assertEqual(orderbook.queried[1], [str(more_periods[2])])
+        progress = BackfillProgress(self.root / "progress.json")
+        self.assertTrue(progress.is_done(Network.GNOSIS, more_periods[2]))
+
+    def test_failed_fetch_marks_periods_failed(self):
+        periods = AccountingPeriod.split_range("2024-01-02", "2024-01-16")
+        # the data of all periods of gnosis is queried at once and fails, mainnet is
+        # queried after the first period is done already
+        BackfillProgress(self.root / "progress.json").mark(
+            Network.MAINNET, periods[0], "done"
+        )
+        orderbook = FailingOrderbook(len(periods))
+        progress = backfill(
+            orderbook, [Network.GNOSIS, Network.MAINNET], periods, self.root, 1
+        )
+        self.assertEqual(
+            progress.state,
+            {
+                f"gnosis/{periods[0]}": "failed",
+                f"gnosis/{periods[1]}": "failed",
+                f"mainnet/{periods[0]}": "done",
+                f"mainnet/{periods[1]}": "done",
+            },
+        )
+
+    def test_hand_off(self):
+        periods = AccountingPeriod.split_range("2024-01-02", "2024-01-16")
+        hand_off = HandOff(self.root / "hand-off")
+        # the data of the first period was handed off by an interrupted backfill
+        for name in HAND_OFF_INPUTS:
+            write_ipc(
+                DataFrame({"accounting_period": []}),
+                hand_off.path(Network.GNOSIS, periods[0], name),
+            )
+        orderbook = StandInOrderbook()
+        backfill(orderbook, [Network.GNOSIS], periods, self.root, 1)
+        self.assertEqual(orderbook.queried, [[str(periods[1])]])
+        # hand-off files of periods which are done are removed
+        self.assertFalse(any(path.is_file() for path in hand_off.directory.rglob("*")))
+
+    def test_ipc_round_trip(self):
+        frame = DataFrame(
+            {"solver": ["0x1", "0x2"], "fee": [0.5, 1.5], "wei": [10**30, 1]}
+        )
+        path = self.root / "frame.arrow"
+        write_ipc(frame, path)
+        result = read_ipc(path)
+        self.assertEqual(list(result["wei"]), [10**30, 1])
+        self.assertEqual(list(result["fee"]), [0.5, 1.5])
+        self.assertEqual(list(result["solver"]), ["0x1", "0x2"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,56 @@
+import unittest
+
+from pandas.testing import assert_frame_equal
+
+from src.config import AccountingConfig, Network
+from src.fetch.payouts import compute_partner_payouts, compute_solver_payouts
+from src.models.accounting_period import AccountingPeriod
+from tests.bench.payout_pipeline import regressions
+from tests.bench.synthetic import (
+    data_per_solver_frame,
+    partner_and_protocol_fees_frame,
+)
+
+
+class TestSynthetic(unittest.TestCase):
+    def setUp(self):
+        self.period = AccountingPeriod("2024-01-02")
+
+    def test_seeded(self):
+        assert_frame_equal(
+            data_per_solver_frame(50, self.period, seed=1),
+            data_per_solver_frame(50, self.period, seed=1),
+        )
+        self.assertNotEqual(
+            list(data_per_solver_frame(50, self.period, seed=1)["solver"]),
+            list(data_per_solver_frame(50, self.period, seed=2)["solver"]),
+        )
+
+    def test_frames_fit_the_pipeline(self):
+        config = AccountingConfig.from_network(Network.MAINNET)
+        solver_payouts = compute_solver_payouts(
+            data_per_solver_frame(1000, self.period), config
+        )
+        self.assertEqual(len(solver_payouts), 1000)
+        self.assertTrue((solver_payouts["quote_reward_cow"] >= 0).all())
+        self.assertTrue((solver_payouts["primary_reward_eth"] < 0).any())
+        partner_payouts = compute_partner_payouts(
+            partner_and_protocol_fees_frame(1000, self.period)
+        )
+        self.assertLess(len(partner_payouts), 1000)
+
+    def test_regressions(self):
+        mib = 2**20
+        baseline = {
+            "100": {"prepare_payouts": {"seconds": 1.0, "peak_bytes": 10 * mib}}
+        }
+        results = {"100": {"prepare_payouts": {"seconds": 1.2, "peak_bytes": 11 * mib}}}
+        self.assertEqual(regressions(results, baseline), [])
+        results["100"]["prepare_payouts"] = {"seconds": 2.0, "peak_bytes": 20 * mib}
+        self.assertEqual(len(regressions(results, baseline)), 2)
+        # stages and sizes without baseline are not compared
+        self.assertEqual(regressions({"10": results["100"]}, baseline), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,88 @@
+import time
+import unittest
+from datetime import datetime
+
+from dune_client.client import DuneClient
+from eth_typing import URI
+from safe_eth.eth.ethereum_client import EthereumClient
+from safe_eth.safe.safe import Safe
+from slack.web.client import WebClient
+
+from src.fetch.dune import DuneFetcher
+from src.fetch.prices import CoinPaprikaProvider, TokenId
+from src.models.accounting_period import AccountingPeriod
+from src.queries import QUERIES
+from tests.bench.e2e import SAFE_ADDRESS, parse_latency
+from tests.bench.stand_ins import (
+    CoinPaprikaStandIn,
+    DuneStandIn,
+    NodeStandIn,
+    SlackStandIn,
+)
+
+
+class TestStandIns(unittest.TestCase):
+    def test_dune(self):
+        query_id = QUERIES["PERIOD_BLOCK_INTERVAL"].query.query_id
+        stand_in = DuneStandIn(
+            {query_id: lambda: [{"start_block": 10, "end_block": 20}]}
+        ).start()
+        self.addCleanup(stand_in.stop)
+        dune = DuneFetcher(
+            DuneClient("key", base_url=stand_in.url),
+            "ethereum",
+            AccountingPeriod("2024-01-02"),
+        )
+        self.assertEqual((dune.start_block, dune.end_block), ("10", "20"))
+
+    def test_coinpaprika(self):
+        stand_in = CoinPaprikaStandIn({TokenId.ETH.value: 2000.0}).start()
+        self.addCleanup(stand_in.stop)
+        provider = CoinPaprikaProvider(f"{stand_in.url}/v1")
+        self.assertEqual(provider.usd_price(TokenId.ETH, datetime(2024, 1, 8)), 2000.0)
+        with self.assertRaises(Exception):
+            provider.usd_price(TokenId.COW, datetime(2024, 1, 8))
+
+    def test_slack_threads(self):
+        stand_in = SlackStandIn().start()
+        self.addCleanup(stand_in.stop)
+        client = WebClient(token="token", base_url=stand_in.url)
+        response = client.chat_postMessage(channel="bench", text="message")
+        client.chat_postMessage(channel="bench", text="reply", thread_ts=response["ts"])
+        self.assertEqual(
+            [message["text"] for message in stand_in.messages], ["message", "reply"]
+        )
+        self.assertEqual(stand_in.messages[1]["thread_ts"], response["ts"])
+
+    def test_node(self):
+        stand_in = NodeStandIn().start()
+        self.addCleanup(stand_in.stop)
+        client = EthereumClient(URI(stand_in.chain_url(100)))
+        self.assertEqual(client.get_chain_id(), 100)
+        safe = Safe(SAFE_ADDRESS, client)  # pylint: disable=abstract-class-instantiated
+        self.assertEqual(safe.retrieve_nonce(), 0)
+        self.assertEqual(safe.retrieve_version(), "1.3.0")
+
+    def test_latency(self):
+        stand_in = SlackStandIn(latency=0.2).start()
+        self.addCleanup(stand_in.stop)
+        start = time.perf_counter()
+        WebClient(token="token", base_url=stand_in.url).chat_postMessage(
+            channel="bench", text="message"
+        )
+        self.assertGreaterEqual(time.perf_counter() - start, 0.2)
+        self.assertEqual(stand_in.requests, 1)
+
+
+class TestParseLatency(unittest.TestCase):
+    def test_parse_latency(self):
+        latency = parse_latency(["0.1", "dune=2"])
+        self.assertEqual(latency["dune"], 2.0)
+        self.assertEqual(latency["safe"], 0.1)
+        self.assertEqual(parse_latency([])["node"], 0.0)
+        with self.assertRaises(ValueError):
+            parse_latency(["etherscan=1"])
+
+
+if __name__ == "__main__":
+    unittest.main()
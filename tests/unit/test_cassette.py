@@ -0,0 +1,119 @@
+import tempfile
+import unittest
+from pathlib import Path
+
+import requests
+from eth_typing import URI
+from safe_eth.eth.ethereum_client import EthereumClient
+from slack.web.client import WebClient
+
+from src.utils.cassette import (
+    Cassette,
+    CassetteMiss,
+    Interaction,
+    fingerprint,
+    replaying,
+    use_cassette,
+)
+from tests.bench.stand_ins import CoinPaprikaStandIn, NodeStandIn, SlackStandIn
+
+
+class TestFingerprint(unittest.TestCase):
+    def test_json_rpc_ids_are_ignored(self):
+        url = "http://node"
+        self.assertEqual(
+            fingerprint("POST", url, b'{"jsonrpc": "2.0", "id": 1, "method": "a"}'),
+            fingerprint("POST", url, b'{"method": "a", "id": 7, "jsonrpc": "2.0"}'),
+        )
+        self.assertNotEqual(
+            fingerprint("POST", url, b'{"jsonrpc": "2.0", "id": 1, "method": "a"}'),
+            fingerprint("POST", url, b'{"jsonrpc": "2.0", "id": 1, "method": "b"}'),
+        )
+        self.assertNotEqual(
+            fingerprint("GET", url, None), fingerprint("GET", url + "?a=1", None)
+        )
+
+
+class TestCassette(unittest.TestCase):
+    def setUp(self):
+        self.stand_in = CoinPaprikaStandIn({"eth-ethereum": 2000.0}).start()
+        self.url = f"{self.stand_in.url}/v1/tickers/eth-ethereum/historical"
+
+    def tearDown(self):
+        if self.stand_in.thread.is_alive():
+            self.stand_in.stop()
+
+    def test_record_and_replay(self):
+        cassette = Cassette()
+        with use_cassette(cassette):
+            self.assertFalse(replaying())
+            recorded = requests.get(self.url, params={"start": "2024-01-08"}, timeout=5)
+        self.assertEqual(len(cassette.interactions), 1)
+        self.stand_in.stop()
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = Path(tmp_dir) / "cassette.json.gz"
+            cassette.save(path)
+            replay = Cassette.load(path)
+        with use_cassette(replay):
+            self.assertTrue(replaying())
+            replayed = requests.get(self.url, params={"start": "2024-01-08"}, timeout=5)
+            with self.assertRaises(CassetteMiss):
+                requests.get(self.url, params={"start": "2024-01-09"}, timeout=5)
+        self.assertEqual(replayed.status_code, 200)
+        self.assertEqual(replayed.json(), recorded.json())
+        self.assertFalse(replaying())
+
+    def test_last_response_is_replayed(self):
+        cassette = Cassette(
+            [
+                Interaction("a", "route", 200, {}, b"pending"),
+                Interaction("a", "route", 200, {}, b"done"),
+            ],
+            replay=True,
+        )
+        self.assertEqual(cassette.play("a", "route").body, b"done")
+        # unknown bodies get the responses of the route in order
+        self.assertEqual(cassette.play("b", "route").body, b"pending")
+        self.assertEqual(cassette.play("b", "route").body, b"done")
+        self.assertEqual(cassette.play("b", "route").body, b"done")
+        self.assertIsNone(cassette.play("b", "other route"))
+
+    def test_binary_bodies(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = Path(tmp_dir) / "cassette.json.gz"
+            Cassette([Interaction("a", "route", 200, {}, b"\xff\x00")]).save(path)
+            self.assertEqual(Cassette.load(path).interactions[0].body, b"\xff\x00")
+
+    def test_json_rpc_and_slack(self):
+        node, slack = NodeStandIn().start(), SlackStandIn().start()
+        cassette = Cassette()
+        with use_cassette(cassette):
+            chain_id = EthereumClient(URI(node.chain_url(100))).get_chain_id()
+            WebClient(token="token", base_url=slack.url).chat_postMessage(
+                channel="channel", text="took 1.0s"
+            )
+        node.stop()
+        slack.stop()
+
+        with use_cassette(Cassette(cassette.interactions, replay=True)):
+            # a new client numbers its requests from the start
+            client = EthereumClient(URI(node.chain_url(100)))
+            self.assertEqual(client.get_chain_id(), chain_id)
+            # calls of a node are not interchangeable
+            with self.assertRaises(CassetteMiss):
+                client.w3.eth.get_block_number()
+            response = WebClient(token="token", base_url=slack.url).chat_postMessage(
+                channel="channel", text="took 2.0s"
+            )
+        self.assertTrue(response["ok"])
+
+    def test_nested_cassettes(self):
+        with use_cassette(Cassette()):
+            with self.assertRaises(RuntimeError):
+                with use_cassette(Cassette()):
+                    pass
+
+
+if __name__ == "__main__":
+    unittest.main()
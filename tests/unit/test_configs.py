@@ -6,7 +6,14 @@ from safe_eth.safe.multi_send import MultiSendTx, MultiSendOperation
 import pytest
 from web3 import Web3
 
-from src.config import OverdraftConfig, Network
+from src.config import (
+    AccountingConfig,
+    Network,
+    NodeConfig,
+    OverdraftConfig,
+    check_network_env,
+    network_env,
+)
 from tests.constants import (
     ALL_NETWORKS,
     OVERDRAFTS_CONTRACT_ADDRESS,
@@ -33,3 +40,30 @@ def test_config_serializes(network, monkeypatch):
             assert overdraft_config.contract_address == Address(
                 OVERDRAFTS_CONTRACT_ADDRESS
             )
+
+
+def test_network_specific_environment(monkeypatch):
+    monkeypatch.setenv("NODE_URL", "https://default.node")
+    monkeypatch.setenv("NODE_URL_GNOSIS", "https://gnosis.node")
+    assert NodeConfig.from_network(Network.GNOSIS).node_url == "https://gnosis.node"
+    assert NodeConfig.from_network(Network.BASE).node_url == "https://default.node"
+    assert network_env("UNSET_VARIABLE", Network.BASE, "fallback") == "fallback"
+
+
+def test_configs_of_several_networks(monkeypatch):
+    monkeypatch.delenv("NETWORK", raising=False)
+    configs = {network: AccountingConfig.from_network(network) for network in Network}
+    for network, config in configs.items():
+        assert config.io_config.network == network
+
+
+def test_chain_specific_environment_of_several_networks(monkeypatch):
+    for name in ["NODE_URL", "PAYOUTS_SAFE_ADDRESS", "NONCE_MODIFIER"]:
+        monkeypatch.delenv(name, raising=False)
+    monkeypatch.setenv("NODE_URL", "https://default.node")
+    monkeypatch.setenv("NODE_URL_GNOSIS", "https://gnosis.node")
+    check_network_env([Network.BASE])
+    with pytest.raises(ValueError, match="NODE_URL_BASE"):
+        check_network_env([Network.GNOSIS, Network.BASE])
+    monkeypatch.setenv("NODE_URL_BASE", "https://base.node")
+    check_network_env([Network.GNOSIS, Network.BASE])
@@ -0,0 +1,159 @@
+import threading
+import unittest
+from datetime import timedelta
+from decimal import Decimal
+from io import BytesIO
+from types import SimpleNamespace
+from unittest.mock import patch
+
+from dune_client.models import ExecutionResultCSV, ExecutionState
+from dune_client.query import QueryBase
+
+from src.fetch.dune import DuneFetcher, csv_to_frame
+from src.models.accounting_period import AccountingPeriod
+
+
+class StubDuneClient:
+    """Serves fixed CSV pages for a single execution."""
+
+    def __init__(self, pages: list[str]):
+        self.pages = pages
+        self.requested_offsets: list[int] = []
+
+    def get_execution_results_csv(self, job_id, limit, offset):
+        self.requested_offsets.append(offset)
+        index = offset // limit
+        next_offset = offset + limit if index + 1 < len(self.pages) else None
+        return ExecutionResultCSV(
+            data=BytesIO(self.pages[index].encode()), next_offset=next_offset
+        )
+
+
+class StubDuneExecutions:
+    """Executes the dashboard slippage query: solver 0x1 has a slippage of one wei per
+    hour, solver 0x2 only in the first hour of the day."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.executed = {}
+
+    def execute_query(self, query):
+        params = {param.key: param.value for param in query.params}
+        bounds = (params["start_time"], params["end_time"])
+        with self.lock:
+            job_id = f"job-{len(self.executed)}"
+            self.executed[job_id] = bounds
+        return SimpleNamespace(execution_id=job_id)
+
+    def get_execution_status(self, job_id):
+        return SimpleNamespace(state=ExecutionState.COMPLETED, error=None)
+
+    def get_execution_results_csv(self, job_id, limit, offset):
+        start, end = self.executed[job_id]
+        hours = [
+            start + timedelta(hours=h)
+            for h in range((end - start) // timedelta(hours=1))
+        ]
+        rows = ["solver_address,solver_name,eth_slippage_wei"]
+        rows.append(f"0x1,one,{len(hours)}")
+        if any(hour.hour == 0 for hour in hours):
+            rows.append(f"0x2,two,{10**30}")
+        return ExecutionResultCSV(
+            data=BytesIO(("\n".join(rows) + "\n").encode()), next_offset=None
+        )
+
+
+class TestCsvToFrame(unittest.TestCase):
+    def test_exact_amounts(self):
+        frame = csv_to_frame(
+            BytesIO(
+                b"solver,slippage_eth,ratio,name\n"
+                b"0x01,123456789012345678901234567,0.5,a\n"
+                b"0x02,-1,1.5,\n"
+            )
+        )
+        self.assertEqual(
+            frame["slippage_eth"].tolist(), [123456789012345678901234567, -1]
+        )
+        self.assertEqual(frame["slippage_eth"].dtype, object)
+        self.assertEqual(frame["ratio"].tolist(), [0.5, 1.5])
+        self.assertEqual(frame["solver"].tolist(), ["0x01", "0x02"])
+        self.assertTrue(frame["name"].isna().iloc[1])
+
+    def test_explicit_amount_columns(self):
+        frame = csv_to_frame(BytesIO(b"fee\n1.5\n\n2\n"), amount_columns=["fee"])
+        self.assertEqual(str(frame["fee"].iloc[0]), "1.5")
+        self.assertEqual(frame["fee"].iloc[-1], 2)
+
+
+class TestPaginatedResults(unittest.TestCase):
+    @staticmethod
+    def fetcher(client: StubDuneClient) -> DuneFetcher:
+        with patch.object(DuneFetcher, "get_block_interval", return_value=("1", "2")):
+            return DuneFetcher(client, "ethereum", AccountingPeriod("2024-01-01"))
+
+    def test_get_query_frame(self):
+        client = StubDuneClient(["amount\n1\n2\n", "amount\n3\n4\n", "amount\n5\n"])
+        frame = self.fetcher(client).get_query_frame(
+            QueryBase(1, "test"), job_id="job", batch_size=2
+        )
+
+        self.assertEqual(client.requested_offsets, [0, 2, 4])
+        self.assertEqual(frame["amount"].tolist(), [1, 2, 3, 4, 5])
+
+    def test_types_are_inferred_for_all_batches(self):
+        client = StubDuneClient(
+            ["amount,ratio\n1,1\n2,1\n", "amount,ratio\n123456789012345678901.5,0.5\n"]
+        )
+        frame = self.fetcher(client).get_query_frame(
+            QueryBase(1, "test"), job_id="job", batch_size=2
+        )
+        self.assertEqual(
+            frame["amount"].tolist(), [1, 2, Decimal("123456789012345678901.5")]
+        )
+        self.assertEqual(frame["ratio"].tolist(), [1.0, 1.0, 0.5])
+
+    def test_iter_query_frames(self):
+        client = StubDuneClient(["amount,ratio\n1,1\n2,1\n", "amount,ratio\n3.5,0.5\n"])
+        frames = list(
+            self.fetcher(client).iter_query_frames(
+                QueryBase(1, "test"),
+                job_id="job",
+                batch_size=2,
+                amount_columns=["amount"],
+            )
+        )
+        self.assertEqual([len(frame) for frame in frames], [2, 1])
+        self.assertEqual(frames[1]["amount"].tolist(), [Decimal("3.5")])
+        # other columns are not typed per batch
+        self.assertEqual(frames[0]["ratio"].tolist(), ["1", "1"])
+
+    def test_dashboard_slippage_is_summed_per_batch(self):
+        header = "solver_address,solver_name,eth_slippage_wei\n"
+        client = StubDuneClient(
+            [
+                header + f"0x1,one,{10**30}\n0x2,two,-5\n",
+                header + "0x1,one,1.5\n0x3,three,7\n",
+            ]
+        )
+        slippage = self.fetcher(client).get_dashboard_slippage(
+            job_id="job", batch_size=2
+        )
+        self.assertEqual(slippage["solver_address"].tolist(), ["0x1", "0x2", "0x3"])
+        self.assertEqual(
+            slippage["eth_slippage_wei"].tolist(),
+            [Decimal(10**30) + Decimal("1.5"), -5, 7],
+        )
+        self.assertEqual(slippage["solver_name"].tolist(), ["one", "two", "three"])
+
+    def test_sharded_dashboard_slippage(self):
+        client = StubDuneExecutions()
+        fetcher = self.fetcher(client)
+        slippage = fetcher.get_dashboard_slippage(shard_length=timedelta(hours=12))
+        self.assertEqual(len(client.executed), 14)
+        self.assertEqual(slippage["solver_address"].tolist(), ["0x1", "0x2"])
+        self.assertEqual(slippage["eth_slippage_wei"].tolist(), [7 * 24, 7 * 10**30])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,58 @@
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+PROJECT_ROOT = Path(__file__).parent.parent.parent
+# Budget for the time spent executing the bodies of the project's own modules on import
+# (i.e. excluding third party imports). Import should not do any real work.
+SRC_IMPORT_BUDGET_US = 200_000
+ENTRY_POINTS = [
+    "src.fetch.transfer_file",
+    "src.fetch.prefetch",
+    "src.fetch.backfill",
+    "src.fetch.preview",
+]
+
+
+def import_times(module: str) -> tuple[dict[str, int], str]:
+    """Imports module in a fresh interpreter without any configuration in the
+    environment. Returns self import times in microseconds per module and the output."""
+    env = {
+        key: value
+        for key, value in os.environ.items()
+        if not key.startswith(("NETWORK", "NODE_URL", "PAYOUTS_SAFE", "DUNE"))
+    }
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=PROJECT_ROOT,
+        env=env,
+        capture_output=True,
+        text=True,
+        check=False,
+    )
+    assert result.returncode == 0, result.stderr
+    times = {}
+    output = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:"):
+            output.append(line)
+            continue
+        self_us, _, name = line.removeprefix("import time:").split("|")
+        if self_us.strip().isdigit():
+            times[name.strip()] = int(self_us)
+    return times, "\n".join(output) + result.stdout
+
+
+@pytest.mark.parametrize("module", ENTRY_POINTS)
+def test_import_is_lazy(module):
+    times, output = import_times(module)
+    assert module in times
+    assert "web3" not in output.lower(), output
+
+    src_time = sum(time for name, time in times.items() if name.startswith("src"))
+    assert src_time < SRC_IMPORT_BUDGET_US, sorted(
+        times.items(), key=lambda item: -item[1]
+    )[:10]
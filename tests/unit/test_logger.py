@@ -0,0 +1,113 @@
+import json
+import logging
+import os
+import queue
+import subprocess
+import sys
+import unittest
+from logging.handlers import QueueHandler
+from pathlib import Path
+from unittest.mock import patch
+
+from src.logger import (
+    _LISTENERS,
+    ContextFilter,
+    JsonFormatter,
+    _TargetQueueHandler,
+    log_context,
+    logging_started,
+    set_log,
+    start_logging,
+    stop_logging,
+)
+
+
+class TestLogger(unittest.TestCase):
+    def test_configured_once_with_queue_handlers(self):
+        set_log("src.fetch.test")
+        handlers = list(logging.getLogger("src.fetch").handlers)
+        set_log("src.fetch.other_test")
+        self.assertEqual(logging.getLogger("src.fetch").handlers, handlers)
+        self.assertTrue(handlers)
+        self.assertTrue(all(isinstance(h, QueueHandler) for h in handlers))
+
+    def test_json_records_carry_context(self):
+        record = logging.LogRecord(
+            "src.test", logging.INFO, "", 0, "hi %s", ("x",), None
+        )
+        with log_context(network="mainnet", period="2024-01-02"):
+            with log_context(stage="payouts"):
+                ContextFilter().filter(record)
+        entry = json.loads(JsonFormatter().format(record))
+        self.assertEqual(entry["message"], "hi x")
+        self.assertEqual(
+            (entry["network"], entry["period"], entry["stage"]),
+            ("mainnet", "2024-01-02", "payouts"),
+        )
+
+    def test_context_is_reset(self):
+        record = logging.LogRecord("src.test", logging.INFO, "", 0, "hi", (), None)
+        with log_context(stage="fetch"):
+            pass
+        ContextFilter().filter(record)
+        self.assertNotIn("stage", json.loads(JsonFormatter().format(record)))
+
+    def test_queued_records_keep_exceptions(self):
+        records = queue.SimpleQueue()
+        handler = _TargetQueueHandler(records, logging.NullHandler())
+        try:
+            raise ValueError("boom")
+        except ValueError:
+            record = logging.LogRecord(
+                "src.test", logging.ERROR, "", 0, "failed %s", ("x",), sys.exc_info()
+            )
+        # records are only queued while a listener runs in the process
+        with patch.dict(_LISTENERS, {os.getpid(): None}):
+            handler.handle(record)
+        entry = json.loads(JsonFormatter().format(records.get_nowait()))
+        self.assertEqual(entry["message"], "failed x")
+        self.assertIn("ValueError: boom", entry["exception"])
+
+    def test_import_starts_no_thread(self):
+        result = subprocess.run(
+            [
+                sys.executable,
+                "-c",
+                "import threading, src.fetch.transfer_file; "
+                "print(threading.active_count())",
+            ],
+            cwd=Path(__file__).parent.parent.parent,
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+        self.assertEqual(result.stdout.strip(), "1")
+
+    def test_records_are_emitted_with_and_without_listener(self):
+        target = logging.Handler()
+        emitted = []
+        target.emit = emitted.append
+        handler = _TargetQueueHandler(queue.SimpleQueue(), target)
+        record = logging.LogRecord("src.test", logging.INFO, "", 0, "hi", (), None)
+        # no listener runs (e.g. in a worker process): emitted right away
+        handler.handle(record)
+        self.assertEqual(len(emitted), 1)
+        with patch.dict(_LISTENERS, {os.getpid(): None}):
+            handler.handle(record)
+        self.assertEqual(len(emitted), 1)
+
+    def test_started_listener_is_stopped(self):
+        stop_logging()
+        self.addCleanup(stop_logging)
+        with logging_started():
+            self.assertIn(os.getpid(), _LISTENERS)
+            # a running listener is not started again, nor stopped by nested blocks
+            self.assertFalse(start_logging())
+            with logging_started():
+                pass
+            self.assertIn(os.getpid(), _LISTENERS)
+        self.assertNotIn(os.getpid(), _LISTENERS)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -19,6 +19,7 @@ ONE_ETH = 10**18
 class TestTransfer(unittest.TestCase):
     def setUp(self) -> None:
         self.payment_config = PaymentConfig.from_network(Network.MAINNET)
+        self.web3 = Web3(Web3.HTTPProvider("https://ethereum-rpc.publicnode.com"))
         self.token_1 = Token(Address.from_int(1), 18)
         self.token_2 = Token(Address.from_int(2), 18)
 
@@ -40,7 +41,7 @@ class TestTransfer(unittest.TestCase):
             ),
         )
         erc20_transfer = Transfer(
-            token=Token(self.payment_config.cow_token_address),
+            token=Token(self.payment_config.cow_token_address, web3=self.web3),
             recipient=Address(receiver),
             amount_wei=15,
         )
@@ -96,6 +97,27 @@ class TestTransfer(unittest.TestCase):
             ),
         )
 
+    def test_consolidate(self):
+        receiver_1, receiver_2 = Address.from_int(10), Address.from_int(11)
+        consolidated = Transfer.consolidate(
+            [
+                Transfer(token=self.token_1, recipient=receiver_1, amount_wei=1),
+                Transfer(token=None, recipient=receiver_1, amount_wei=2),
+                Transfer(token=self.token_1, recipient=receiver_2, amount_wei=4),
+                Transfer(token=self.token_1, recipient=receiver_1, amount_wei=8),
+                Transfer(token=self.token_2, recipient=receiver_1, amount_wei=16),
+            ]
+        )
+        self.assertEqual(
+            [(t.token, t.recipient, t.amount_wei) for t in consolidated],
+            [
+                (self.token_1, receiver_1, 9),
+                (None, receiver_1, 2),
+                (self.token_1, receiver_2, 4),
+                (self.token_2, receiver_1, 16),
+            ],
+        )
+
     def test_summarize(self):
         receiver = Address.from_int(1)
         eth_amount = 123456789101112131415
@@ -104,7 +126,7 @@ class TestTransfer(unittest.TestCase):
             [
                 Transfer(token=None, recipient=receiver, amount_wei=eth_amount),
                 Transfer(
-                    token=Token(self.payment_config.cow_token_address),
+                    token=Token(self.payment_config.cow_token_address, web3=self.web3),
                     recipient=receiver,
                     amount_wei=cow_amount,
                 ),
@@ -8,7 +8,11 @@ from src.abis.load import weth9
 from src.config import Network, PaymentConfig
 from src.fetch.transfer_file import Transfer
 from src.models.token import Token
-from src.multisend import build_encoded_multisend, prepend_unwrap_if_necessary
+from src.multisend import (
+    build_encoded_multisend,
+    chunk_transactions,
+    prepend_unwrap_if_necessary,
+)
 
 
 class TestMultiSend(unittest.TestCase):
@@ -67,9 +71,21 @@ class TestMultiSend(unittest.TestCase):
                 wrapped_native_token=self.payment_config.wrapped_native_token_address,
             )
 
+    def test_chunk_transactions(self):
+        transactions = [
+            Transfer(
+                token=None, recipient=Address.zero(), amount_wei=n
+            ).as_multisend_tx()
+            for n in range(1, 8)
+        ]
+        chunks = chunk_transactions(transactions, gas_per_transaction=10, gas_limit=35)
+        self.assertEqual([len(chunk) for chunk in chunks], [3, 3, 1])
+        self.assertEqual([tx for chunk in chunks for tx in chunk], transactions)
+        self.assertEqual(chunk_transactions([]), [])
+
     def test_multisend_encoding(self):
         receiver = Address("0xde786877a10dbb7eba25a4da65aecf47654f08ab")
-        cow_token = Token(self.payment_config.cow_token_address)
+        cow_token = Token(self.payment_config.cow_token_address, web3=self.client.w3)
         self.assertEqual(
             build_encoded_multisend([], client=self.client),
             bytes.fromhex(
@@ -0,0 +1,223 @@
+import tempfile
+import unittest
+from datetime import datetime
+from pathlib import Path
+
+from pandas import DataFrame
+
+from src.config import AccountingConfig, Network
+from src.fetch.dune import (
+    DASHBOARD_SLIPPAGE_AMOUNT_COLUMNS,
+    DASHBOARD_SLIPPAGE_KEY_COLUMNS,
+)
+from src.fetch.partials import (
+    PartialStore,
+    accumulate,
+    completed_days,
+    dashboard_slippage_fetcher,
+    period_aggregate,
+    running_day,
+)
+from src.models.accounting_period import AccountingPeriod
+from src.pg_client import FileDBFetcher, accounting_period_string
+from tests.unit.test_dune import StubDuneExecutions
+
+
+class StandInQuery:
+    """Daily slippage per solver, counting the days which were fetched"""
+
+    def __init__(self):
+        self.fetched: list[str] = []
+
+    def __call__(self, day: AccountingPeriod) -> DataFrame:
+        self.fetched.append(str(day))
+        index = day.start.day
+        return DataFrame(
+            [
+                {"solver": "0x1", "name": "one", "slippage": 10**24 + index, "rate": 2},
+                {"solver": "0x2", "name": "two", "slippage": -index, "rate": 2},
+            ]
+        )
+
+
+class TestPartials(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.store = PartialStore(Path(self.tmp_dir.name))
+        self.period = AccountingPeriod("2024-01-02")
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_completed_days(self):
+        days = completed_days(self.period, now=datetime(2024, 1, 4, 12))
+        self.assertEqual(
+            [str(day) for day in days],
+            [
+                "2024-01-02-to-2024-01-03",
+                "2024-01-03-to-2024-01-04",
+            ],
+        )
+        self.assertEqual(completed_days(self.period, now=datetime(2024, 1, 2, 23)), [])
+        # the data of a day is only complete some time after its end
+        self.assertEqual(completed_days(self.period, now=datetime(2024, 1, 3, 1)), [])
+
+    def test_running_day(self):
+        self.assertEqual(
+            str(running_day(self.period, now=datetime(2024, 1, 4, 12, 30))),
+            "2024-01-04T0000-to-2024-01-04T1000",
+        )
+        # the previous day has not ended `DATA_DELAY` ago yet
+        self.assertEqual(
+            str(running_day(self.period, now=datetime(2024, 1, 4, 1))),
+            "2024-01-03T0000-to-2024-01-03T2300",
+        )
+        self.assertIsNone(running_day(self.period, now=datetime(2024, 1, 2, 1)))
+        self.assertIsNone(running_day(self.period, now=datetime(2024, 1, 10)))
+
+    def test_only_missing_days_are_fetched(self):
+        query = StandInQuery()
+        preview = period_aggregate(
+            self.store,
+            Network.MAINNET,
+            self.period,
+            query,
+            ["solver"],
+            ["slippage"],
+            now=datetime(2024, 1, 5, 12),
+        )
+        self.assertEqual(len(query.fetched), 3)
+        self.assertEqual(list(preview["slippage"]), [3 * 10**24 + 9, -9])
+
+        closed = period_aggregate(
+            self.store,
+            Network.MAINNET,
+            self.period,
+            query,
+            ["solver"],
+            ["slippage"],
+            now=datetime(2024, 1, 10),
+        )
+        self.assertEqual(len(query.fetched), 7)
+        self.assertEqual(query.fetched[-1], "2024-01-08-to-2024-01-09")
+        self.assertEqual(list(closed["slippage"]), [7 * 10**24 + 35, -35])
+        self.assertEqual(list(closed["name"]), ["one", "two"])
+        # only whitelisted columns are added up
+        self.assertEqual(list(closed["rate"]), [2, 2])
+        # exact python integers, also for the stored partials
+        self.assertIsInstance(closed["slippage"][0], int)
+
+    def test_networks_are_stored_separately(self):
+        query = StandInQuery()
+        now = datetime(2024, 1, 3, 12)
+        period_aggregate(
+            self.store,
+            Network.MAINNET,
+            self.period,
+            query,
+            ["solver"],
+            ["slippage"],
+            now,
+        )
+        period_aggregate(
+            self.store,
+            Network.GNOSIS,
+            self.period,
+            query,
+            ["solver"],
+            ["slippage"],
+            now,
+        )
+        self.assertEqual(len(query.fetched), 2)
+
+    def test_missing_additive_column(self):
+        with self.assertRaises(ValueError):
+            period_aggregate(
+                self.store,
+                Network.MAINNET,
+                self.period,
+                StandInQuery(),
+                ["solver"],
+                ["slippage", "reward"],
+                now=datetime(2024, 1, 3, 12),
+            )
+        # incomplete partials are not stored
+        self.assertFalse(
+            any(
+                self.store.has(Network.MAINNET, day)
+                for day in completed_days(self.period)
+            )
+        )
+
+    def test_period_not_started(self):
+        with self.assertRaises(ValueError):
+            period_aggregate(
+                self.store,
+                Network.MAINNET,
+                self.period,
+                StandInQuery(),
+                ["solver"],
+                ["slippage"],
+                now=datetime(2024, 1, 1),
+            )
+
+    def test_empty_partials_are_not_stored(self):
+        # the analytics tables only hold rows of weekly accounting periods
+        DataFrame(
+            {
+                "accounting_period": [accounting_period_string(self.period)] * 2,
+                "solver": ["0x" + "1" * 40, "0x" + "2" * 40],
+                "pool_address": ["0x" + "3" * 40] * 2,
+                "reward_target": ["0x" + "1" * 40, "0x" + "2" * 40],
+                "sum_slippage_native": [10**17, -(10**16)],
+            }
+        ).to_parquet(
+            Path(self.tmp_dir.name)
+            / "fct_data_per_solver_and_accounting_period.parquet"
+        )
+        orderbook = FileDBFetcher(Path(self.tmp_dir.name))
+        config = AccountingConfig.from_network(Network.MAINNET)
+        days = completed_days(self.period, now=datetime(2024, 1, 4, 12))
+        partials = accumulate(
+            self.store,
+            Network.MAINNET,
+            days,
+            lambda day: orderbook.get_data_per_solver(day, config),
+            ["solver", "sum_slippage_native"],
+        )
+        self.assertTrue(all(partial.empty for partial in partials))
+        self.assertFalse(any(self.store.has(Network.MAINNET, day) for day in days))
+        with self.assertRaises(ValueError):
+            period_aggregate(
+                self.store,
+                Network.MAINNET,
+                self.period,
+                lambda day: orderbook.get_data_per_solver(day, config),
+                ["solver"],
+                ["sum_slippage_native"],
+                now=datetime(2024, 1, 4, 12),
+            )
+
+    def test_dashboard_slippage_partials(self):
+        dune = StubDuneExecutions()
+        aggregate = period_aggregate(
+            self.store,
+            Network.MAINNET,
+            self.period,
+            dashboard_slippage_fetcher(dune, "ethereum"),
+            DASHBOARD_SLIPPAGE_KEY_COLUMNS,
+            DASHBOARD_SLIPPAGE_AMOUNT_COLUMNS,
+            now=datetime(2024, 1, 5, 12),
+        )
+        # one execution per day, bounded by the day
+        self.assertEqual(
+            sorted(dune.executed.values())[0],
+            (datetime(2024, 1, 2), datetime(2024, 1, 3)),
+        )
+        self.assertEqual(len(dune.executed), 3)
+        self.assertEqual(aggregate["solver_address"].tolist(), ["0x1", "0x2"])
+        self.assertEqual(aggregate["eth_slippage_wei"].tolist(), [3 * 24, 3 * 10**30])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,98 @@
+import unittest
+from datetime import datetime
+from decimal import Decimal
+from fractions import Fraction
+from unittest.mock import patch
+
+from pandas import DataFrame
+
+from src.config import AccountingConfig, Network
+from src.fetch import payouts
+from src.fetch.payouts import (
+    RewardAndPenaltyDatum,
+    compute_partner_payouts,
+    compute_solver_payouts,
+    prepare_payouts,
+    resolve_exchange_rate_native_to_eth,
+    summarize_payments,
+)
+from src.models.accounting_period import AccountingPeriod
+
+SOLVERS = ["0x" + "1" * 40, "0x" + "2" * 40, "0x" + "3" * 40]
+
+
+def data_per_solver_frame(batch_reward_cow: list[Decimal]) -> DataFrame:
+    """Analytics data of three solvers which pay service fees"""
+    return DataFrame(
+        {
+            "solver": SOLVERS,
+            "solver_name": ["one", "two", "three"],
+            "sum_batch_reward_native": [Decimal(10**18), Decimal(0), Decimal(10**17)],
+            "sum_batch_reward_cow": batch_reward_cow,
+            "consistency_reward_native": [Decimal(0)] * 3,
+            "consistency_reward_cow": [Decimal(0)] * 3,
+            "sum_quote_reward_cow": [Decimal(0)] * 3,
+            "sum_protocol_fee_native": [Decimal(0)] * 3,
+            "sum_network_fee_native": [Decimal(0)] * 3,
+            "sum_slippage_native": [Decimal(0), Decimal(-(10**16)), Decimal(0)],
+            "reward_target": SOLVERS,
+            "pool_address": SOLVERS,
+            "service_fee_enabled": [True] * 3,
+        }
+    )
+
+
+def partner_and_protocol_fees_frame() -> DataFrame:
+    """Partner and protocol fees of one partner"""
+    return DataFrame(
+        {
+            "partner_fee_recipient": ["0x" + "4" * 40],
+            "sum_partner_fee_native": [Decimal(10**16)],
+            "partner_fee_cut": [0.15],
+            "sum_protocol_fee_native": [Decimal(10**16)],
+        }
+    )
+
+
+class TestResolveExchangeRate(unittest.TestCase):
+    period_end = datetime(2024, 9, 3)
+
+    def test_eth_native_networks_need_no_fetch(self):
+        for network in [Network.MAINNET, Network.ARBITRUM_ONE, Network.BASE]:
+            config = AccountingConfig.from_network(network)
+            with patch.object(payouts, "exchange_rate_atoms") as fetch:
+                rate = resolve_exchange_rate_native_to_eth(self.period_end, config)
+            self.assertEqual(rate, 1)
+            fetch.assert_not_called()
+
+    def test_missing_rate_is_fetched(self):
+        config = AccountingConfig.from_network(Network.GNOSIS)
+        with patch.object(
+            payouts, "exchange_rate_atoms", return_value=Fraction(1, 2000)
+        ) as fetch, patch.object(payouts, "prefetch_usd_prices"):
+            rate = resolve_exchange_rate_native_to_eth(self.period_end, config)
+        self.assertEqual(rate, Fraction(1, 2000))
+        fetch.assert_called_once()
+
+
+class TestFractionalAmounts(unittest.TestCase):
+    def test_fractional_reward(self):
+        config = AccountingConfig.from_network(Network.MAINNET)
+        period = AccountingPeriod("2024-01-02")
+        # numeric values of the analytics database as parsed by `read_sql_query`
+        data_per_solver = data_per_solver_frame(
+            [Decimal("12.5"), Decimal("-7.5"), Decimal(10**21)]
+        )
+        solver_payouts = compute_solver_payouts(data_per_solver, config)
+        self.assertEqual(sorted(solver_payouts["primary_reward_cow"]), [-7, 12, 10**21])
+        partner_payouts = compute_partner_payouts(partner_and_protocol_fees_frame())
+        summarize_payments(
+            solver_payouts, partner_payouts, Fraction(10**4), Fraction(1), config
+        )
+        for _, row in solver_payouts.iterrows():
+            RewardAndPenaltyDatum.from_series(row).total_service_fee()
+        prepare_payouts(solver_payouts, partner_payouts, period, config)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,154 @@
+import os
+import tempfile
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+import pandas as pd
+from pandas import DataFrame
+
+from src.config import AccountingConfig, Network
+from src.fetch.payouts import compute_partner_payouts, compute_solver_payouts
+from src.models.accounting_period import AccountingPeriod
+from src.pg_client import (
+    FileDBFetcher,
+    MultiInstanceDBFetcher,
+    accounting_period_string,
+    analytics_fetcher,
+    normalize_hex,
+)
+from tests.bench.synthetic import (
+    data_per_solver_frame,
+    partner_and_protocol_fees_frame,
+)
+
+SOLVER = "0x" + "ab" * 20
+
+
+class TestNormalizeHex(unittest.TestCase):
+    def test_formats(self):
+        for value in [
+            bytes.fromhex("ab" * 20),
+            memoryview(bytes.fromhex("ab" * 20)),
+            SOLVER,
+            SOLVER.upper().replace("0X", "0x"),
+            "\\x" + "ab" * 20,
+            " " + "ab" * 20,
+        ]:
+            self.assertEqual(normalize_hex(value), SOLVER)
+        for value in [None, float("nan"), b"", "", "0x"]:
+            self.assertIsNone(normalize_hex(value))
+        with self.assertRaises(ValueError):
+            normalize_hex(12)
+
+
+class TestFileDBFetcher(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.input_dir = Path(self.tmp_dir.name)
+        self.config = AccountingConfig.from_network(Network.MAINNET)
+        self.periods = AccountingPeriod.split_range("2024-01-02", "2024-01-16")
+
+    def tearDown(self) -> None:
+        self.tmp_dir.cleanup()
+
+    def test_parquet_export(self):
+        data_per_solver = data_per_solver_frame(100, self.periods[0])
+        exported = data_per_solver.copy()
+        # addresses as stored in the database
+        exported["solver"] = [bytes.fromhex(s[2:]) for s in exported["solver"]]
+        exported = pd.concat([exported, data_per_solver_frame(5, self.periods[1])])
+        directory = self.input_dir / "mainnet"
+        directory.mkdir()
+        exported.to_parquet(
+            directory / "fct_data_per_solver_and_accounting_period.parquet"
+        )
+        fees = partner_and_protocol_fees_frame(100, self.periods[0])
+        fees.to_parquet(directory / "fct_partner_and_protocol_fees.parquet")
+
+        orderbook = FileDBFetcher(self.input_dir)
+        result = orderbook.get_data_per_solver(self.periods[0], self.config)
+        self.assertEqual(len(result), 100)
+        self.assertEqual(list(result["solver"]), list(data_per_solver["solver"]))
+        self.assertEqual(
+            list(compute_solver_payouts(result, self.config)["primary_reward_eth"]),
+            list(
+                compute_solver_payouts(data_per_solver, self.config)[
+                    "primary_reward_eth"
+                ]
+            ),
+        )
+        self.assertEqual(
+            len(
+                compute_partner_payouts(
+                    orderbook.get_partner_and_protocol_fees(
+                        self.periods[0], self.config
+                    )
+                )
+            ),
+            len(compute_partner_payouts(fees)),
+        )
+
+        # checkpoints of fetched data are keyed by the exported files
+        source = orderbook.source(self.config)
+        fees.head(10).to_parquet(directory / "fct_partner_and_protocol_fees.parquet")
+        self.assertNotEqual(orderbook.source(self.config), source)
+
+    def test_csv_exports(self):
+        period = accounting_period_string(self.periods[0])
+        # exports of prod and staging, as written by psql
+        for environment, amount in [("prod", str(10**30 + 1)), ("staging", "5")]:
+            DataFrame(
+                {
+                    "ACCOUNTING_PERIOD": [period],
+                    "partner_fee_recipient": ["\\x" + "ab" * 20],
+                    "sum_partner_fee_native": [amount],
+                    "partner_fee_cut": [0.15],
+                    "sum_protocol_fee_native": [amount],
+                }
+            ).to_csv(
+                self.input_dir / f"fct_partner_and_protocol_fees_{environment}.csv",
+                index=False,
+            )
+        orderbook = FileDBFetcher(self.input_dir, memory_map=False)
+        result = orderbook.get_partner_and_protocol_fees(self.periods, self.config)
+        self.assertEqual(list(result["partner_fee_recipient"]), [SOLVER, SOLVER])
+        self.assertEqual(list(result["sum_partner_fee_native"]), [10**30 + 1, 5])
+        self.assertEqual(list(result["partner_fee_cut"]), [0.15, 0.15])
+
+        # the other table was not exported
+        with self.assertRaises(FileNotFoundError):
+            orderbook.get_data_per_solver(self.periods, self.config)
+
+    def test_freshness(self):
+        def fingerprint(writes: str) -> str:
+            result = DataFrame({"row_count": [3], "writes": [writes]})
+            with (
+                patch("src.pg_client.analytics_engine"),
+                patch.object(
+                    MultiInstanceDBFetcher, "exec_query", return_value=result
+                ) as exec_query,
+            ):
+                freshness = MultiInstanceDBFetcher().freshness(
+                    self.periods[0], self.config
+                )
+            # one query per table and environment
+            self.assertEqual(exec_query.call_count, 4)
+            self.assertIn(
+                accounting_period_string(self.periods[0]), exec_query.call_args[0][0]
+            )
+            return freshness
+
+        self.assertEqual(fingerprint("16384:3:0:0"), fingerprint("16384:3:0:0"))
+        self.assertNotEqual(fingerprint("16384:3:0:0"), fingerprint("16384:6:0:3"))
+
+    def test_analytics_fetcher(self):
+        with patch.dict(os.environ, {"ANALYTICS_INPUT_DIR": str(self.input_dir)}):
+            self.assertIsInstance(analytics_fetcher(), FileDBFetcher)
+        with patch.dict(os.environ, {"ANALYTICS_INPUT_DIR": ""}):
+            self.assertNotIsInstance(analytics_fetcher(), FileDBFetcher)
+            self.assertIsInstance(analytics_fetcher(), MultiInstanceDBFetcher)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,143 @@
+import json
+import tempfile
+import threading
+import unittest
+import urllib.request
+from datetime import date, datetime, timedelta
+from http.server import ThreadingHTTPServer
+from pathlib import Path
+
+from pandas import DataFrame
+
+from src.config import Network
+from src.fetch.partials import PartialStore
+from src.fetch.preview import (
+    SlippagePreview,
+    current_period_start,
+    preview_handler,
+    refresh_preview,
+)
+from src.models.accounting_period import AccountingPeriod
+
+SOLVERS = ["0x" + "1" * 40, "0x" + "2" * 40]
+
+
+def dashboard_slippage(slippage: list[int]) -> DataFrame:
+    return DataFrame(
+        {
+            "solver_address": SOLVERS,
+            "solver_name": ["one", "two"],
+            "eth_slippage_wei": slippage,
+        }
+    )
+
+
+class StandInDailySlippage:
+    """Dashboard slippage of a (part of a) day, proportional to its hours, counting the
+    days which were fetched"""
+
+    def __init__(self, empty: bool = False):
+        self.fetched: list[str] = []
+        self.empty = empty
+
+    def __call__(self, day: AccountingPeriod) -> DataFrame:
+        self.fetched.append(str(day))
+        hours = (day.end - day.start) // timedelta(hours=1)
+        slippage = dashboard_slippage([hours * 10**15, -hours * 10**16])
+        return slippage.head(0) if self.empty else slippage
+
+
+class TestPreview(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.cache_dir = Path(self.tmp_dir.name)
+        self.period = AccountingPeriod("2024-01-02")
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def preview(self) -> SlippagePreview:
+        return SlippagePreview(Network.MAINNET, self.period, self.cache_dir)
+
+    def test_current_period_start(self):
+        self.assertEqual(current_period_start(date(2024, 1, 2)), "2024-01-02")
+        self.assertEqual(current_period_start(date(2024, 1, 8)), "2024-01-02")
+
+    def test_only_changed_solvers_are_updated(self):
+        preview = self.preview()
+        slippage = dashboard_slippage([0, -(10**17)])
+        self.assertEqual(preview.update(slippage, self.period.start), 2)
+        self.assertEqual(preview.update(slippage, self.period.start), 0)
+
+        changed = dashboard_slippage([0, 10**17])
+        # the cache is persisted, a new preview (e.g. the next cron run) continues from it
+        self.assertEqual(self.preview().update(changed, self.period.start), 1)
+        self.assertEqual(self.preview().update(changed.head(1), self.period.start), 0)
+        self.assertEqual(len(self.preview().solvers), 1)
+
+    def test_summary(self):
+        preview = self.preview()
+        store = PartialStore(self.cache_dir / "partials")
+        daily_data = StandInDailySlippage()
+        refresh_preview(preview, store, daily_data, now=datetime(2024, 1, 2, 1))
+        self.assertEqual(daily_data.fetched, [])
+        self.assertEqual(preview.summary()["elapsed"], 0)
+
+        self.assertEqual(
+            refresh_preview(preview, store, daily_data, now=datetime(2024, 1, 5, 12)),
+            2,
+        )
+        # the ended days and the running day up to the last full hour of complete data
+        self.assertEqual(len(daily_data.fetched), 4)
+        self.assertEqual(daily_data.fetched[-1], "2024-01-05T0000-to-2024-01-05T1000")
+        summary = preview.summary()
+        self.assertEqual(summary["data_until"], "2024-01-05T10:00:00")
+        self.assertAlmostEqual(summary["elapsed"], 82 / 168)
+        self.assertEqual(summary["totals"]["negative_slippage_wei"], -82 * 10**16)
+        self.assertEqual(summary["totals"]["slippage_wei"], 82 * (10**15 - 10**16))
+        self.assertAlmostEqual(
+            summary["projected_totals"]["slippage_wei"] / (168 * (10**15 - 10**16)), 1
+        )
+        self.assertEqual([s["solver_name"] for s in summary["solvers"]], ["one", "two"])
+
+        # hourly refreshes only fetch the running day again
+        self.assertEqual(
+            refresh_preview(preview, store, daily_data, now=datetime(2024, 1, 5, 13)),
+            2,
+        )
+        self.assertEqual(len(daily_data.fetched), 5)
+        refresh_preview(preview, store, daily_data, now=datetime(2024, 1, 6, 12))
+        self.assertEqual(len(daily_data.fetched), 7)
+        self.assertEqual(self.preview().data_until, datetime(2024, 1, 6, 10))
+
+    def test_empty_partials(self):
+        with self.assertRaises(ValueError):
+            refresh_preview(
+                self.preview(),
+                PartialStore(self.cache_dir / "partials"),
+                StandInDailySlippage(empty=True),
+                now=datetime(2024, 1, 5, 12),
+            )
+
+    def test_http_endpoint(self):
+        preview = self.preview()
+        preview.update(dashboard_slippage([0, 0]), datetime(2024, 1, 3))
+        server = ThreadingHTTPServer(
+            ("127.0.0.1", 0), preview_handler({"mainnet": preview})
+        )
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        try:
+            url = f"http://127.0.0.1:{server.server_port}/preview/mainnet"
+            with urllib.request.urlopen(url) as response:
+                body = json.loads(response.read())
+            self.assertEqual(body["period"], str(self.period))
+            with self.assertRaises(urllib.error.HTTPError):
+                urllib.request.urlopen(url.replace("mainnet", "unknown"))
+        finally:
+            server.shutdown()
+            server.server_close()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,182 @@
+import os
+import tempfile
+import threading
+import time
+import unittest
+from datetime import datetime
+from pathlib import Path
+from unittest.mock import patch
+
+from src.fetch import prices
+from src.fetch.prices import (
+    HedgedPriceFetcher,
+    PriceProvider,
+    PriceStore,
+    TokenId,
+    prefetch_usd_prices,
+    usd_price,
+)
+
+
+class StandInProvider(PriceProvider):
+    """Local price provider with configurable latency and answer."""
+
+    def __init__(self, name, price=None, delay=0.0, error=None):
+        self.name = name
+        self.price = price
+        self.delay = delay
+        self.error = error
+        self.calls = 0
+
+    def usd_price(self, token, day):
+        self.calls += 1
+        time.sleep(self.delay)
+        if self.error is not None:
+            raise self.error
+        return self.price
+
+
+class TestPriceStore(unittest.TestCase):
+    def setUp(self) -> None:
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        self.cache_file = os.path.join(tmp_dir.name, "prices.sqlite")
+        env = patch.dict(os.environ, {"PRICE_CACHE_FILE": self.cache_file})
+        env.start()
+        self.addCleanup(env.stop)
+        prices.price_store.cache_clear()
+        self.addCleanup(prices.price_store.cache_clear)
+        prices._PRICES.clear()
+        self.addCleanup(prices._PRICES.clear)
+
+        self.day = datetime(2024, 9, 1)
+        self.fetched: list[tuple[TokenId, datetime]] = []
+        self.lock = threading.Lock()
+
+    def fake_fetch(self, token, day):
+        with self.lock:
+            self.fetched.append((token, day))
+        return 2.5
+
+    def test_store_roundtrip(self):
+        store = PriceStore(Path(self.cache_file))
+        self.assertIsNone(store.get(TokenId.ETH, self.day))
+        store.put(TokenId.ETH, self.day, 2481.89)
+        # a second store on the same file (e.g. in another process) sees the price
+        self.assertEqual(
+            PriceStore(Path(self.cache_file)).get(TokenId.ETH, self.day),
+            2481.89,
+        )
+
+    def test_usd_price_persists_between_processes(self):
+        with patch.object(prices, "fetch_usd_price", self.fake_fetch):
+            self.assertEqual(usd_price(TokenId.COW, self.day), 2.5)
+            # simulate a fresh process
+            prices._PRICES.clear()
+            prices.price_store.cache_clear()
+            self.assertEqual(usd_price(TokenId.COW, self.day), 2.5)
+        self.assertEqual(self.fetched, [(TokenId.COW, self.day)])
+
+    def test_prefetch_fetches_each_miss_once(self):
+        PriceStore(Path(self.cache_file)).put(TokenId.ETH, self.day, 1.0)
+        keys = [(token, self.day) for token in TokenId] * 2
+        with patch.object(prices, "fetch_usd_price", self.fake_fetch):
+            prefetch_usd_prices(keys)
+        self.assertEqual(
+            sorted(token.value for token, _ in self.fetched),
+            sorted(token.value for token in TokenId if token != TokenId.ETH),
+        )
+
+    def test_cache_only(self):
+        with patch.dict(os.environ, {"PRICE_CACHE_ONLY": "true"}), patch.object(
+            prices, "fetch_usd_price", self.fake_fetch
+        ):
+            with self.assertRaises(KeyError):
+                usd_price(TokenId.USDC, self.day)
+        self.assertEqual(self.fetched, [])
+
+
+class TestHedgedPriceFetcher(unittest.TestCase):
+    day = datetime(2024, 9, 1)
+
+    def test_fast_primary_is_not_hedged(self):
+        primary = StandInProvider("primary", price=1.0)
+        secondary = StandInProvider("secondary", price=2.0)
+        fetcher = HedgedPriceFetcher([primary, secondary], hedge_delay=1.0)
+        self.assertEqual(fetcher.usd_price(TokenId.ETH, self.day), 1.0)
+        self.assertEqual(secondary.calls, 0)
+
+    def test_slow_primary_is_hedged(self):
+        primary = StandInProvider("primary", price=1.0, delay=2.0)
+        secondary = StandInProvider("secondary", price=2.0)
+        fetcher = HedgedPriceFetcher([primary, secondary], hedge_delay=0.05)
+        start = time.monotonic()
+        self.assertEqual(fetcher.usd_price(TokenId.ETH, self.day), 2.0)
+        self.assertLess(time.monotonic() - start, 1.0)
+
+    def test_failing_primary_falls_back(self):
+        primary = StandInProvider("primary", error=AssertionError("rate limited"))
+        invalid = StandInProvider("invalid", price=float("nan"))
+        backup = StandInProvider("backup", price=3.0)
+        fetcher = HedgedPriceFetcher([primary, invalid, backup], hedge_delay=10.0)
+        self.assertEqual(fetcher.usd_price(TokenId.ETH, self.day), 3.0)
+
+    def test_all_failing_raises(self):
+        error = ValueError("down")
+        fetcher = HedgedPriceFetcher(
+            [StandInProvider("a", error=error), StandInProvider("b", error=error)],
+            hedge_delay=10.0,
+        )
+        with self.assertRaises(ValueError):
+            fetcher.usd_price(TokenId.ETH, self.day)
+
+    def test_consistency_check(self):
+        providers = [
+            StandInProvider("a", price=100.0),
+            StandInProvider("b", price=101.0),
+        ]
+        fetcher = HedgedPriceFetcher(
+            providers, hedge_delay=10.0, max_relative_deviation=0.02
+        )
+        self.assertEqual(fetcher.usd_price(TokenId.ETH, self.day), 100.0)
+        self.assertEqual([provider.calls for provider in providers], [1, 1])
+
+        fetcher.max_relative_deviation = 0.001
+        with self.assertRaises(ValueError):
+            fetcher.usd_price(TokenId.ETH, self.day)
+
+    def test_unconfirmed_price_is_rejected(self):
+        providers = [
+            StandInProvider("a", price=100.0),
+            StandInProvider("b", error=ValueError("down")),
+        ]
+        fetcher = HedgedPriceFetcher(
+            providers, hedge_delay=10.0, max_relative_deviation=0.02
+        )
+        with self.assertRaises(ValueError):
+            fetcher.usd_price(TokenId.ETH, self.day)
+
+    def test_default_provider(self):
+        with patch.dict(os.environ, {"PRICE_PROVIDERS": ""}):
+            prices.price_fetcher.cache_clear()
+            self.addCleanup(prices.price_fetcher.cache_clear)
+            fetcher = prices.price_fetcher()
+        self.assertEqual(
+            [provider.name for provider in fetcher.providers], ["coinpaprika"]
+        )
+
+    def test_disagreement_asks_next_provider(self):
+        providers = [
+            StandInProvider("a", price=100.0),
+            StandInProvider("b", price=150.0),
+            StandInProvider("c", price=100.5),
+        ]
+        fetcher = HedgedPriceFetcher(
+            providers, hedge_delay=10.0, max_relative_deviation=0.02
+        )
+        self.assertEqual(fetcher.usd_price(TokenId.ETH, self.day), 100.0)
+        self.assertEqual([provider.calls for provider in providers], [1, 1, 1])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,119 @@
+import cProfile
+import pstats
+import tempfile
+import unittest
+import unittest.mock
+from pathlib import Path
+
+from src.logger import log_context
+from src.scheduler import Scheduler
+from src.utils.profiling import (
+    MIN_STACK_FRACTION,
+    collapsed_stacks,
+    configure_profiling,
+    profile_stage,
+)
+
+
+def leaf(n):
+    return sum(i * i for i in range(n))
+
+
+def middle():
+    total = 0
+    for _ in range(5):
+        total += leaf(20_000)
+    return total
+
+
+def root():
+    return middle(), leaf(50_000)
+
+
+class TestProfiling(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.root = Path(self.tmp_dir.name)
+
+    def tearDown(self):
+        configure_profiling(None, self.root)
+        self.tmp_dir.cleanup()
+
+    def test_disabled_by_default(self):
+        with profile_stage("fetch"):
+            root()
+        self.assertFalse((self.root / "profile").exists())
+
+    def test_unknown_mode(self):
+        with self.assertRaises(ValueError):
+            configure_profiling("gpu", self.root)
+
+    def test_profile_files_per_stage(self):
+        configure_profiling("both", self.root)
+        with log_context(period="p", network="gnosis"):
+            with profile_stage("compute"):
+                root()
+        files = sorted(path.name for path in (self.root / "profile").iterdir())
+        self.assertEqual(
+            files,
+            [
+                "p-gnosis-compute-mem.txt",
+                "p-gnosis-compute.collapsed",
+                "p-gnosis-compute.pstats",
+            ],
+        )
+        pstats.Stats(str(self.root / "profile" / "p-gnosis-compute.pstats"))
+        memory = (self.root / "profile" / "p-gnosis-compute-mem.txt").read_text()
+        self.assertTrue(memory.startswith("Peak traced memory: "))
+
+    def test_scheduler_tasks_are_profiled(self):
+        configure_profiling("cpu", self.root)
+        scheduler = Scheduler()
+        scheduler.add("task", middle)
+        with log_context(period="p", network="gnosis"):
+            with profile_stage("fetch"):
+                scheduler.run()
+        collapsed = (self.root / "profile" / "p-gnosis-fetch.collapsed").read_text()
+        self.assertIn("middle (test_profiling.py", collapsed)
+
+    def test_collapsed_stacks_of_many_paths(self):
+        # each of the functions is called by both of the functions of the previous layer,
+        # so there are 2**60 stacks: unlikely ones are truncated
+        layers = [[("f", i, f"f{i}_{j}") for j in range(2)] for i in range(60)]
+        stats = {
+            function: (
+                1,
+                1,
+                1.0 if i == len(layers) - 1 else 0.0,
+                1.0,
+                {caller: (1, 1, 0.0, 1.0) for caller in layers[i - 1]} if i else {},
+            )
+            for i, layer in enumerate(layers)
+            for function in layer
+        }
+        profile = unittest.mock.Mock(stats=stats)
+        stacks = collapsed_stacks(profile)
+        self.assertAlmostEqual(sum(stacks.values()), 2.0)
+        self.assertLessEqual(len(stacks), 2 * (1 / MIN_STACK_FRACTION + 1))
+        self.assertTrue(any(stack.startswith("...;") for stack in stacks))
+
+    def test_collapsed_stacks(self):
+        profiler = cProfile.Profile()
+        profiler.enable()
+        root()
+        profiler.disable()
+        stacks = collapsed_stacks(pstats.Stats(profiler))
+
+        leaf_stacks = [
+            stack for stack in stacks if stack.split(";")[-1].startswith("leaf")
+        ]
+        callers = {stack.split(";")[-2].split(" ")[0] for stack in leaf_stacks}
+        self.assertEqual(callers, {"middle", "root"})
+        # all own time is attributed to some stack
+        stats = pstats.Stats(profiler).stats
+        own_time = sum(timing[2] for timing in stats.values())
+        self.assertAlmostEqual(sum(stacks.values()), own_time, delta=own_time * 0.01)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,102 @@
+import tempfile
+import unittest
+from io import BytesIO
+from pathlib import Path
+from types import SimpleNamespace
+
+from dune_client.models import ExecutionResultCSV, ExecutionState
+
+from src.fetch.dune import DuneFetcher
+from src.fetch.prefetch import period_queries, prefetch
+from src.fetch.result_store import DuneResultStore
+from src.config import Network
+from src.models.accounting_period import AccountingPeriod
+
+
+class RecordingDuneClient:
+    """Dune client stand-in recording the order of calls."""
+
+    def __init__(self):
+        self.calls: list[str] = []
+
+    def execute_query(self, query):
+        self.calls.append(f"execute {query.query_id}")
+        return SimpleNamespace(execution_id=f"job-{len(self.calls)}")
+
+    def get_execution_status(self, job_id):
+        self.calls.append(f"status {job_id}")
+        return SimpleNamespace(state=ExecutionState.COMPLETED, error=None)
+
+    def get_execution_results_csv(self, job_id, limit, offset):
+        return ExecutionResultCSV(
+            data=BytesIO(b"start_block,end_block\n1,2\n"), next_offset=None
+        )
+
+
+class OneFailingDuneClient(RecordingDuneClient):
+    """Dune client stand-in whose first execution fails."""
+
+    def get_execution_status(self, job_id):
+        if job_id == "job-1":
+            return SimpleNamespace(state=ExecutionState.FAILED, error="timeout")
+        return super().get_execution_status(job_id)
+
+
+class FailingDuneClient:
+    def __getattr__(self, item):
+        raise AssertionError(f"Unexpected call to Dune client: {item}")
+
+
+class TestDuneResultStore(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.store = DuneResultStore(Path(self.tmp_dir.name))
+        self.period = AccountingPeriod("2024-01-02")
+        self.queries = period_queries([Network.MAINNET, Network.GNOSIS], self.period)
+
+    def tearDown(self) -> None:
+        self.tmp_dir.cleanup()
+
+    def test_key_depends_on_parameters(self):
+        keys = {self.store.key(query) for query in self.queries}
+        self.assertEqual(len(keys), len(self.queries))
+
+    def test_save_pages(self):
+        query = self.queries[0]
+        self.assertIsNone(self.store.execution_id(query))
+        self.store.save(query, "job", [BytesIO(b"a,b\n1,2\n"), BytesIO(b"a,b\n3,4\n")])
+        self.assertEqual(self.store.execution_id(query), "job")
+        self.assertEqual(
+            self.store.load_rows(query), [{"a": "1", "b": "2"}, {"a": "3", "b": "4"}]
+        )
+
+    def test_prefetch_starts_all_executions_first(self):
+        client = RecordingDuneClient()
+        self.store.save(self.queries[0], "stored", [BytesIO(b"a\n1\n")])
+        prefetch(client, self.queries, self.store)
+
+        executions = [call for call in client.calls if call.startswith("execute")]
+        self.assertEqual(len(executions), len(self.queries) - 1)
+        self.assertTrue(
+            all(call.startswith("execute") for call in client.calls[: len(executions)])
+        )
+        self.assertEqual(self.store.execution_id(self.queries[0]), "stored")
+
+    def test_prefetch_stores_results_after_a_failure(self):
+        with self.assertRaises(RuntimeError):
+            prefetch(OneFailingDuneClient(), self.queries, self.store)
+        self.assertIsNone(self.store.execution_id(self.queries[0]))
+        self.assertTrue(
+            all(self.store.execution_id(query) for query in self.queries[1:])
+        )
+
+    def test_fetcher_reads_stored_results(self):
+        prefetch(RecordingDuneClient(), self.queries, self.store)
+        fetcher = DuneFetcher(
+            FailingDuneClient(), "ethereum", self.period, result_store=self.store
+        )
+        self.assertEqual((fetcher.start_block, fetcher.end_block), ("1", "2"))
+
+
+if __name__ == "__main__":
+    unittest.main()
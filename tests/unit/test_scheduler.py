@@ -0,0 +1,71 @@
+import threading
+import time
+import unittest
+
+from src.logger import current_log_context, log_context
+from src.scheduler import Scheduler
+
+
+class TestScheduler(unittest.TestCase):
+    def test_independent_tasks_run_concurrently(self):
+        scheduler = Scheduler()
+        for name in ("block_interval", "data_per_solver", "prices"):
+            scheduler.add(name, lambda: time.sleep(0.2))
+        start = time.perf_counter()
+        scheduler.run()
+        self.assertLess(time.perf_counter() - start, 0.5)
+
+    def test_results_are_passed_downstream(self):
+        scheduler = Scheduler()
+        scheduler.add("a", lambda: 2)
+        scheduler.add("b", lambda: 3)
+        scheduler.add("product", lambda a, b: a * b, after=["a", "b"])
+        scheduler.add("square", lambda product: product**2, after=["product"])
+        self.assertEqual(scheduler.run(), {"a": 2, "b": 3, "product": 6, "square": 36})
+
+    def test_resource_limits(self):
+        lock = threading.Lock()
+        running, most = [0], [0]
+
+        def query():
+            with lock:
+                running[0] += 1
+                most[0] = max(most[0], running[0])
+            time.sleep(0.05)
+            with lock:
+                running[0] -= 1
+
+        scheduler = Scheduler({"database": 2})
+        for index in range(6):
+            scheduler.add(f"query_{index}", query, resource="database")
+        scheduler.run()
+        self.assertEqual(most[0], 2)
+
+    def test_failure(self):
+        ran = []
+        scheduler = Scheduler()
+        scheduler.add("fails", lambda: 1 / 0)
+        scheduler.add("slow", lambda: time.sleep(0.1) or ran.append("slow"))
+        scheduler.add("after", lambda fails: ran.append("after"), after=["fails"])
+        with self.assertRaises(ZeroDivisionError):
+            scheduler.run()
+        # running tasks complete, dependent tasks are not started
+        self.assertEqual(ran, ["slow"])
+
+    def test_declaration_errors(self):
+        scheduler = Scheduler()
+        scheduler.add("a", lambda: None)
+        with self.assertRaises(ValueError):
+            scheduler.add("a", lambda: None)
+        with self.assertRaises(ValueError):
+            scheduler.add("b", lambda c: None, after=["c"])
+
+    def test_log_context(self):
+        scheduler = Scheduler()
+        scheduler.add("context", current_log_context)
+        with log_context(network="gnosis"):
+            self.assertEqual(scheduler.run()["context"], {"network": "gnosis"})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,72 @@
+import unittest
+from datetime import datetime, timedelta
+
+from pandas import DataFrame
+
+from src.fetch.sharding import check_merged, fetch_sharded, merge_additive
+from src.models.accounting_period import AccountingPeriod
+
+# hourly volume per solver, the stand-in for a query summing over a period
+HOURLY = {
+    "0x1": lambda hour: 10**18 + hour,
+    "0x2": lambda hour: 3 * hour if hour % 24 < 12 else 0,
+}
+
+
+def stand_in_query(period: AccountingPeriod) -> DataFrame:
+    week_start = datetime(2024, 1, 2)
+    first = int((period.start - week_start) / timedelta(hours=1))
+    last = int((period.end - week_start) / timedelta(hours=1))
+    rows = []
+    for solver, volume in HOURLY.items():
+        total = sum(volume(hour) for hour in range(first, last))
+        if total:
+            rows.append({"solver": solver, "name": f"solver {solver}", "volume": total})
+    return DataFrame(rows, columns=["solver", "name", "volume"])
+
+
+class TestSubPeriods(unittest.TestCase):
+    def test_split_into_days(self):
+        period = AccountingPeriod("2024-01-02")
+        days = list(period.split(timedelta(days=1)))
+        self.assertEqual(len(days), 7)
+        self.assertEqual(str(days[0]), "2024-01-02-to-2024-01-03")
+        self.assertEqual((days[0].start, days[-1].end), (period.start, period.end))
+
+    def test_split_into_hours_with_remainder(self):
+        period = AccountingPeriod("2024-01-02", length_days=1)
+        shards = list(period.split(timedelta(hours=5)))
+        self.assertEqual(len(shards), 5)
+        self.assertEqual(shards[-1].end - shards[-1].start, timedelta(hours=4))
+        self.assertEqual(str(shards[1]), "2024-01-02T0500-to-2024-01-02T1000")
+        self.assertEqual(
+            [shard.start for shard in shards[1:]], [shard.end for shard in shards[:-1]]
+        )
+
+
+class TestSharding(unittest.TestCase):
+    def test_merged_equals_unsharded(self):
+        period = AccountingPeriod("2024-01-02")
+        unsharded = stand_in_query(period)
+        for shard_length in [timedelta(days=1), timedelta(hours=7)]:
+            frames = fetch_sharded(stand_in_query, period, shard_length, max_workers=4)
+            merged = merge_additive(
+                frames, keys=["solver"], additive_columns=["volume"]
+            )
+            check_merged(
+                merged, unsharded, keys=["solver"], additive_columns=["volume"]
+            )
+            self.assertEqual(list(merged.columns), list(unsharded.columns))
+
+    def test_check_detects_differences(self):
+        frame = DataFrame({"solver": ["0x1", "0x2"], "volume": [1.0, 2.0]})
+        with self.assertRaises(ValueError):
+            check_merged(frame.iloc[:1], frame, ["solver"], ["volume"])
+        changed = frame.assign(volume=[1.0, 2.1])
+        with self.assertRaises(ValueError):
+            check_merged(changed, frame, ["solver"], ["volume"])
+        check_merged(changed, frame, ["solver"], ["volume"], relative_tolerance=0.1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,72 @@
+import json
+import tempfile
+import unittest
+from pathlib import Path
+
+from src.logger import log_context
+from src.utils.spans import (
+    openmetrics_text,
+    recorder,
+    span,
+    timing_summary,
+    write_json_report,
+)
+
+
+class TestSpans(unittest.TestCase):
+    def setUp(self):
+        self.mark = len(recorder.snapshot())
+
+    def recorded(self):
+        return recorder.snapshot()[self.mark :]
+
+    def test_span_records_context_and_counts(self):
+        with log_context(network="gnosis", stage="fetch", period="p"):
+            with span("analytics_db", table="batch_data") as timing:
+                timing.add(10, 1000)
+                timing.add(5)
+        (recorded,) = self.recorded()
+        self.assertEqual(
+            recorded.labels,
+            {"network": "gnosis", "stage": "fetch", "table": "batch_data"},
+        )
+        self.assertEqual((recorded.rows, recorded.bytes), (15, 1000))
+        self.assertGreaterEqual(recorded.wall_seconds, 0)
+        self.assertIsNone(recorded.error)
+
+    def test_failing_span_is_recorded(self):
+        with self.assertRaises(KeyError):
+            with span("price_lookup"):
+                raise KeyError("missing price")
+        self.assertEqual(self.recorded()[0].error, "KeyError")
+
+    def test_reports(self):
+        for _ in range(2):
+            with span("post_multisend", safe='0x"1') as timing:
+                timing.add(3)
+        with span("slack"):
+            pass
+        spans = self.recorded()
+
+        text = openmetrics_text(spans)
+        self.assertIn(
+            'solver_rewards_stage_rows{name="post_multisend",safe="0x\\"1"} 6', text
+        )
+        self.assertIn('solver_rewards_stage_runs{name="slack"} 1', text)
+        self.assertNotIn('solver_rewards_stage_rows{name="slack"}', text)
+        self.assertTrue(text.endswith("# EOF\n"))
+
+        summary = timing_summary(spans).splitlines()
+        self.assertEqual(len(summary), 2)
+        self.assertTrue(summary[0].startswith("post_multisend (x2): "))
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = Path(tmp_dir) / "report.json"
+            write_json_report(spans, path, period="p")
+            report = json.loads(path.read_text())
+        self.assertEqual(report["run"], {"period": "p"})
+        self.assertEqual([s["name"] for s in report["spans"]][-1], "slack")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,129 @@
+import tempfile
+import unittest
+from decimal import Decimal
+from pathlib import Path
+
+import pandas as pd
+import pyarrow as pa
+from dune_client.types import Address
+
+from src.fetch.stages import transfers_frame, transfers_from_frame
+from src.models.token import Token
+from src.models.transfer import Transfer
+from src.utils.print_store import Category, PrintStore
+from src.utils.arrow_ipc import frame_to_table, table_to_frame
+from src.utils.stage_cache import StageCache
+
+
+class TestFrameConversion(unittest.TestCase):
+    def test_exact_amounts(self):
+        frame = pd.DataFrame(
+            {
+                "wei": pd.Series([10**30, None], dtype=object),
+                "fraction": pd.Series([Decimal("0.15"), Decimal("2")], dtype=object),
+                "mixed": pd.Series([1, Decimal("0.5")], dtype=object),
+                "solver": ["0x01", None],
+                "rate": [0.5, 1.5],
+            }
+        )
+        result = table_to_frame(frame_to_table(frame))
+        self.assertEqual(list(result["wei"]), [10**30, None])
+        self.assertIsInstance(result["wei"][0], int)
+        self.assertEqual(list(result["fraction"]), [Decimal("0.15"), Decimal("2")])
+        self.assertIsInstance(result["fraction"][1], Decimal)
+        self.assertEqual(list(result["mixed"]), [1, Decimal("0.5")])
+        self.assertEqual(list(result["solver"]), ["0x01", None])
+        self.assertEqual(list(result["rate"]), [0.5, 1.5])
+
+    def test_integer_amounts(self):
+        amounts = {
+            "small": [-5, None, 2**63 - 1],
+            "wei": [10**30, None, -(10**37) - 1],
+            "huge": [10**70, 1, None],
+        }
+        table = frame_to_table(
+            pd.DataFrame(
+                {name: pd.Series(v, dtype=object) for name, v in amounts.items()}
+            )
+        )
+        self.assertEqual(table.schema.field("small").type, pa.int64())
+        self.assertEqual(table.schema.field("wei").type, pa.decimal128(38, 0))
+        self.assertEqual(table.schema.field("huge").type, pa.string())
+        # several record batches, e.g. of a file written in batches
+        result = table_to_frame(pa.concat_tables([table.slice(0, 1), table.slice(1)]))
+        for name, values in amounts.items():
+            self.assertEqual(list(result[name]), values)
+            self.assertIsInstance(result[name][0], int)
+            self.assertEqual(result[name].dtype, object)
+
+    def test_transfers(self):
+        cow = Token("0xDEf1CA1fb7FBcDC777520aa7f396b4E015F497aB", 18)
+        recipient = Address("0xde1c59bc25d806ad9ddcbe246c4b5e5505645718")
+        transfers = [
+            Transfer(token=None, recipient=recipient, amount_wei=10**25 + 1),
+            Transfer(token=cow, recipient=recipient, amount_wei=5),
+        ]
+        frame = table_to_frame(frame_to_table(transfers_frame(transfers)))
+        self.assertEqual(transfers_from_frame(frame), transfers)
+
+
+class TestStageCache(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.directory = Path(self.tmp_dir.name)
+        self.runs = 0
+
+    def tearDown(self) -> None:
+        self.tmp_dir.cleanup()
+
+    def stage(self):
+        self.runs += 1
+        return {"rows": pd.DataFrame({"a": [1, 2]})}, {"block": "7"}
+
+    def test_reuse(self):
+        cache = StageCache(self.directory)
+        first, cached = cache.run("fetch", {"period": "p"}, self.stage)
+        self.assertFalse(cached)
+        second, cached = cache.run("fetch", {"period": "p"}, self.stage)
+        self.assertTrue(cached)
+        self.assertEqual(self.runs, 1)
+        self.assertEqual(second.digest, first.digest)
+        self.assertEqual(second.metadata, {"block": "7"})
+        self.assertEqual(list(second.frames["rows"]["a"]), [1, 2])
+
+        # changed inputs and fresh runs run the stage again
+        other, _ = cache.run("fetch", {"period": "q"}, self.stage)
+        self.assertEqual(self.runs, 2)
+        fresh, cached = StageCache(self.directory, fresh=True).run(
+            "fetch", {"period": "p"}, self.stage
+        )
+        self.assertFalse(cached)
+        self.assertEqual(self.runs, 3)
+        # the same outputs do not invalidate downstream stages
+        self.assertEqual(other.digest, first.digest)
+        self.assertEqual(fresh.digest, first.digest)
+
+    def test_incomplete_checkpoint(self):
+        cache = StageCache(self.directory)
+        checkpoint, _ = cache.run("fetch", {"period": "p"}, self.stage)
+        next(self.directory.glob("fetch-*/meta.json")).unlink()
+        self.assertIsNone(cache.load("fetch", checkpoint.key))
+        cache.run("fetch", {"period": "p"}, self.stage)
+        self.assertEqual(self.runs, 2)
+
+
+class TestPrintStore(unittest.TestCase):
+    def test_messages_since(self):
+        store = PrintStore()
+        store.print("before", Category.GENERAL)
+        sizes = store.sizes()
+        store.print("totals", Category.TOTALS)
+        store.print("overview", Category.GENERAL)
+        self.assertEqual(
+            store.messages_since(sizes),
+            [(Category.GENERAL, "overview"), (Category.TOTALS, "totals")],
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,115 @@
+import unittest
+from fractions import Fraction
+
+from src.config import AccountingConfig, Network
+from src.fetch.payouts import (
+    compute_partner_payouts,
+    compute_solver_payouts,
+    prepare_payouts,
+)
+from src.fetch.sweep import (
+    SWEEP_PARAMETERS,
+    Scenario,
+    parse_parameter,
+    scenario_grid,
+    sweep,
+)
+from src.models.accounting_period import AccountingPeriod
+from tests.bench.synthetic import (
+    data_per_solver_frame,
+    partner_and_protocol_fees_frame,
+)
+
+
+class StandInOrderbook:
+    """Orderbook stand-in with synthetic data, counting queries."""
+
+    def __init__(self, period: AccountingPeriod):
+        self.data_per_solver = data_per_solver_frame(50, period)
+        self.fees = partner_and_protocol_fees_frame(50, period)
+        self.queries = 0
+
+    def get_data_per_solver(self, accounting_period, config):
+        self.queries += 1
+        return self.data_per_solver
+
+    def get_partner_and_protocol_fees(self, accounting_period, config):
+        self.queries += 1
+        return self.fees
+
+
+class TestSweep(unittest.TestCase):
+    def setUp(self) -> None:
+        self.period = AccountingPeriod("2024-01-02")
+        self.config = AccountingConfig.from_network(Network.MAINNET)
+        self.orderbook = StandInOrderbook(self.period)
+
+    def test_parameters(self):
+        self.assertEqual(parse_parameter("service_fee_factor", "3/20"), Fraction(3, 20))
+        self.assertEqual(parse_parameter("quote_reward_cow", "6e18"), 6 * 10**18)
+        with self.assertRaises(ValueError):
+            parse_parameter("quote_reward_cow", "0.5")
+        with self.assertRaises(ValueError):
+            parse_parameter("reward_token_address", "0x")
+        scenarios = scenario_grid(
+            {"service_fee_factor": [0, Fraction(1, 2)], "min_cow_transfer": [1, 2, 3]}
+        )
+        self.assertEqual(len(scenarios), 6)
+        config = scenarios[-1].apply(self.config)
+        self.assertEqual(config.reward_config.service_fee_factor, Fraction(1, 2))
+        self.assertEqual(config.payment_config.min_cow_transfer, 3)
+        self.assertEqual(
+            config.payment_config.min_native_token_transfer,
+            self.config.payment_config.min_native_token_transfer,
+        )
+
+    def test_sweep(self):
+        reward_config = self.config.reward_config
+        comparison = sweep(
+            self.orderbook,
+            Network.MAINNET,
+            self.period,
+            [
+                Scenario({"service_fee_factor": Fraction(0)}),
+                Scenario({"quote_reward_cow": reward_config.quote_reward_cow // 2}),
+                Scenario({"min_cow_transfer": 10**30}),
+            ],
+            self.config,
+            max_workers=2,
+        )
+        self.assertEqual(self.orderbook.queries, 2)
+        self.assertEqual(
+            list(comparison.columns)[: len(SWEEP_PARAMETERS)], list(SWEEP_PARAMETERS)
+        )
+        baseline, no_fee, half_quotes, no_cow = comparison.to_dict("records")
+
+        # the baseline are the payouts of the configuration of the network
+        payouts = prepare_payouts(
+            compute_solver_payouts(self.orderbook.data_per_solver, self.config),
+            compute_partner_payouts(self.orderbook.fees),
+            self.period,
+            self.config,
+        )
+        min_cow = self.config.payment_config.min_cow_transfer
+        cow = [
+            t.amount_wei
+            for t in payouts.transfers
+            if t.token is not None and t.amount_wei >= min_cow
+        ]
+        self.assertEqual(baseline["cow_wei"], sum(cow))
+        self.assertEqual(baseline["overdrafts"], len(payouts.overdrafts))
+
+        self.assertEqual(no_fee["service_fee_cow"], 0)
+        self.assertGreater(no_fee["cow_wei"], baseline["cow_wei"])
+        self.assertLess(half_quotes["cow_wei"], baseline["cow_wei"])
+        self.assertLess(half_quotes["service_fee_cow"], baseline["service_fee_cow"])
+        self.assertEqual(no_cow["cow_transfers"], 0)
+        self.assertEqual(
+            no_cow["dropped_transfers"],
+            baseline["dropped_transfers"] + baseline["cow_transfers"],
+        )
+        self.assertEqual(no_cow["native_wei"], baseline["native_wei"])
+
+
+if __name__ == "__main__":
+    unittest.main()
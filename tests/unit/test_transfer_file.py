@@ -0,0 +1,153 @@
+import csv
+import sys
+import tempfile
+import unittest
+from dataclasses import replace
+from pathlib import Path
+from unittest.mock import patch
+
+from dune_client.types import Address
+
+from src.config import CHAIN_SPECIFIC_ENV, AccountingConfig, Network
+from src.fetch.transfer_file import (
+    NetworkPayouts,
+    run_accounting,
+    write_combined_report,
+)
+from src.models.accounting_period import AccountingPeriod
+from src.models.overdraft import Overdraft
+from src.models.token import Token
+from src.models.transfer import Transfer
+from src.utils.print_store import PrintStore
+from src.utils.script_args import ScriptArgs, generic_script_init
+
+ONE_ETH = 10**18
+
+
+class TestNetworksArgument(unittest.TestCase):
+    def parse(self, *argv: str):
+        # chain specific variables without network suffix are rejected for several networks
+        environment = {name: "" for name in CHAIN_SPECIFIC_ENV}
+        with (
+            patch.object(sys, "argv", ["transfer_file", *argv]),
+            patch.dict("os.environ", environment),
+        ):
+            return generic_script_init("test")
+
+    def test_chain_specific_environment(self):
+        with patch.dict("os.environ", {"NODE_URL": "https://default.node"}):
+            with patch.object(sys, "argv", ["transfer_file", "--networks", "all"]):
+                with self.assertRaises(SystemExit):
+                    generic_script_init("test")
+
+    def test_all_networks(self):
+        self.assertEqual(self.parse("--networks", "all").networks, list(Network))
+
+    def test_selected_networks(self):
+        self.assertEqual(
+            self.parse("--networks", "gnosis", "base", "gnosis").networks,
+            [Network.GNOSIS, Network.BASE],
+        )
+
+    def test_consolidate_cow_flag(self):
+        self.assertFalse(self.parse("--networks", "all").consolidate_cow)
+        self.assertTrue(
+            self.parse("--networks", "all", "--consolidate-cow").consolidate_cow
+        )
+
+    def test_default_from_environment(self):
+        with patch.dict("os.environ", {"NETWORK": "arbitrum"}):
+            self.assertEqual(self.parse().networks, [Network.ARBITRUM_ONE])
+
+
+class TestCombinedReport(unittest.TestCase):
+    def test_totals_per_network(self):
+        period = AccountingPeriod("2024-01-02")
+        cow = Token(Address.from_int(1), 18)
+        receiver = Address.from_int(2)
+        all_payouts = [
+            NetworkPayouts(
+                network=network,
+                transfers_cow=[Transfer(cow, receiver, n * ONE_ETH)],
+                transfers_native=[Transfer(None, receiver, ONE_ETH)] * n,
+                overdrafts=[Overdraft(period, receiver, "solver", ONE_ETH)],
+                log_saver_obj=PrintStore(),
+            )
+            for n, network in enumerate([Network.MAINNET, Network.GNOSIS], start=1)
+        ]
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            config = AccountingConfig.from_network(Network.MAINNET)
+            config = replace(
+                config,
+                io_config=replace(config.io_config, csv_output_dir=Path(tmp_dir)),
+            )
+            summary = write_combined_report(all_payouts, period, config)
+            with open(
+                Path(tmp_dir) / f"transfers-all-{period}-summary.csv", encoding="utf-8"
+            ) as file:
+                rows = list(csv.DictReader(file))
+
+        self.assertEqual([row["network"] for row in rows], ["mainnet", "gnosis"])
+        self.assertEqual([float(row["native_total"]) for row in rows], [1.0, 2.0])
+        self.assertIn("Total COW Funds needed: 3.0000", summary)
+
+
+class TestConsolidatedCow(unittest.TestCase):
+    def setUp(self):
+        self.period = AccountingPeriod("2024-01-02")
+        cow = Token(Address.from_int(1), 18)
+        self.all_payouts = [
+            NetworkPayouts(
+                network=network,
+                transfers_cow=[Transfer(cow, Address.from_int(2), ONE_ETH)],
+                transfers_native=[],
+                overdrafts=[],
+                log_saver_obj=PrintStore(),
+            )
+            for network in [Network.MAINNET, Network.GNOSIS]
+        ]
+        self.args = ScriptArgs(
+            start=str(self.period),
+            networks=[Network.MAINNET, Network.GNOSIS],
+            post_tx=True,
+            dry_run=True,
+            send_to_slack=False,
+            consolidate_cow=True,
+        )
+
+    def run_accounting(self, errors, chunks=None):
+        with (
+            patch(
+                "src.fetch.transfer_file.compute_all_payouts",
+                return_value=(self.all_payouts, errors),
+            ),
+            patch("src.fetch.transfer_file.write_combined_report", return_value=""),
+            patch("src.fetch.transfer_file.WebClient"),
+            patch("src.fetch.transfer_file.propose_network_payouts") as propose,
+            patch(
+                "src.fetch.transfer_file.chunk_transactions",
+                side_effect=lambda transactions: chunks or [transactions],
+            ),
+        ):
+            try:
+                run_accounting(self.args, self.period)
+            finally:
+                self.proposed = propose.call_count
+
+    def test_consolidated(self):
+        self.run_accounting([])
+        self.assertEqual(self.proposed, 2)
+
+    def test_failed_network(self):
+        with self.assertRaises(RuntimeError):
+            self.run_accounting([Network.BASE])
+        self.assertEqual(self.proposed, 0)
+
+    def test_too_many_transactions(self):
+        with self.assertRaises(ValueError):
+            self.run_accounting([], chunks=[[]] * (len(Network) + 1))
+        self.assertEqual(self.proposed, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()